@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import joblib
 import sys
 import types
 
@@ -25,15 +24,30 @@ try:
 except Exception:
     pass
 
+from app_module.utils.models import ModelManager
+from app_module.utils.risk_grid import RiskGrid, predict_with_grid
+
+# Display name -> ModelManager key
+MODEL_CHOICES = {
+    "Logistic Regression": "log_reg",
+    "Random Forest": "random_forest",
+    "Gradient Boosting": "gradient_boosting",
+    "KNN": "knn"
+}
+
 # Load models (with caching for performance)
 @st.cache_resource
 def load_models():
-    return {
-        "Logistic Regression": joblib.load("models/pipeline_logistic_regression.pkl"),
-        "Random Forest": joblib.load("models/pipeline_random_forest.pkl"),
-        "Gradient Boosting": joblib.load("models/pipeline_gradient_boosting.pkl"),
-        "KNN": joblib.load("models/pipeline_knn.pkl")
-    }
+    models = ModelManager.load_models()
+    missing = [name for name in MODEL_CHOICES.values() if name not in models]
+    if missing:
+        raise FileNotFoundError(f"Missing models: {', '.join(missing)}")
+    return models
+
+# Precomputed risk grid (python -m app_module.utils.risk_grid), optional
+@st.cache_resource
+def load_risk_grid():
+    return RiskGrid.load()
 
 try:
     MODELS = load_models()
@@ -41,28 +55,29 @@ except Exception as e:
     st.error(f"Error loading models: {e}")
     st.stop()
 
-def prepare_input(data):
-    """Prepare input DataFrame from form data"""
-    df_data = {
-        'HeartDisease': [data['HeartDisease']],
-        'BMI': [float(data['BMI'])],
-        'Smoking': [data['Smoking']],
-        'AlcoholDrinking': ['No'],
-        'Stroke': ['No'],
-        'PhysicalHealth': [0.0],
-        'MentalHealth': [0.0],
-        'DiffWalking': ['No'],
-        'Sex': [data['Sex']],
-        'AgeCategory': [data['AgeCategory']],
-        'Race': ['White'],
-        'Diabetic': ['No'],
-        'PhysicalActivity': [data['PhysicalActivity']],
-        'GenHealth': [data['GenHealth']],
-        'SleepTime': [7.0],
-        'Asthma': ['No'],
-        'KidneyDisease': ['No']
+RISK_GRID = load_risk_grid()
+
+def prepare_input_record(data):
+    """Prepare a full feature record from form data (other fields fixed)"""
+    return {
+        'HeartDisease': data['HeartDisease'],
+        'BMI': float(data['BMI']),
+        'Smoking': data['Smoking'],
+        'AlcoholDrinking': 'No',
+        'Stroke': 'No',
+        'PhysicalHealth': 0.0,
+        'MentalHealth': 0.0,
+        'DiffWalking': 'No',
+        'Sex': data['Sex'],
+        'AgeCategory': data['AgeCategory'],
+        'Race': 'White',
+        'Diabetic': 'No',
+        'PhysicalActivity': data['PhysicalActivity'],
+        'GenHealth': data['GenHealth'],
+        'SleepTime': 7.0,
+        'Asthma': 'No',
+        'KidneyDisease': 'No'
     }
-    return pd.DataFrame(df_data)
 
 # Main app
 st.title("🏥 SmartCheck Health Prediction")
@@ -72,7 +87,7 @@ st.markdown("### Predict health risk based on your personal information")
 st.sidebar.header("Model Configuration")
 model_choice = st.sidebar.selectbox(
     "Choose prediction model:",
-    list(MODELS.keys())
+    list(MODEL_CHOICES.keys())
 )
 
 # Main form
@@ -112,17 +127,15 @@ if st.button("🔍 Predict Health Risk", type="primary", use_container_width=Tru
         'GenHealth': gen_health
     }
     
-    df_input = prepare_input(input_data)
+    input_record = prepare_input_record(input_data)
+    df_input = pd.DataFrame([input_record])
     
-    # Make prediction
+    # Make prediction (grid lookup when available, live scoring otherwise)
     try:
-        pipeline = MODELS[model_choice]
-        prediction = pipeline.predict(df_input)[0]
-        
-        if hasattr(pipeline, "predict_proba"):
-            probability = pipeline.predict_proba(df_input)[0][1]
-        else:
-            probability = None
+        pipeline = MODELS[MODEL_CHOICES[model_choice]]
+        result = predict_with_grid(RISK_GRID, MODEL_CHOICES[model_choice], input_record)
+        prediction = result.prediction
+        probability = result.probability
         
         # Display results
         st.markdown("---")
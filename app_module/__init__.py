@@ -22,12 +22,31 @@ def create_app(config_name=None):
     CORS(app)
     
     # Enregistrer les blueprints
+    from app_module.routes import health_bp, metrics_bp
+    from app_module.routes.admin import admin_bp
+    from app_module.routes.image_prediction import image_bp
     from app_module.routes.prediction import prediction_bp
-    from app_module.routes.dashboard import dashboard_bp
-    from app_module.routes.health import health_bp
+    from app_module.utils.lazy import LazyMount, preload
     
     app.register_blueprint(prediction_bp)
     app.register_blueprint(health_bp)
-    dashboard_bp(app)  # Dash intégré
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(image_bp)
+    
+    # Dash intégré, construit à la première requête sous /dashboard/
+    app.wsgi_app = LazyMount(app.wsgi_app, '/dashboard', _create_dashboard_server)
+    
+    if config.EAGER_IMPORTS:
+        preload()
     
     return app
+
+
+def _create_dashboard_server():
+    """Serveur Flask dédié au dashboard Dash (monté sous /dashboard/)"""
+    from app_module.routes.dashboard import dashboard_bp
+    
+    server = Flask(__name__)
+    dashboard_bp(server)
+    return server
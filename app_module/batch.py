@@ -0,0 +1,214 @@
+"""
+Rescoring hors ligne d'archives patients (fichiers au format data/dataset.csv).
+
+Le fichier est lu par paquets de lignes, répartis sur un pool de processus; chaque
+worker charge les modèles une seule fois via ModelManager et écrit les
+probabilités de son paquet dans un fichier `part-NNNNNN` du dossier de sortie.
+Un checkpoint JSON liste les paquets terminés: relancée avec les mêmes
+arguments, une tâche interrompue reprend après le dernier paquet écrit.
+
+Usage:
+    python -m app_module.batch --output out/ [--input data/dataset.csv]
+        [--models log_reg knn] [--format csv|parquet] [--chunk-size 20000]
+        [--workers 4] [--restart]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import pandas as pd
+from app_module.config.settings import Config
+from app_module.utils.data import prepare_batch_prediction_input
+
+CHECKPOINT_FILE = 'checkpoint.json'
+
+
+def _part_path(output_dir: str, chunk_id: int, fmt: str) -> str:
+    return os.path.join(output_dir, f'part-{chunk_id:06d}.{fmt}')
+
+
+def _input_signature(path: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _write_json(path: str, payload: Dict[str, Any]) -> None:
+    """Écriture atomique (fichier temporaire puis renommage)"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class Checkpoint:
+    """Paquets terminés d'une tâche de rescoring, pour reprendre après interruption"""
+    
+    def __init__(self, path: str, job: Dict[str, Any], completed: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.job = job
+        self.completed = completed or {}
+    
+    @classmethod
+    def open(cls, output_dir: str, job: Dict[str, Any], restart: bool = False) -> 'Checkpoint':
+        """Reprendre le checkpoint existant (mêmes paramètres) ou en créer un nouveau"""
+        path = os.path.join(output_dir, CHECKPOINT_FILE)
+        if os.path.exists(path) and not restart:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('job') != job:
+                raise ValueError(
+                    f"Le checkpoint {path} correspond à une autre tâche (entrée, modèles, format "
+                    f"ou taille de paquet différents): utiliser --restart pour repartir de zéro"
+                )
+            return cls(path, job, saved.get('completed', {}))
+        checkpoint = cls(path, job)
+        checkpoint.save()
+        return checkpoint
+    
+    def is_done(self, chunk_id: int, part_path: str) -> bool:
+        return str(chunk_id) in self.completed and os.path.exists(part_path)
+    
+    def mark_done(self, chunk_id: int, rows: int) -> None:
+        self.completed[str(chunk_id)] = rows
+        self.save()
+    
+    def save(self) -> None:
+        _write_json(self.path, {'job': self.job, 'completed': self.completed})
+
+
+def _init_worker() -> None:
+    """Charger les modèles une seule fois par processus worker"""
+    from app_module.utils.models import ModelManager
+    Config.MODEL_WATCH_ENABLED = False
+    ModelManager.load_models()
+
+
+def score_chunk(chunk: pd.DataFrame, offset: int, model_names: List[str]) -> pd.DataFrame:
+    """Probabilités et labels de chaque modèle pour un paquet (une ligne par ligne d'entrée)"""
+    from app_module.utils.models import PredictionEngine
+    
+    df_input, errors = prepare_batch_prediction_input(chunk)
+    out = pd.DataFrame({'index': range(offset, offset + len(chunk))})
+    for model_name in model_names:
+        probabilities = pd.Series(float('nan'), index=out.index)
+        labels = pd.Series(pd.NA, index=out.index, dtype='Int64')
+        if not df_input.empty:
+            results = PredictionEngine.predict_batch(model_name, df_input)
+            probabilities[df_input.index] = [r.probability for r in results]
+            labels[df_input.index] = [r.prediction for r in results]
+        out[f'{model_name}_probability'] = probabilities
+        out[f'{model_name}_prediction'] = labels
+    
+    out['error'] = None
+    for error in errors:
+        out.at[error['index'], 'error'] = error['error']
+    return out
+
+
+def _process_chunk(chunk_id: int, offset: int, chunk: pd.DataFrame, model_names: List[str],
+                   part_path: str, fmt: str) -> Tuple[int, int]:
+    """Scorer un paquet dans un worker et écrire son fichier de sortie (atomiquement)"""
+    out = score_chunk(chunk, offset, model_names)
+    tmp_path = f'{part_path}.tmp'
+    if fmt == 'parquet':
+        out.to_parquet(tmp_path, index=False)
+    else:
+        out.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, part_path)
+    return chunk_id, len(chunk)
+
+
+def iter_chunks(input_path: str, chunk_size: int) -> Iterator[Tuple[int, int, pd.DataFrame]]:
+    """(numéro de paquet, index global de la première ligne, paquet)"""
+    offset = 0
+    reader = pd.read_csv(input_path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    for chunk_id, chunk in enumerate(reader):
+        yield chunk_id, offset, chunk
+        offset += len(chunk)
+
+
+def run(input_path: str, output_dir: str, model_names: Optional[List[str]] = None, fmt: str = 'csv',
+        chunk_size: int = 20000, workers: Optional[int] = None, restart: bool = False) -> Dict[str, Any]:
+    """Rescorer un fichier complet; retourne un résumé (lignes, durée, lignes/s)"""
+    from app_module.utils.models import ModelManager
+    
+    if fmt == 'parquet' and not (importlib.util.find_spec('pyarrow') or importlib.util.find_spec('fastparquet')):
+        raise RuntimeError("Le format parquet nécessite pyarrow ou fastparquet")
+    
+    if model_names:
+        model_names = [ModelManager.resolve_name(name) for name in model_names]
+    else:
+        model_names = ModelManager.registry().names()
+    
+    os.makedirs(output_dir, exist_ok=True)
+    job = {
+        'input': _input_signature(input_path),
+        'models': model_names,
+        'format': fmt,
+        'chunk_size': chunk_size
+    }
+    checkpoint = Checkpoint.open(output_dir, job, restart=restart)
+    resumed_rows = sum(checkpoint.completed.values())
+    if resumed_rows:
+        print(f"✓ Reprise: {len(checkpoint.completed)} paquets ({resumed_rows} lignes) déjà écrits")
+    
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    rows = 0
+    pending = set()
+    
+    def collect(done):
+        nonlocal rows
+        for future in done:
+            chunk_id, n_rows = future.result()
+            checkpoint.mark_done(chunk_id, n_rows)
+            rows += n_rows
+            elapsed = time.perf_counter() - start
+            print(f"✓ Paquet {chunk_id}: {rows} lignes, {rows / elapsed:.0f} lignes/s")
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for chunk_id, offset, chunk in iter_chunks(input_path, chunk_size):
+            part_path = _part_path(output_dir, chunk_id, fmt)
+            if checkpoint.is_done(chunk_id, part_path):
+                continue
+            # Au plus deux paquets en attente par worker: mémoire bornée
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(_process_chunk, chunk_id, offset, chunk, model_names, part_path, fmt))
+        
+        done, _ = wait(pending)
+        collect(done)
+    
+    elapsed = time.perf_counter() - start
+    summary = {
+        'rows': rows,
+        'resumed_rows': resumed_rows,
+        'chunks': len(checkpoint.completed),
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+        'output': output_dir
+    }
+    print(f"✓ Terminé: {rows} lignes en {summary['seconds']}s ({summary['rows_per_second']} lignes/s)")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rescorer une archive patients avec un ou plusieurs modèles")
+    parser.add_argument('--input', default=Config.DATASET_PATH, help="CSV au format data/dataset.csv")
+    parser.add_argument('--output', required=True, help="Dossier des fichiers part-NNNNNN et du checkpoint")
+    parser.add_argument('--models', nargs='*', help="Modèles à évaluer (tous par défaut)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=None, help="Processus (nombre de CPU par défaut)")
+    parser.add_argument('--restart', action='store_true', help="Ignorer le checkpoint existant")
+    args = parser.parse_args()
+    
+    run(args.input, args.output, args.models, args.format, args.chunk_size, args.workers, args.restart)
+
+
+if __name__ == '__main__':
+    main()
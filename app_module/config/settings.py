@@ -25,9 +25,102 @@ class Config:
         "knn": os.path.join(MODELS_DIR, "pipeline_knn.pkl")
     }
     
+    # Registre versionné des modèles (versions, version active/shadow, alias).
+    # Sans manifeste, le registre est construit à partir de MODELS (version "default").
+    MODEL_REGISTRY_PATH = os.getenv('MODEL_REGISTRY_PATH', os.path.join(MODELS_DIR, 'registry.json'))
+    
+    # Shadow scoring: fraction du trafic rejouée sur la version shadow, hors chemin de la requête
+    SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', 0.1))
+    SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', 1000))
+    
+    # Mapping mémoire des tableaux NumPy des pickles (None pour tout charger en mémoire privée)
+    MODEL_MMAP_MODE = os.getenv('MODEL_MMAP_MODE', 'r') or None
+    
+    # Compilation des pipelines en encodeur NumPy (chemin rapide sans pandas)
+    COMPILE_PIPELINES = os.getenv('COMPILE_PIPELINES', 'true').lower() == 'true'
+    COMPILED_PARITY_ATOL = float(os.getenv('COMPILED_PARITY_ATOL', 1e-6))
+    # Ensembles d'arbres (RandomForest, GradientBoosting) aplatis en tableaux NumPy
+    COMPILE_TREE_ENSEMBLES = os.getenv('COMPILE_TREE_ENSEMBLES', 'true').lower() == 'true'
+    # Au-delà de cette taille de lot, le parcours Cython de sklearn reprend la main
+    FLAT_TREES_MAX_ROWS = int(os.getenv('FLAT_TREES_MAX_ROWS', 64))
+    
+    # Index de voisinage précalculé du KNN (python -m app_module.utils.knn_index)
+    KNN_INDEX_DIR = os.getenv('KNN_INDEX_DIR', os.path.join(MODELS_DIR, 'knn_index'))
+    # Background SHAP prétransformé (.npy mappé, python -m app_module.utils.shap_background)
+    SHAP_BACKGROUND_DIR = os.getenv('SHAP_BACKGROUND_DIR', os.path.join(MODELS_DIR, 'shap_background'))
+    # Valeurs SHAP de la régression logistique: 'log_odds' (exactes) ou 'probability'
+    # (contributions log-odds remises à l'échelle, approximation signalée dans la réponse)
+    SHAP_LINEAR_OUTPUT = os.getenv('SHAP_LINEAR_OUTPUT', 'log_odds')
+    
+    # Explications SHAP/LIME stockées (SQLite, par version de modèle et entrée)
+    EXPLANATION_STORE_ENABLED = os.getenv('EXPLANATION_STORE_ENABLED', 'true').lower() == 'true'
+    EXPLANATION_STORE_PATH = os.getenv('EXPLANATION_STORE_PATH', os.path.join(DATA_DIR, 'explanations.db'))
+    EXPLANATION_STORE_MAX_AGE = float(os.getenv('EXPLANATION_STORE_MAX_AGE', 30 * 24 * 3600))
+    EXPLANATION_STORE_MAX_ENTRIES = int(os.getenv('EXPLANATION_STORE_MAX_ENTRIES', 100000))
+    
+    # LIME adaptatif: tours d'échantillons croissants, arrêt quand le top-k et ses poids sont stables
+    LIME_ADAPTIVE = os.getenv('LIME_ADAPTIVE', 'false').lower() == 'true'
+    LIME_INITIAL_SAMPLES = int(os.getenv('LIME_INITIAL_SAMPLES', 500))
+    LIME_TOP_K = int(os.getenv('LIME_TOP_K', 5))
+    # Variation maximale des poids du top-k entre deux tours, relative au plus grand poids
+    LIME_TOLERANCE = float(os.getenv('LIME_TOLERANCE', 0.05))
+    LIME_TIME_BUDGET = float(os.getenv('LIME_TIME_BUDGET', 2.0))
+    
+    # Cache LRU des prédictions (taille 0 = désactivé)
+    PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 10000))
+    PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', 3600))
+    PREDICTION_CACHE_BMI_DECIMALS = 1
+    
+    # Micro-batching: prédictions unitaires concurrentes d'un même modèle scorées ensemble
+    MICRO_BATCH_ENABLED = os.getenv('MICRO_BATCH_ENABLED', 'false').lower() == 'true'
+    MICRO_BATCH_WAIT_MS = float(os.getenv('MICRO_BATCH_WAIT_MS', 5))
+    MICRO_BATCH_MAX_ROWS = int(os.getenv('MICRO_BATCH_MAX_ROWS', 64))
+    
+    # Sous-systèmes lourds (SHAP, LIME, matplotlib, dashboard) chargés au premier usage;
+    # true: tout importer au démarrage (avec preload gunicorn, une seule fois dans le master).
+    # TensorFlow n'est importé qu'au chargement du modèle image (dépickling)
+    EAGER_IMPORTS = os.getenv('EAGER_IMPORTS', 'false').lower() == 'true'
+    
+    # Rechargement à chaud: intervalle (secondes) entre deux vérifications des fichiers modèles
+    MODEL_WATCH_ENABLED = os.getenv('MODEL_WATCH_ENABLED', 'true').lower() == 'true'
+    MODEL_CHECK_INTERVAL = float(os.getenv('MODEL_CHECK_INTERVAL', 5))
+    
+    # Seuils de décision (probabilité de la classe positive) par modèle
+    DEFAULT_DECISION_THRESHOLD = float(os.getenv('DEFAULT_DECISION_THRESHOLD', 0.5))
+    DECISION_THRESHOLDS = {
+        "log_reg": DEFAULT_DECISION_THRESHOLD,
+        "random_forest": DEFAULT_DECISION_THRESHOLD,
+        "gradient_boosting": DEFAULT_DECISION_THRESHOLD,
+        "knn": DEFAULT_DECISION_THRESHOLD
+    }
+    
+    # Ensemble (vote des modèles)
+    ENSEMBLE_MAX_WORKERS = int(os.getenv('ENSEMBLE_MAX_WORKERS', 4))
+    ENSEMBLE_THRESHOLD = float(os.getenv('ENSEMBLE_THRESHOLD', 0.5))
+    ENSEMBLE_WEIGHTS = {
+        "log_reg": 1.0,
+        "random_forest": 1.0,
+        "gradient_boosting": 1.0,
+        "knn": 1.0
+    }
+    
+    # Grille de risque précalculée (interface de démonstration Streamlit)
+    RISK_GRID_PATH = os.path.join(MODELS_DIR, 'risk_grid.npz')
+    RISK_GRID_BMI_MIN = 10.0
+    RISK_GRID_BMI_MAX = 60.0
+    RISK_GRID_BMI_STEP = 0.1
+    
     # Dataset
     DATASET_PATH = os.path.join(DATA_DIR, 'dataset.csv')
     
+    # Base SQLite des tests utilisateurs et des comparaisons shadow
+    DATABASE_PATH = os.getenv('DATABASE_PATH', os.path.join(DATA_DIR, 'tests.db'))
+    
+    # Prédiction par lots
+    BATCH_MAX_RECORDS = int(os.getenv('BATCH_MAX_RECORDS', 50000))
+    # Prédiction en flux: lignes lues et scorées par paquet
+    STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 5000))
+    
     # Server
     HOST = os.getenv('FLASK_HOST', '0.0.0.0')
     PORT = int(os.getenv('FLASK_PORT', 5000))
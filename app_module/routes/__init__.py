@@ -1,11 +1,15 @@
 """
 Routes pour la santé et info
 """
-from flask import Blueprint, jsonify
-from app_module.utils.models import ModelManager
+from flask import Blueprint, Response, jsonify
+from app_module.utils.models import ModelManager, micro_batcher
+from app_module.utils.cache import prediction_cache
+from app_module.utils.metrics import registry as metrics_registry
+from app_module.config.settings import Config
 from app_module.utils import APIResponse, get_logger
 
 health_bp = Blueprint('health', __name__, url_prefix='/api')
+metrics_bp = Blueprint('metrics', __name__)
 logger = get_logger(__name__)
 
 
@@ -17,7 +21,10 @@ def health_check():
         return jsonify(APIResponse.success({
             'status': 'healthy',
             'models_loaded': len(models),
-            'available_models': list(models.keys())
+            'available_models': list(models.keys()),
+            'prediction_cache': prediction_cache.stats(),
+            'micro_batching': micro_batcher.stats() if Config.MICRO_BATCH_ENABLED else None,
+            'models_memory': ModelManager.memory_usage()
         })), 200
     except Exception as e:
         logger.error(f"Erreur health check: {e}")
@@ -33,6 +40,13 @@ def app_info():
         'endpoints': {
             'prediction': '/api/prediction',
             'health': '/api/health',
+            'metrics': '/metrics',
             'dashboard': '/dashboard/'
         }
     })), 200
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Histogrammes de latence et compteurs au format texte Prometheus"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
@@ -5,6 +5,8 @@ from flask import Blueprint, render_template, request, jsonify, session, redirec
 from app_module.utils.database import db
 import os
 from app_module.config.settings import Config
+from app_module.utils.models import ModelManager, ModelNotFoundError
+from app_module.utils.shadow import shadow_scorer
 
 # S'assurer que la base de données est initialisée
 try:
@@ -118,3 +120,49 @@ def serve_certificate(filename):
     cert_dir = os.path.join(Config.BASE_DIR, 'data', 'certificates')
     return send_from_directory(cert_dir, filename)
 
+
+
+@admin_bp.route('/models', methods=['GET'])
+def models_status():
+    """État des modèles chargés et historique des rechargements (JSON)"""
+    if not session.get('admin_logged_in'):
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    ModelManager.get_all_models()
+    return jsonify(ModelManager.status())
+
+
+@admin_bp.route('/models/reload', methods=['POST'])
+def models_reload():
+    """Recharger un modèle (paramètre `model`) ou vérifier tous les fichiers modèles"""
+    if not session.get('admin_logged_in'):
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    ModelManager.get_all_models()
+    model_name = request.values.get('model') or (request.get_json(silent=True) or {}).get('model')
+    try:
+        if model_name:
+            events = [ModelManager.reload_model(model_name)]
+        else:
+            events = ModelManager.check_for_updates()
+    except ModelNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': f'Rechargement impossible: {e}'}), 500
+    
+    return jsonify({'reloaded': events})
+
+
+@admin_bp.route('/models/shadow', methods=['GET'])
+def models_shadow():
+    """Comparaison version active / shadow (accord, écart de probabilité, latences)"""
+    if not session.get('admin_logged_in'):
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    model_name = request.args.get('model')
+    if model_name:
+        model_name = ModelManager.resolve_name(model_name)
+    return jsonify({
+        'summary': db.get_shadow_summary(model_name),
+        'scorer': shadow_scorer.stats()
+    })
@@ -3,16 +3,17 @@
 Route for Image Classification (Skin Cancer)
 """
 from flask import Blueprint, render_template, request, jsonify
-import tensorflow as tf
 import joblib
-import numpy as np
-from PIL import Image
-import io
 import os
+import time
 from app_module.config.settings import Config
+from app_module.utils.image import preprocess_image
+from app_module.utils.metrics import STAGE_SECONDS
 
 image_bp = Blueprint('image_bp', __name__)
 
+IMAGE_INFERENCE_SECONDS = STAGE_SECONDS.labels('image_inference')
+
 # Global model variable
 params = {
     "model": None,
@@ -29,6 +30,7 @@ def load_model():
             # If it fails, we might need to rely on the fact it was saved on a similar env or use custom loading
             
             # Since the user provided mymodel.pkl using joblib.dump(cnn, ...), we assume consistent tf version
+            # (TensorFlow is imported here, by unpickling, on the first image request)
             params["model"] = joblib.load(model_path)
             print("Image Classification Model loaded successfully.")
         except Exception as e:
@@ -59,17 +61,14 @@ def predict_image():
     try:
         # 1. Read Image
         image_bytes = file.read()
-        img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        
-        # 2. Preprocess (Resize 236x236, Normalize)
-        img = img.resize((params["img_size"], params["img_size"]))
-        img_array = np.array(img) / 255.0
         
-        # Add batch dimension (1, 236, 236, 3)
-        img_batch = np.expand_dims(img_array, axis=0)
+        # 2. Preprocess (Resize 236x236, Normalize) -> batch (1, 236, 236, 3)
+        img_batch = preprocess_image(image_bytes, params["img_size"])
         
         # 3. Predict
+        start = time.perf_counter()
         prediction_prob = params["model"].predict(img_batch)[0][0]
+        IMAGE_INFERENCE_SECONDS.observe(time.perf_counter() - start)
         
         # 4. Interpret Result (0=Benign, 1=Malignant)
         # We can define a threshold, e.g., 0.5
@@ -1,10 +1,14 @@
 """
 Routes pour les prédictions
 """
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, Response, render_template, request, jsonify, stream_with_context
+import csv
+import io
+import json
 import pandas as pd
-from app_module.utils.models import ModelManager
-from app_module.utils.data import prepare_prediction_input
+from app_module.config.settings import Config
+from app_module.utils.models import ModelManager, ModelNotFoundError, PredictionEngine
+from app_module.utils.data import prepare_prediction_record, prepare_batch_prediction_input
 from app_module.utils import APIResponse, get_logger
 
 prediction_bp = Blueprint('prediction', __name__, url_prefix='/api/prediction')
@@ -28,25 +32,19 @@ def predict():
                 return render_template('index.html', result=result)
             
             # Préparer les données
-            df_input = prepare_prediction_input(form_data)
+            record = prepare_prediction_record(form_data)
             
-            # Charger le modèle
-            model = ModelManager.get_model(model_name)
-            if not model:
+            # Prédiction (pipeline exécutée une seule fois)
+            try:
+                prediction = PredictionEngine.predict(model_name, record)
+            except ModelNotFoundError:
                 logger.error(f"Modèle {model_name} non trouvé")
                 result = {'error': f'Modèle {model_name} non disponible'}
                 return render_template('index.html', result=result)
             
-            # Prédiction
-            prediction = model.predict(df_input)[0]
-            probability = None
-            
-            if hasattr(model, 'predict_proba'):
-                probability = model.predict_proba(df_input)[0][1]
-            
             result = {
-                'prediction': int(prediction),
-                'probability': round(float(probability), 3) if probability else None,
+                'prediction': prediction.prediction,
+                'probability': round(prediction.probability, 3) if prediction.probability is not None else None,
                 'model': model_name,
                 'status': 'success'
             }
@@ -73,33 +71,224 @@ def predict_api():
             return jsonify(APIResponse.error("Modèle non spécifié")), 400
         
         # Préparer les données
-        df_input = prepare_prediction_input(data)
+        record = prepare_prediction_record(data)
         
-        # Charger le modèle
-        model = ModelManager.get_model(data['model_choice'])
-        if not model:
+        # Prédiction
+        try:
+            result = PredictionEngine.predict(data['model_choice'], record).to_dict()
+        except ModelNotFoundError:
             return jsonify(APIResponse.error(f"Modèle {data['model_choice']} non trouvé")), 404
         
-        # Prédiction
-        prediction = model.predict(df_input)[0]
-        probability = None
+        return jsonify(APIResponse.success(result)), 200
         
-        if hasattr(model, 'predict_proba'):
-            probability = float(model.predict_proba(df_input)[0][1])
+    except Exception as e:
+        logger.error(f"Erreur API: {e}")
+        return jsonify(APIResponse.error(str(e))), 500
+
+
+@prediction_bp.route('/ensemble', methods=['POST'])
+def predict_ensemble_api():
+    """API pour les prédictions par ensemble de modèles (JSON)"""
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify(APIResponse.error("Données manquantes")), 400
         
-        result = {
-            'prediction': int(prediction),
-            'probability': probability,
-            'model': data['model_choice']
-        }
+        record = prepare_prediction_record(data)
         
-        return jsonify(APIResponse.success(result)), 200
+        try:
+            result = PredictionEngine.predict_ensemble(
+                record,
+                model_names=data.get('models'),
+                method=data.get('method', 'mean'),
+                weights=data.get('weights')
+            )
+        except ModelNotFoundError as e:
+            return jsonify(APIResponse.error(str(e), 404)), 404
+        
+        return jsonify(APIResponse.success(result.to_dict())), 200
         
+    except ValueError as e:
+        return jsonify(APIResponse.error(f"Erreur de validation: {e}")), 400
     except Exception as e:
-        logger.error(f"Erreur API: {e}")
+        logger.error(f"Erreur API ensemble: {e}")
+        return jsonify(APIResponse.error(str(e))), 500
+
+
+@prediction_bp.route('/batch', methods=['POST'])
+def predict_batch_api():
+    """API pour les prédictions par lots (JSON ou fichier CSV)"""
+    try:
+        if 'file' in request.files:
+            model_name = request.form.get('model_choice')
+            try:
+                records = pd.read_csv(request.files['file'], dtype=str, keep_default_na=False)
+            except Exception as e:
+                return jsonify(APIResponse.error(f"Fichier CSV invalide: {e}")), 400
+        else:
+            data = request.get_json(silent=True) or {}
+            model_name = data.get('model_choice')
+            records = data.get('records')
+            if not isinstance(records, list):
+                return jsonify(APIResponse.error("Liste 'records' manquante")), 400
+        
+        if not model_name:
+            return jsonify(APIResponse.error("Modèle non spécifié")), 400
+        
+        if len(records) > Config.BATCH_MAX_RECORDS:
+            return jsonify(APIResponse.error(
+                f"Lot trop volumineux ({len(records)} > {Config.BATCH_MAX_RECORDS})", 413
+            )), 413
+        
+        if ModelManager.get_model(model_name) is None:
+            return jsonify(APIResponse.error(f"Modèle {model_name} non trouvé")), 404
+        
+        # Préparer toutes les lignes en un seul DataFrame colonnaire
+        df_input, errors = prepare_batch_prediction_input(records)
+        
+        results = []
+        if not df_input.empty:
+            # Une seule passe dans la pipeline pour tout le lot
+            predictions = PredictionEngine.predict_batch(model_name, df_input)
+            for idx, prediction in zip(df_input.index, predictions):
+                results.append({
+                    'index': int(idx),
+                    'prediction': prediction.prediction,
+                    'probability': prediction.probability
+                })
+        
+        logger.info(f"Prédiction par lot avec {model_name}: {len(results)} lignes, {len(errors)} rejetées")
+        
+        return jsonify(APIResponse.success({
+            'model': model_name,
+            'count': len(results),
+            'results': results,
+            'errors': errors
+        })), 200
+        
+    except Exception as e:
+        logger.error(f"Erreur API batch: {e}")
         return jsonify(APIResponse.error(str(e))), 500
 
 
+def _iter_ndjson_chunks(stream, chunk_size):
+    """Lire un flux NDJSON par paquets de `chunk_size` lignes: (enregistrements, erreurs de parsing)"""
+    records, parse_errors = [], {}
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError as e:
+            parse_errors[len(records)] = f"JSON invalide: {e}"
+            records.append(None)
+        if len(records) >= chunk_size:
+            yield records, parse_errors
+            records, parse_errors = [], {}
+    if records:
+        yield records, parse_errors
+
+
+def _iter_csv_chunks(stream, chunk_size):
+    """Lire un CSV (schéma de data/dataset.csv) par paquets de `chunk_size` lignes"""
+    for chunk in pd.read_csv(stream, dtype=str, keep_default_na=False, chunksize=chunk_size):
+        yield chunk, {}
+
+
+def _score_chunks(model_name, chunks):
+    """Scorer chaque paquet et produire les résultats ligne par ligne (index global)"""
+    offset = 0
+    for chunk, parse_errors in chunks:
+        df_input, errors = prepare_batch_prediction_input(chunk)
+        rows = []
+        for error in errors:
+            message = parse_errors.get(error['index'], error['error'])
+            rows.append({'index': offset + error['index'], 'error': message})
+        if not df_input.empty:
+            predictions = PredictionEngine.predict_batch(model_name, df_input)
+            for idx, prediction in zip(df_input.index, predictions):
+                rows.append({
+                    'index': offset + int(idx),
+                    'prediction': prediction.prediction,
+                    'probability': prediction.probability
+                })
+        rows.sort(key=lambda row: row['index'])
+        yield rows
+        offset += len(chunk)
+
+
+def _format_ndjson(row_chunks):
+    for rows in row_chunks:
+        yield ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def _format_csv(row_chunks):
+    fields = ['index', 'prediction', 'probability', 'error']
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for rows in row_chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@prediction_bp.route('/stream', methods=['POST'])
+def predict_stream_api():
+    """
+    API de prédiction en flux pour les très gros volumes.
+    
+    Entrée: corps brut NDJSON (application/x-ndjson) ou CSV (text/csv), ou fichier
+    CSV en multipart (`file`). Le modèle est passé dans `model_choice` (paramètre
+    d'URL ou champ de formulaire). Les lignes sont lues et scorées par paquets de
+    `Config.STREAM_CHUNK_SIZE`; les résultats sont renvoyés au fil de l'eau en
+    NDJSON (défaut) ou en CSV (`format=csv`). Avec un corps brut, les premiers
+    résultats partent avant la fin de l'envoi.
+    """
+    model_name = request.args.get('model_choice') or request.form.get('model_choice')
+    if not model_name:
+        return jsonify(APIResponse.error("Modèle non spécifié")), 400
+    if ModelManager.get_model(model_name) is None:
+        return jsonify(APIResponse.error(f"Modèle {model_name} non trouvé")), 404
+    
+    output_format = request.args.get('format', 'ndjson').lower()
+    if output_format not in ('ndjson', 'csv'):
+        return jsonify(APIResponse.error(f"Format de sortie inconnu: {output_format}")), 400
+    
+    chunk_size = Config.STREAM_CHUNK_SIZE
+    content_type = (request.mimetype or '').lower()
+    if 'file' in request.files:
+        chunks = _iter_csv_chunks(request.files['file'].stream, chunk_size)
+    elif content_type in ('application/x-ndjson', 'application/jsonl', 'application/json'):
+        chunks = _iter_ndjson_chunks(request.stream, chunk_size)
+    elif content_type in ('text/csv', 'application/csv'):
+        chunks = _iter_csv_chunks(request.stream, chunk_size)
+    else:
+        return jsonify(APIResponse.error("Corps NDJSON ou CSV attendu")), 415
+    
+    def generate():
+        row_chunks = _score_chunks(model_name, chunks)
+        formatter = _format_csv if output_format == 'csv' else _format_ndjson
+        try:
+            for payload in formatter(row_chunks):
+                yield payload
+        except Exception as e:
+            # Les en-têtes sont déjà partis: l'erreur termine le flux
+            logger.error(f"Erreur API stream: {e}")
+            if output_format == 'csv':
+                yield f"# erreur: {e}\n"
+            else:
+                yield json.dumps({'error': str(e)}) + '\n'
+    
+    mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+
 @prediction_bp.route('/models', methods=['GET'])
 def get_models():
     """Retourner la liste des modèles disponibles"""
@@ -0,0 +1,162 @@
+"""
+Micro-batching des prédictions unitaires concurrentes
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Mapping, Optional
+from app_module.utils.metrics import (BATCH_SIZE_BUCKETS, MICRO_BATCH_FALLBACKS, MICRO_BATCH_QUEUE_DEPTH,
+                                      MICRO_BATCH_SIZE, MICRO_BATCH_WAIT_SECONDS)
+
+
+class _ModelQueue:
+    """File des requêtes en attente pour un modèle, vidée par un thread dédié"""
+    
+    def __init__(self, model_name: str):
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.worker_pid = None
+        # Profondeur maximale observée, mise à jour sous `condition`
+        self.max_depth = 0
+        # Séries /metrics du modèle, résolues une fois
+        self.batch_size = MICRO_BATCH_SIZE.labels(model_name)
+        self.queue_depth = MICRO_BATCH_QUEUE_DEPTH.labels(model_name)
+        self.wait_seconds = MICRO_BATCH_WAIT_SECONDS.labels(model_name)
+        self.fallbacks = MICRO_BATCH_FALLBACKS.labels(model_name)
+
+
+class MicroBatcher:
+    """
+    Regroupe les prédictions unitaires d'un même modèle arrivant en même temps.
+    
+    Chaque appelant dépose son enregistrement dans la file du modèle puis attend
+    son résultat. Un thread par modèle (et par processus) attend au plus
+    `max_wait_ms` après la première requête, ou `max_rows` requêtes, puis score
+    tout le lot en un seul appel vectorisé de `score_batch(nom, enregistrements)`
+    et rend à chacun son résultat. Si le lot échoue, chaque enregistrement est
+    rescoré seul: l'erreur d'une requête ne se propage pas aux autres.
+    
+    Tailles de lot, profondeurs de file, attentes et replis sont publiés sur
+    /metrics (par modèle); `stats()` en garde le résumé pour /api/health.
+    """
+    
+    def __init__(self, score_batch: Callable[[str, List[Mapping[str, Any]]], List[Any]],
+                 max_wait_ms: float = 5.0, max_rows: int = 64):
+        self.score_batch = score_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_rows = max_rows
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+    
+    def _reset_stats(self) -> None:
+        self.batches = 0
+        self.rows = 0
+        self.fallbacks = 0
+        self.wait_seconds = 0.0
+        self.batch_sizes = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+        self.batch_sizes['+Inf'] = 0
+    
+    def _get_queue(self, model_name: str) -> _ModelQueue:
+        queue = self._queues.get(model_name)
+        if queue is None:
+            with self._lock:
+                queue = self._queues.setdefault(model_name, _ModelQueue(model_name))
+        if queue.worker_pid != os.getpid():
+            with queue.condition:
+                if queue.worker_pid != os.getpid():
+                    queue.worker_pid = os.getpid()
+                    threading.Thread(target=self._run, args=(model_name, queue),
+                                     name=f'micro-batcher-{model_name}', daemon=True).start()
+        return queue
+    
+    def submit(self, model_name: str, record: Mapping[str, Any], timeout: Optional[float] = None) -> Any:
+        """Déposer un enregistrement et attendre son résultat"""
+        future = Future()
+        queue = self._get_queue(model_name)
+        with queue.condition:
+            queue.pending.append((record, future, time.perf_counter()))
+            depth = len(queue.pending)
+            if depth > queue.max_depth:
+                queue.max_depth = depth
+            queue.condition.notify()
+        queue.queue_depth.observe(depth)
+        return future.result(timeout)
+    
+    def _collect(self, queue: _ModelQueue) -> list:
+        """Attendre la première requête, puis la fenêtre ou le lot plein"""
+        with queue.condition:
+            while not queue.pending:
+                queue.condition.wait()
+            deadline = queue.pending[0][2] + self.max_wait
+            while len(queue.pending) < self.max_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                queue.condition.wait(remaining)
+            count = min(len(queue.pending), self.max_rows)
+            return [queue.pending.popleft() for _ in range(count)]
+    
+    def _run(self, model_name: str, queue: _ModelQueue) -> None:
+        while queue.worker_pid == os.getpid():
+            batch = self._collect(queue)
+            started = time.perf_counter()
+            records = [record for record, _, _ in batch]
+            try:
+                results = self.score_batch(model_name, records)
+            except Exception:
+                results = None
+            
+            if results is not None:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            else:
+                with self._stats_lock:
+                    self.fallbacks += 1
+                queue.fallbacks.inc()
+                for record, future, _ in batch:
+                    try:
+                        future.set_result(self.score_batch(model_name, [record])[0])
+                    except Exception as e:
+                        future.set_exception(e)
+            
+            waits = [started - enqueued for _, _, enqueued in batch]
+            for wait in waits:
+                queue.wait_seconds.observe(wait)
+            queue.batch_size.observe(len(batch))
+            self._record_batch(len(batch), sum(waits))
+    
+    def _record_batch(self, size: int, wait_seconds: float) -> None:
+        with self._stats_lock:
+            self.batches += 1
+            self.rows += size
+            self.wait_seconds += wait_seconds
+            bucket = next((bound for bound in BATCH_SIZE_BUCKETS if size <= bound), '+Inf')
+            self.batch_sizes[bucket] += 1
+    
+    def queue_depths(self) -> Dict[str, int]:
+        """Requêtes en attente par modèle"""
+        return {name: len(queue.pending) for name, queue in list(self._queues.items())}
+    
+    def max_queue_depth(self) -> int:
+        """Plus grande profondeur de file observée, tous modèles confondus"""
+        return max((queue.max_depth for queue in list(self._queues.values())), default=0)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Profondeur des files, tailles de lot et attente moyenne"""
+        with self._stats_lock:
+            return {
+                'max_wait_ms': self.max_wait * 1000,
+                'max_rows': self.max_rows,
+                'queue_depth': self.queue_depths(),
+                'max_queue_depth': self.max_queue_depth(),
+                'batches': self.batches,
+                'rows': self.rows,
+                'mean_batch_size': round(self.rows / self.batches, 2) if self.batches else 0.0,
+                'mean_wait_ms': round(self.wait_seconds / self.rows * 1000, 3) if self.rows else 0.0,
+                'batch_size_histogram': {str(bound): count for bound, count in self.batch_sizes.items()},
+                'fallbacks': self.fallbacks
+            }
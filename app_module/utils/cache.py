@@ -0,0 +1,110 @@
+"""
+Cache LRU borné des prédictions tabulaires
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+from app_module.config.settings import Config
+from app_module.utils.data import FEATURE_COLUMNS, NUMERIC_COLUMNS
+
+
+class PredictionCache:
+    """
+    Cache LRU thread-safe avec expiration (TTL) et compteurs de hits/misses.
+    
+    Les clés sont des tuples dont le premier élément est le nom du modèle,
+    ce qui permet d'invalider toutes les entrées d'un modèle rechargé.
+    """
+    
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Valeur en cache (None si absente ou expirée)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """Ajouter une valeur, en évinçant la moins récemment utilisée si nécessaire"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, model_name: Optional[str] = None) -> int:
+        """Supprimer les entrées d'un modèle (ou toutes), retourne le nombre supprimé"""
+        with self._lock:
+            if model_name is None:
+                count = len(self._data)
+                self._data.clear()
+                return count
+            keys = [key for key in self._data if key[0] == model_name]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs exposés par /api/health"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def canonical_features(record: Mapping[str, Any]) -> Optional[tuple]:
+    """
+    Forme canonique d'un enregistrement pour la clé de cache.
+    
+    Le BMI est arrondi à la précision du formulaire; un enregistrement plus précis
+    que cette précision (ou non hashable) n'est pas mis en cache, pour ne jamais
+    renvoyer le résultat d'une entrée différente.
+    """
+    values = []
+    try:
+        for col in FEATURE_COLUMNS:
+            value = record[col]
+            if col in NUMERIC_COLUMNS:
+                value = float(value)
+                if col == 'BMI':
+                    rounded = round(value, Config.PREDICTION_CACHE_BMI_DECIMALS)
+                    if rounded != value:
+                        return None
+                    value = rounded
+            hash(value)
+            values.append(value)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return tuple(values)
+
+
+# Instance globale
+prediction_cache = PredictionCache(Config.PREDICTION_CACHE_SIZE, Config.PREDICTION_CACHE_TTL)
@@ -6,8 +6,10 @@ import os
 from datetime import datetime
 from typing import Dict, Any, Optional
 from app_module.config.settings import Config
+from app_module.utils.metrics import STAGE_SECONDS, timed
 
 
+@timed(STAGE_SECONDS, 'certificate_rendering')
 def generate_certificate_image(
     test_id: int,
     prediction: int,
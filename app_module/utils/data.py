@@ -1,8 +1,54 @@
 """
 Utilitaires pour traitement des données
 """
+import math
 import pandas as pd
-from typing import Dict, List
+from typing import Any, Dict, List, Mapping, Tuple, Union
+from app_module.utils.metrics import STAGE_SECONDS, timed
+
+
+# Colonnes attendues par les pipelines, dans l'ordre du dataset, avec leur valeur par défaut
+FEATURE_DEFAULTS = {
+    'HeartDisease': 'No',
+    'BMI': 25.0,
+    'Smoking': 'No',
+    'AlcoholDrinking': 'No',
+    'Stroke': 'No',
+    'PhysicalHealth': 0.0,
+    'MentalHealth': 0.0,
+    'DiffWalking': 'No',
+    'Sex': 'Male',
+    'AgeCategory': '18-24',
+    'Race': 'White',
+    'Diabetic': 'No',
+    'PhysicalActivity': 'Yes',
+    'GenHealth': 'Fair',
+    'SleepTime': 7.0,
+    'Asthma': 'No',
+    'KidneyDisease': 'No'
+}
+
+FEATURE_COLUMNS = list(FEATURE_DEFAULTS)
+
+NUMERIC_COLUMNS = ['BMI', 'PhysicalHealth', 'MentalHealth', 'SleepTime']
+
+# Modalités connues pour chaque colonne catégorielle (cf. data/dataset.csv)
+CATEGORY_VALUES = {
+    'HeartDisease': ['No', 'Yes'],
+    'Smoking': ['No', 'Yes'],
+    'AlcoholDrinking': ['No', 'Yes'],
+    'Stroke': ['No', 'Yes'],
+    'DiffWalking': ['No', 'Yes'],
+    'Sex': ['Female', 'Male'],
+    'AgeCategory': ['18-24', '25-29', '30-34', '35-39', '40-44', '45-49', '50-54',
+                    '55-59', '60-64', '65-69', '70-74', '75-79', '80 or older'],
+    'Race': ['American Indian/Alaskan Native', 'Asian', 'Black', 'Hispanic', 'Other', 'White'],
+    'Diabetic': ['No', 'No, borderline diabetes', 'Yes', 'Yes (during pregnancy)'],
+    'PhysicalActivity': ['No', 'Yes'],
+    'GenHealth': ['Excellent', 'Very good', 'Good', 'Fair', 'Poor'],
+    'Asthma': ['No', 'Yes'],
+    'KidneyDisease': ['No', 'Yes']
+}
 
 
 def binary_transform(df: pd.DataFrame) -> pd.DataFrame:
@@ -10,6 +56,34 @@ def binary_transform(df: pd.DataFrame) -> pd.DataFrame:
     return df.applymap(lambda x: 1 if x == "Yes" else 0)
 
 
+def _finite_float(col: str, value: Any) -> float:
+    """Valeur numérique finie ("nan", "inf" refusés, comme dans le chemin par lots)"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"Valeur invalide pour {col}: {value!r}")
+    return number
+
+
+@timed(STAGE_SECONDS, 'prepare_input')
+def prepare_prediction_record(form_data: Mapping) -> Dict[str, Any]:
+    """
+    Préparer un enregistrement (dict) complet à partir du formulaire,
+    sans passer par pandas
+    
+    Args:
+        form_data: Données du formulaire Flask
+        
+    Returns:
+        Dictionnaire colonne -> valeur, dans l'ordre de FEATURE_COLUMNS
+    """
+    return {
+        col: _finite_float(col, form_data.get(col, default)) if col in NUMERIC_COLUMNS
+        else form_data.get(col, default)
+        for col, default in FEATURE_DEFAULTS.items()
+    }
+
+
+@timed(STAGE_SECONDS, 'prepare_input')
 def prepare_prediction_input(form_data: Dict) -> pd.DataFrame:
     """
     Préparer les données du formulaire pour la prédiction
@@ -20,26 +94,69 @@ def prepare_prediction_input(form_data: Dict) -> pd.DataFrame:
     Returns:
         DataFrame prêt pour la prédiction
     """
-    data = {
-        'HeartDisease': [form_data.get('HeartDisease', 'No')],
-        'BMI': [float(form_data.get('BMI', 25.0))],
-        'Smoking': [form_data.get('Smoking', 'No')],
-        'AlcoholDrinking': [form_data.get('AlcoholDrinking', 'No')],
-        'Stroke': [form_data.get('Stroke', 'No')],
-        'PhysicalHealth': [float(form_data.get('PhysicalHealth', 0.0))],
-        'MentalHealth': [float(form_data.get('MentalHealth', 0.0))],
-        'DiffWalking': [form_data.get('DiffWalking', 'No')],
-        'Sex': [form_data.get('Sex', 'Male')],
-        'AgeCategory': [form_data.get('AgeCategory', '18-24')],
-        'Race': [form_data.get('Race', 'White')],
-        'Diabetic': [form_data.get('Diabetic', 'No')],
-        'PhysicalActivity': [form_data.get('PhysicalActivity', 'Yes')],
-        'GenHealth': [form_data.get('GenHealth', 'Fair')],
-        'SleepTime': [float(form_data.get('SleepTime', 7.0))],
-        'Asthma': [form_data.get('Asthma', 'No')],
-        'KidneyDisease': [form_data.get('KidneyDisease', 'No')]
-    }
-    return pd.DataFrame(data)
+    record = prepare_prediction_record(form_data)
+    return pd.DataFrame({col: [value] for col, value in record.items()})
+
+
+def prepare_batch_prediction_input(
+    records: Union[List[Mapping[str, Any]], pd.DataFrame]
+) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Préparer un lot d'enregistrements patients pour une prédiction vectorisée
+    
+    Les valeurs par défaut sont celles de `prepare_prediction_input`. La validation
+    est faite colonne par colonne : une ligne invalide est écartée et signalée,
+    sans faire échouer le reste du lot.
+    
+    Args:
+        records: Liste de dictionnaires (JSON) ou DataFrame (CSV)
+        
+    Returns:
+        (DataFrame des lignes valides indexé par leur position d'origine,
+         liste des erreurs {'index', 'error'} pour les lignes rejetées)
+    """
+    errors: Dict[int, List[str]] = {}
+    
+    if isinstance(records, pd.DataFrame):
+        raw = records.reset_index(drop=True)
+    else:
+        rows = []
+        for idx, record in enumerate(records):
+            if isinstance(record, Mapping):
+                rows.append(record)
+            else:
+                rows.append({})
+                errors[idx] = ["Enregistrement invalide (objet attendu)"]
+        raw = pd.DataFrame.from_records(rows, index=range(len(rows)))
+    
+    data = {}
+    for col, default in FEATURE_DEFAULTS.items():
+        if col in raw.columns:
+            values = raw[col].where(raw[col].notna() & (raw[col] != ''), default)
+        else:
+            values = pd.Series(default, index=raw.index)
+        
+        if col in NUMERIC_COLUMNS:
+            numeric = pd.to_numeric(values, errors='coerce')
+            invalid = numeric.isna()
+            data[col] = numeric.astype(float)
+        else:
+            values = values.astype(str)
+            invalid = ~values.isin(CATEGORY_VALUES[col])
+            data[col] = values
+        
+        for idx in raw.index[invalid]:
+            errors.setdefault(int(idx), []).append(f"Valeur invalide pour {col}: {raw.at[idx, col]!r}")
+    
+    df = pd.DataFrame(data, index=raw.index, columns=FEATURE_COLUMNS)
+    if errors:
+        df = df.drop(index=list(errors))
+    
+    error_list = [
+        {'index': idx, 'error': '; '.join(messages)}
+        for idx, messages in sorted(errors.items())
+    ]
+    return df, error_list
 
 
 def load_dataset(dataset_path: str) -> pd.DataFrame:
@@ -7,6 +7,7 @@ import os
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from app_module.config.settings import Config
+from app_module.utils.metrics import DB_SECONDS, timed_methods
 
 
 def column_exists(cursor, table_name, column_name):
@@ -16,18 +17,20 @@ def column_exists(cursor, table_name, column_name):
     return column_name in columns
 
 
+@timed_methods(DB_SECONDS)
 class TestDatabase:
     """Gestionnaire de base de données pour les tests"""
     
     def __init__(self, db_path: Optional[str] = None):
         """Initialiser la connexion à la base de données"""
         if db_path is None:
-            db_path = os.path.join(Config.BASE_DIR, 'data', 'tests.db')
+            db_path = Config.DATABASE_PATH
         
         # Créer le répertoire si nécessaire
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
         self.db_path = db_path
+        self._shadow_table_ready = False
         self.init_database()
         self.migrate_database()
     
@@ -187,6 +190,110 @@ class TestDatabase:
         
         return result['count'] if result else 0
     
+    def _ensure_shadow_table(self, cursor):
+        """Créer la table shadow à la première écriture (jamais à l'import)"""
+        if self._shadow_table_ready:
+            return
+        
+        # Comparaison version active / version shadow d'un modèle
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shadow_predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                model_name TEXT NOT NULL,
+                active_version TEXT,
+                shadow_version TEXT NOT NULL,
+                active_prediction INTEGER,
+                active_probability REAL,
+                shadow_prediction INTEGER,
+                shadow_probability REAL,
+                active_latency_ms REAL,
+                shadow_latency_ms REAL,
+                input_features TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_shadow_model
+            ON shadow_predictions (model_name, shadow_version)
+        ''')
+        self._shadow_table_ready = True
+    
+    def save_shadow_prediction(
+        self,
+        model_name: str,
+        active_version: Optional[str],
+        shadow_version: str,
+        active_prediction: Optional[int],
+        active_probability: Optional[float],
+        shadow_prediction: Optional[int],
+        shadow_probability: Optional[float],
+        active_latency_ms: float,
+        shadow_latency_ms: float,
+        input_features: Dict[str, Any]
+    ) -> int:
+        """Enregistrer une prédiction shadow à côté de celle de la version active"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        self._ensure_shadow_table(cursor)
+        
+        cursor.execute('''
+            INSERT INTO shadow_predictions
+            (model_name, active_version, shadow_version, active_prediction, active_probability,
+             shadow_prediction, shadow_probability, active_latency_ms, shadow_latency_ms, input_features)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            model_name,
+            active_version,
+            shadow_version,
+            active_prediction,
+            active_probability,
+            shadow_prediction,
+            shadow_probability,
+            active_latency_ms,
+            shadow_latency_ms,
+            json.dumps(input_features)
+        ))
+        
+        row_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        
+        return row_id
+    
+    def get_shadow_summary(self, model_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Accord et latences active/shadow par modèle et version shadow"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        # Aucune comparaison shadow enregistrée: la table n'existe pas encore
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'shadow_predictions'"
+        )
+        if cursor.fetchone() is None:
+            conn.close()
+            return []
+        
+        query = '''
+            SELECT model_name, active_version, shadow_version,
+                   COUNT(*) AS count,
+                   AVG(active_prediction = shadow_prediction) AS agreement_rate,
+                   AVG(ABS(active_probability - shadow_probability)) AS mean_abs_probability_diff,
+                   AVG(active_latency_ms) AS active_latency_ms,
+                   AVG(shadow_latency_ms) AS shadow_latency_ms
+            FROM shadow_predictions
+        '''
+        params = ()
+        if model_name:
+            query += ' WHERE model_name = ?'
+            params = (model_name,)
+        query += ' GROUP BY model_name, active_version, shadow_version'
+        
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
     def get_risk_count(self) -> int:
         """Obtenir le nombre de tests avec risque détecté (prediction=1)"""
         conn = self.get_connection()
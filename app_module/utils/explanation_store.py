@@ -0,0 +1,189 @@
+"""
+Stockage persistant des explications (SHAP, LIME) dans SQLite
+
+Une explication ne dépend que de la version du modèle et de l'entrée: elle est
+stockée, compressée (zlib), sous la clé (explainer, empreinte du modèle, hash
+canonique de l'entrée et des paramètres) et relue par une recherche indexée au
+lieu d'être recalculée. Les entrées trop anciennes ou en surnombre sont évincées.
+"""
+import functools
+import hashlib
+import json
+import numbers
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import pandas as pd
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from app_module.config.settings import Config
+
+
+def input_hash(df_input: pd.DataFrame, params: Dict[str, Any]) -> str:
+    """Hash canonique des entrées (colonnes, valeurs numériques en float) et des paramètres"""
+    rows = [
+        [float(value) if isinstance(value, numbers.Number) else str(value) for value in row]
+        for row in df_input.to_numpy(dtype=object).tolist()
+    ]
+    payload = json.dumps([list(map(str, df_input.columns)), rows, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ExplanationStore:
+    """Explications compressées, clé (explainer, empreinte, hash d'entrée)"""
+    
+    def __init__(self, db_path: Optional[str] = None, max_age: Optional[float] = None,
+                 max_entries: Optional[int] = None, evict_every: int = 100):
+        self.db_path = db_path or Config.EXPLANATION_STORE_PATH
+        self.max_age = Config.EXPLANATION_STORE_MAX_AGE if max_age is None else max_age
+        self.max_entries = Config.EXPLANATION_STORE_MAX_ENTRIES if max_entries is None else max_entries
+        self.evict_every = evict_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+    
+    def get_connection(self):
+        """Connexion du thread courant, gardée ouverte (schéma créé à la première utilisation)"""
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self.init_database()
+                    self._initialized = True
+        # Une connexion héritée d'un fork n'est pas réutilisée
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.db_path, timeout=5)
+            self._local.pid = os.getpid()
+        return self._local.conn
+    
+    def init_database(self):
+        """Créer la table et ses index (WAL: lectures concurrentes entre workers)"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS explanations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                explainer TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                input_hash TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                payload BLOB NOT NULL,
+                UNIQUE (explainer, fingerprint, input_hash)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_explanations_created ON explanations (created_at)')
+        conn.commit()
+        conn.close()
+    
+    def get(self, explainer: str, fingerprint: str, key: str) -> Optional[Dict[str, Any]]:
+        """Explication stockée (None si absente ou expirée)"""
+        conn = self.get_connection()
+        row = conn.execute('''
+            SELECT payload FROM explanations
+            WHERE explainer = ? AND fingerprint = ? AND input_hash = ? AND created_at >= ?
+        ''', (explainer, fingerprint, key, time.time() - self.max_age)).fetchone()
+        
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+    
+    def put(self, explainer: str, fingerprint: str, key: str, explanation: Dict[str, Any]) -> None:
+        """Stocker une explication (remplace une entrée de même clé)"""
+        payload = zlib.compress(json.dumps(explanation).encode('utf-8'))
+        conn = self.get_connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO explanations (explainer, fingerprint, input_hash, created_at, payload)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (explainer, fingerprint, key, time.time(), payload))
+        conn.commit()
+        
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self.evict()
+    
+    def evict(self) -> int:
+        """Supprimer les entrées plus vieilles que max_age, puis les plus anciennes au-delà de max_entries"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM explanations WHERE created_at < ?', (time.time() - self.max_age,))
+        removed = cursor.rowcount
+        cursor.execute('''
+            DELETE FROM explanations WHERE id IN (
+                SELECT id FROM explanations ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+        removed += cursor.rowcount
+        conn.commit()
+        return removed
+    
+    def stats(self) -> Dict[str, Any]:
+        conn = self.get_connection()
+        count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM explanations').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': count,
+            'payload_bytes': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def _store_key(explainer: str, model: Any, df_input: pd.DataFrame,
+               params: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """Clé d'une explication d'un modèle servi (None pour un modèle non servi)"""
+    from app_module.utils.models import ModelManager
+    
+    served = ModelManager.find_served(model)
+    if served is None or served[1].fingerprint is None:
+        return None
+    return explainer, served[1].fingerprint, input_hash(df_input, params)
+
+
+def stored_explanation(explainer: str, settings: Sequence[str] = ()) -> Callable:
+    """
+    Décorateur d'une fonction `explain(model, df_input, **params)`: le store est
+    consulté avant le calcul et alimenté après, sauf erreur ou résultat tronqué
+    (`truncated`, arrêt sur budget de temps). Les attributs de Config listés dans
+    `settings` font partie de la clé.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(model: Any, df_input: pd.DataFrame, *args, **kwargs) -> Dict[str, Any]:
+            if not Config.EXPLANATION_STORE_ENABLED:
+                return func(model, df_input, *args, **kwargs)
+            
+            params = {'args': list(args), 'kwargs': kwargs}
+            params.update({name: getattr(Config, name) for name in settings})
+            key = None
+            try:
+                key = _store_key(explainer, model, df_input, params)
+                cached = explanation_store.get(*key) if key else None
+            except sqlite3.Error as e:
+                print(f"✗ Store d'explications indisponible: {e}")
+                cached = None
+            if cached is not None:
+                return cached
+            
+            result = func(model, df_input, *args, **kwargs)
+            if key is not None and 'error' not in result and not result.get('truncated'):
+                try:
+                    explanation_store.put(*key, result)
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    print(f"✗ Explication non stockée: {e}")
+            return result
+        return wrapper
+    return decorator
+
+
+# Instance globale
+explanation_store = ExplanationStore()
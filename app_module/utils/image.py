@@ -0,0 +1,19 @@
+"""
+Prétraitement des images pour le modèle de classification (lésions cutanées)
+"""
+import io
+import numpy as np
+from PIL import Image
+
+
+def preprocess_image(image_bytes: bytes, img_size: int) -> np.ndarray:
+    """
+    Décoder une image, la redimensionner et la normaliser
+    
+    Returns:
+        Lot d'une image (1, img_size, img_size, 3), valeurs dans [0, 1]
+    """
+    img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    img = img.resize((img_size, img_size))
+    img_array = np.array(img) / 255.0
+    return np.expand_dims(img_array, axis=0)
@@ -0,0 +1,193 @@
+"""
+Index de voisinage précalculé pour le modèle KNN.
+
+`KNeighborsClassifier` (brute force, la dimension dépasse le seuil des arbres
+KD/Ball) passe à chaque requête par pandas, le ColumnTransformer, la validation
+sklearn et recalcule les normes de toute la matrice d'entraînement. L'index
+stocke la matrice transformée (float64 contiguë), ses normes au carré et les
+labels encodés en fichiers `.npy` mappés en mémoire (partagés entre workers),
+et interroge directement le noyau brute force par blocs de sklearn (`ArgKmin`).
+
+Même noyau, mêmes données, mêmes normes: les voisins retenus, y compris entre
+ex aequo, sont ceux de l'estimateur, ce que vérifie la construction. Un arbre
+KD/Ball ou une matrice float32 arrondiraient autrement les distances et
+départageraient différemment les voisins à égalité.
+
+Construction:
+    python -m app_module.utils.knn_index [--models knn]
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from typing import Any, Optional
+from sklearn.neighbors import KNeighborsClassifier
+from app_module.config.settings import Config
+
+try:
+    # Noyau brute force de sklearn (API interne, stable pour la version épinglée)
+    from sklearn.metrics._pairwise_distances_reduction import ArgKmin
+    from sklearn.metrics._pairwise_distances_reduction._base import _sqeuclidean_row_norms64
+except ImportError:
+    ArgKmin = None
+
+INDEX_ARRAYS = ('X', 'sq_norms', 'labels')
+
+
+def supports_index(estimator: Any) -> bool:
+    """KNN euclidien à poids uniformes, mono-sortie"""
+    return (
+        ArgKmin is not None
+        and isinstance(estimator, KNeighborsClassifier)
+        and estimator.weights == 'uniform'
+        and getattr(estimator, 'effective_metric_', None) == 'euclidean'
+        and not getattr(estimator, 'outputs_2d_', False)
+    )
+
+
+class KNNIndex:
+    """Recherche exacte des k plus proches voisins sur une matrice (éventuellement mappée)"""
+    
+    def __init__(self, X: np.ndarray, sq_norms: np.ndarray, labels: np.ndarray,
+                 classes: np.ndarray, n_neighbors: int):
+        self.X = X
+        self.sq_norms = sq_norms
+        self.labels = labels
+        self.classes_ = np.asarray(classes)
+        self.n_neighbors = n_neighbors
+    
+    @classmethod
+    def from_estimator(cls, estimator: KNeighborsClassifier) -> 'KNNIndex':
+        """Extraire la matrice d'entraînement d'un KNN sklearn ajusté"""
+        if not supports_index(estimator):
+            raise ValueError("Estimateur KNN non supporté par l'index")
+        X = np.ascontiguousarray(estimator._fit_X, dtype=np.float64)
+        return cls(
+            X=X,
+            sq_norms=np.asarray(_sqeuclidean_row_norms64(X, 1)),
+            labels=np.asarray(estimator._y, dtype=np.int64),
+            classes=estimator.classes_,
+            n_neighbors=estimator.n_neighbors
+        )
+    
+    def kneighbors(self, Q: np.ndarray, return_distance: bool = True) -> Any:
+        """Distances et indices des k plus proches voisins (comme `KNeighborsClassifier.kneighbors`)"""
+        Q = np.ascontiguousarray(Q, dtype=np.float64)
+        return ArgKmin.compute(
+            X=Q,
+            Y=self.X,
+            k=self.n_neighbors,
+            metric='euclidean',
+            metric_kwargs={'Y_norm_squared': self.sq_norms},
+            strategy='auto',
+            return_distance=return_distance
+        )
+    
+    def predict_proba(self, Q: np.ndarray) -> np.ndarray:
+        """Proportion de chaque classe parmi les k voisins (comme `KNeighborsClassifier`)"""
+        indices = self.kneighbors(Q, return_distance=False)
+        neighbor_labels = self.labels[indices]
+        proba = np.zeros((len(indices), len(self.classes_)), dtype=np.float64)
+        rows = np.arange(len(indices))
+        for j in range(self.n_neighbors):
+            proba[rows, neighbor_labels[:, j]] += 1.0
+        return proba / self.n_neighbors
+    
+    def predict(self, Q: np.ndarray) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(Q), axis=1)]
+    
+    def save(self, directory: str, fingerprint: Optional[str]) -> None:
+        """Écrire l'index (.npy mappables + meta.json avec l'empreinte du modèle source)"""
+        os.makedirs(directory, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        meta = {
+            'fingerprint': fingerprint,
+            'n_neighbors': self.n_neighbors,
+            'classes': self.classes_.tolist(),
+            'n_samples': int(self.X.shape[0]),
+            'n_features': int(self.X.shape[1]),
+            'built_at': time.time()
+        }
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+    
+    @classmethod
+    def load(cls, directory: str, fingerprint: Optional[str] = None) -> Optional['KNNIndex']:
+        """Charger un index mappé en mémoire (None s'il est absent ou construit pour un autre modèle)"""
+        meta_path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if fingerprint is not None and meta.get('fingerprint') != fingerprint:
+            print(f"✗ Index KNN obsolète ignoré: {directory}")
+            return None
+        
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in INDEX_ARRAYS}
+        return cls(classes=np.asarray(meta['classes']), n_neighbors=meta['n_neighbors'], **arrays)
+
+
+def index_directory(model_name: str) -> str:
+    return os.path.join(Config.KNN_INDEX_DIR, model_name)
+
+
+def check_parity(index: KNNIndex, estimator: KNeighborsClassifier, X: np.ndarray) -> int:
+    """Nombre de lignes où l'index et l'estimateur donnent des probabilités différentes"""
+    expected = estimator.predict_proba(X)
+    return int((index.predict_proba(X) != expected).any(axis=1).sum())
+
+
+def attach_knn_index(model_name: str, compiled: Any, fingerprint: Optional[str]) -> bool:
+    """Servir le KNN d'une pipeline compilée depuis son index précalculé, s'il existe et est à jour"""
+    if compiled is None or not supports_index(compiled.estimator):
+        return False
+    index = KNNIndex.load(index_directory(model_name), fingerprint)
+    if index is None or index.X.shape[1] != compiled.n_features:
+        return False
+    compiled.estimator = index
+    return True
+
+
+def build_knn_index(model: Any, sample_size: int = 2000) -> KNNIndex:
+    """Construire l'index d'une pipeline KNN et vérifier la parité avec l'estimateur"""
+    from app_module.utils.models import _parity_probe
+    
+    estimator = model.named_steps['clf']
+    index = KNNIndex.from_estimator(estimator)
+    
+    rng = np.random.RandomState(0)
+    sample = index.X[rng.choice(len(index.X), size=min(sample_size, len(index.X)), replace=False)]
+    probe = model.named_steps['preprocess'].transform(_parity_probe())
+    for X in (sample, np.asarray(probe, dtype=np.float64)):
+        mismatches = check_parity(index, estimator, X)
+        if mismatches:
+            raise ValueError(f"Index KNN différent de l'estimateur sur {mismatches} lignes")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construire l'index de voisinage des modèles KNN")
+    parser.add_argument('--models', nargs='*', help="Modèles à indexer (tous les KNN par défaut)")
+    args = parser.parse_args()
+    
+    from app_module.utils.models import ModelManager
+    
+    models = ModelManager.load_models()
+    names = args.models or [
+        name for name, model in models.items()
+        if hasattr(model, 'named_steps') and supports_index(model.named_steps.get('clf'))
+    ]
+    for name in names:
+        name = ModelManager.resolve_name(name)
+        start = time.perf_counter()
+        index = build_knn_index(models[name])
+        directory = index_directory(name)
+        index.save(directory, ModelManager.get_fingerprint(name))
+        print(f"✓ Index KNN sauvegardé: {directory} ({index.X.shape[0]} lignes, "
+              f"{time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
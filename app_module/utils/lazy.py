@@ -0,0 +1,175 @@
+"""
+Imports différés des sous-systèmes lourds (SHAP, LIME, matplotlib, Dash)
+
+Un module déclaré par `lazy_import` n'est importé qu'au premier accès à l'un
+de ses attributs; le dashboard Dash n'est construit qu'à la première requête
+sous /dashboard/ (`LazyMount`). Avec `EAGER_IMPORTS=true`, `preload()` charge
+tout au démarrage (master gunicorn en preload: les workers héritent des
+modules déjà importés).
+
+Profil des imports (style `python -X importtime`):
+    python -m app_module.utils.lazy --profile [--eager] [--top 25]
+"""
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Modules qui déclarent des imports différés, chargés par `preload()`
+SUBSYSTEMS = (
+    'app_module.utils.xai',
+    'app_module.utils.report',
+    'app_module.utils.certificate'
+)
+
+_lazy_modules: List['LazyModule'] = []
+_lazy_mounts: List['LazyMount'] = []
+
+
+class LazyModule(types.ModuleType):
+    """Module importé au premier accès à un attribut (`before` appelé juste avant)"""
+    
+    def __init__(self, name: str, before: Optional[Callable[[], None]] = None):
+        super().__init__(name)
+        self._lazy_before = before
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+    
+    def _load(self) -> types.ModuleType:
+        if self._lazy_module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    start = time.perf_counter()
+                    if self._lazy_before is not None:
+                        self._lazy_before()
+                    module = importlib.import_module(self.__name__)
+                    self._lazy_module = module
+                    print(f"✓ Import différé: {self.__name__} ({time.perf_counter() - start:.2f}s)")
+        return self._lazy_module
+    
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+    
+    @property
+    def loaded(self) -> bool:
+        return self._lazy_module is not None
+
+
+def lazy_import(name: str, before: Optional[Callable[[], None]] = None) -> LazyModule:
+    """Déclarer un import différé (remplace `import name` au niveau module)"""
+    module = LazyModule(name, before)
+    _lazy_modules.append(module)
+    return module
+
+
+class LazyMount:
+    """
+    Middleware WSGI: les requêtes sous `prefix` vont à une application construite
+    à la première d'entre elles par `factory` (les autres vont à `app`)
+    """
+    
+    def __init__(self, app: Callable, prefix: str, factory: Callable[[], Callable]):
+        self.app = app
+        self.prefix = prefix.rstrip('/')
+        self.factory = factory
+        self._mounted = None
+        self._lock = threading.Lock()
+        _lazy_mounts.append(self)
+    
+    def mount(self) -> Callable:
+        if self._mounted is None:
+            with self._lock:
+                if self._mounted is None:
+                    start = time.perf_counter()
+                    self._mounted = self.factory()
+                    print(f"✓ Montage différé: {self.prefix} ({time.perf_counter() - start:.2f}s)")
+        return self._mounted
+    
+    def __call__(self, environ: Dict[str, Any], start_response: Callable):
+        path = environ.get('PATH_INFO', '')
+        if path == self.prefix or path.startswith(self.prefix + '/'):
+            return self.mount()(environ, start_response)
+        return self.app(environ, start_response)
+
+
+def preload() -> List[str]:
+    """Mode eager: importer tous les modules différés et construire les montages"""
+    for name in SUBSYSTEMS:
+        importlib.import_module(name)
+    loaded = []
+    for module in list(_lazy_modules):
+        try:
+            module._load()
+            loaded.append(module.__name__)
+        except ImportError as e:
+            print(f"✗ Préchargement {module.__name__} impossible: {e}")
+    for mount in list(_lazy_mounts):
+        mount.mount()
+        loaded.append(mount.prefix)
+    return loaded
+
+
+def status() -> Dict[str, bool]:
+    """Sous-systèmes différés déjà chargés"""
+    report = {module.__name__: module.loaded for module in _lazy_modules}
+    report.update({mount.prefix: mount._mounted is not None for mount in _lazy_mounts})
+    return report
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Lignes de `-X importtime` -> (module, profondeur, self µs, cumulé µs)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def profile(eager: bool = False) -> Dict[str, Any]:
+    """Importer l'application (create_app) dans un processus neuf sous `-X importtime`"""
+    code = (
+        "import time; t = time.perf_counter(); "
+        "from app_module import create_app; app = create_app(); "
+        "print('create_app', time.perf_counter() - t)"
+    )
+    env = dict(os.environ, EAGER_IMPORTS='true' if eager else 'false')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True,
+                            text=True, env=env, cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    seconds = next(float(line.split()[1]) for line in result.stdout.splitlines() if line.startswith('create_app'))
+    return {'create_app_seconds': seconds, 'imports': parse_importtime(result.stderr)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Imports différés de l'application")
+    parser.add_argument('--profile', action='store_true', help="Profil des imports au démarrage (create_app)")
+    parser.add_argument('--eager', action='store_true', help="Profiler le mode EAGER_IMPORTS=true")
+    parser.add_argument('--top', type=int, default=25, help="Nombre de modules affichés")
+    parser.add_argument('--depth', type=int, default=1, help="Profondeur maximale des modules affichés")
+    args = parser.parse_args()
+    
+    if not args.profile:
+        parser.print_help()
+        return
+    
+    report = profile(args.eager)
+    rows = [row for row in report['imports'] if row[1] <= args.depth]
+    total_us = sum(row[3] for row in report['imports'] if row[1] == 0)
+    print(f"✓ create_app: {report['create_app_seconds']:.2f}s (imports: {total_us / 1e6:.2f}s, "
+          f"{len(report['imports'])} modules, mode {'eager' if args.eager else 'différé'})")
+    print(f"{'self [us]':>10} | {'cumul [us]':>10} | module")
+    for name, depth, self_us, cumulative_us in sorted(rows, key=lambda row: -row[3])[:args.top]:
+        print(f"{self_us:>10} | {cumulative_us:>10} | {'  ' * depth}{name}")
+
+
+if __name__ == '__main__':
+    main()
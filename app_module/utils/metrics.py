@@ -0,0 +1,256 @@
+"""
+Métriques au format texte Prometheus (histogrammes et compteurs)
+
+Chaque thread écrit dans sa propre tranche (`array` préallouée): pas de verrou
+ni de structure allouée par échantillon sur le chemin chaud. Les tranches sont
+additionnées à la lecture (`/metrics`); celles des threads terminés sont alors
+fusionnées dans un total commun puis libérées.
+
+Les valeurs sont propres au processus (un worker gunicorn = une série).
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Bornes (secondes) des histogrammes de latence
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Bornes des tailles de lot et profondeurs de file du micro-batching
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class _Shard:
+    """Valeurs écrites par un seul thread: compteurs par tranche, puis somme"""
+    
+    __slots__ = ('thread', 'counts', 'total')
+    
+    def __init__(self, n_buckets: int):
+        self.thread = threading.current_thread()
+        self.counts = array('q', [0] * n_buckets)
+        self.total = array('d', [0.0])
+
+
+class _ShardedValue:
+    """Série (une combinaison de labels) répartie en tranches par thread"""
+    
+    def __init__(self, n_buckets: int):
+        self._n_buckets = n_buckets
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._retired = _Shard(n_buckets)
+        self._lock = threading.Lock()
+    
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = _Shard(self._n_buckets)
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+    
+    def snapshot(self) -> Tuple[List[int], float]:
+        """Additionner les tranches (et fusionner celles des threads terminés)"""
+        with self._lock:
+            alive = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    alive.append(shard)
+                else:
+                    for i, count in enumerate(shard.counts):
+                        self._retired.counts[i] += count
+                    self._retired.total[0] += shard.total[0]
+            self._shards = alive
+            counts = list(self._retired.counts)
+            total = self._retired.total[0]
+            for shard in alive:
+                for i, count in enumerate(shard.counts):
+                    counts[i] += count
+                total += shard.total[0]
+        return counts, total
+
+
+class _HistogramSeries(_ShardedValue):
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        super().__init__(len(self.buckets) + 1)
+    
+    def observe(self, value: float) -> None:
+        shard = self._shard()
+        shard.counts[bisect_left(self.buckets, value)] += 1
+        shard.total[0] += value
+
+
+class _CounterSeries(_ShardedValue):
+
+    def __init__(self):
+        super().__init__(1)
+    
+    def inc(self, amount: float = 1.0) -> None:
+        self._shard().total[0] += amount
+
+
+class _Metric:
+    """Métrique nommée; une série par combinaison de valeurs de labels"""
+    
+    kind = ''
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], _ShardedValue] = {}
+        self._lock = threading.Lock()
+    
+    def _new_series(self) -> _ShardedValue:
+        raise NotImplementedError
+    
+    def labels(self, *values: str):
+        """
+        Série pour ces valeurs de labels (créée une seule fois). Des labels déjà
+        en str sont cherchés tels quels: rien n'est alloué pour une série connue.
+        """
+        series = self._series.get(values)
+        if series is not None:
+            return series
+        key = tuple(str(v) for v in values)
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: labels attendus {self.labelnames}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+    
+    def _label_text(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+    
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_series(self) -> _HistogramSeries:
+        return _HistogramSeries(self.buckets)
+    
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        for key, series in sorted(self._series.items()):
+            counts, total = series.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket{self._label_text(key, ("le", le))} {cumulative}'
+            yield f'{self.name}_sum{self._label_text(key)} {total!r}'
+            yield f'{self.name}_count{self._label_text(key)} {cumulative}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    
+    def _new_series(self) -> _CounterSeries:
+        return _CounterSeries()
+    
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        for key, series in sorted(self._series.items()):
+            _, total = series.snapshot()
+            yield f'{self.name}_total{self._label_text(key)} {total!r}'
+
+
+class MetricsRegistry:
+    """Ensemble des métriques exposées sur /metrics"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+    
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def render(self) -> str:
+        """Exposition texte Prometheus (version 0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Registre global et métriques de l'application
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'app_stage_duration_seconds', "Durée des étapes de traitement", ['stage'])
+STAGE_ERRORS = registry.counter(
+    'app_stage_errors', "Étapes terminées par une exception", ['stage'])
+INFERENCE_SECONDS = registry.histogram(
+    'app_model_inference_duration_seconds', "Durée d'inférence par modèle (un appel, toutes lignes)", ['model'])
+INFERENCE_ROWS = registry.counter(
+    'app_model_inference_rows', "Lignes scorées par modèle", ['model'])
+DB_SECONDS = registry.histogram(
+    'app_db_call_duration_seconds', "Durée des appels TestDatabase", ['method'])
+MICRO_BATCH_SIZE = registry.histogram(
+    'app_micro_batch_size', "Requêtes par lot micro-batché", ['model'], buckets=BATCH_SIZE_BUCKETS)
+MICRO_BATCH_QUEUE_DEPTH = registry.histogram(
+    'app_micro_batch_queue_depth', "Profondeur de la file au dépôt d'une requête", ['model'],
+    buckets=BATCH_SIZE_BUCKETS)
+MICRO_BATCH_WAIT_SECONDS = registry.histogram(
+    'app_micro_batch_wait_seconds', "Attente d'une requête avant le scoring de son lot", ['model'])
+MICRO_BATCH_FALLBACKS = registry.counter(
+    'app_micro_batch_fallbacks', "Lots en échec rescorés ligne par ligne", ['model'])
+
+
+def timed(histogram: Histogram, label: str, errors: Optional[Counter] = STAGE_ERRORS) -> Callable:
+    """Décorateur: durée de chaque appel dans `histogram{label}`, exceptions dans `errors{label}`"""
+    def decorator(func: Callable) -> Callable:
+        series = histogram.labels(label)
+        error_series = errors.labels(label) if errors is not None else None
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                if error_series is not None:
+                    error_series.inc()
+                raise
+            finally:
+                series.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def timed_methods(histogram: Histogram) -> Callable:
+    """Décorateur de classe: chronométrer toutes les méthodes publiques (label = nom de méthode)"""
+    def decorator(cls: type) -> type:
+        for name, attr in list(vars(cls).items()):
+            if callable(attr) and not name.startswith('_'):
+                setattr(cls, name, timed(histogram, name, errors=None)(attr))
+        return cls
+    return decorator
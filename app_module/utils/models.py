@@ -1,42 +1,992 @@
 """
 Utilitaires pour le chargement et gestion des modèles
 """
+import gc
+import hashlib
 import joblib
+import json
+import numbers
 import os
-from typing import Dict, Any
+import threading
+import time
+import types
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, Any, List, Mapping, Optional, Sequence, Tuple, Union
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, OrdinalEncoder, StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.tree._tree import NODE_DTYPE, Tree
 from app_module.config.settings import Config
+from app_module.utils.batching import MicroBatcher
+from app_module.utils.cache import canonical_features, prediction_cache
+from app_module.utils.data import CATEGORY_VALUES, FEATURE_COLUMNS, FEATURE_DEFAULTS, NUMERIC_COLUMNS
+from app_module.utils.knn_index import KNNIndex, attach_knn_index
+from app_module.utils.metrics import INFERENCE_ROWS, INFERENCE_SECONDS
+from app_module.utils.shadow import shadow_scorer
+from app_module.utils.tree_compiler import FlatTreeEnsemble, compile_tree_ensemble
+
+# Entrée d'une prédiction: DataFrame ou liste d'enregistrements (dict)
+Features = Union[pd.DataFrame, Sequence[Mapping[str, Any]]]
+
+# Les arbres sklearn convertissent X en float32 avant le parcours: float32 est sans perte pour eux
+FLOAT32_ESTIMATORS = (DecisionTreeClassifier, RandomForestClassifier, ExtraTreesClassifier, GradientBoostingClassifier)
+
+
+class ModelNotFoundError(LookupError):
+    """Modèle demandé absent ou non chargé"""
+
+
+def _file_signature(path: str) -> tuple:
+    """Signature bon marché (mtime, taille) pour détecter un changement de fichier"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _is_shared_array(array: np.ndarray) -> bool:
+    """Tableau adossé à un fichier mappé en mémoire (partagé entre processus)"""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base if isinstance(array.base, np.ndarray) else None
+    return False
+
+
+def estimate_model_memory(model: Any) -> Dict[str, int]:
+    """
+    Estimer la mémoire occupée par les tableaux d'un modèle: `private_bytes` est
+    propre au processus, `shared_bytes` est mappé depuis le fichier (page cache
+    partagé entre workers).
+    """
+    usage = {'private_bytes': 0, 'shared_bytes': 0}
+    seen = set()
+    stack = [model]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        
+        if isinstance(obj, np.ndarray):
+            if obj.dtype == object:
+                stack.extend(obj.ravel())
+            elif _is_shared_array(obj):
+                usage['shared_bytes'] += obj.nbytes
+            else:
+                usage['private_bytes'] += obj.nbytes
+        elif isinstance(obj, Tree):
+            # Les noeuds sont copiés dans un buffer propre à l'arbre lors du dépickling
+            usage['private_bytes'] += obj.capacity * NODE_DTYPE.itemsize + obj.value.nbytes
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif hasattr(obj, '__dict__') and not isinstance(obj, (type, types.ModuleType)):
+            stack.extend(vars(obj).values())
+    return usage
+
+
+def file_fingerprint(path: str) -> str:
+    """Empreinte du contenu d'un fichier modèle (SHA-256 tronqué)"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()[:16]
+
+
+class ModelRegistry:
+    """
+    Registre versionné des modèles.
+    
+    Chaque nom de modèle possède plusieurs versions (chemin d'un pickle), une
+    version "active" servie aux utilisateurs, une version "shadow" optionnelle
+    évaluée en arrière-plan, et des alias. Format du manifeste (JSON, chemins
+    relatifs au dossier du manifeste):
+    
+        {"models": {"log_reg": {"active": "v2", "shadow": "v3",
+                                "aliases": ["logistic_regression"],
+                                "versions": {"v2": {"path": "..."}, "v3": {"path": "..."}}}}}
+    """
+    
+    def __init__(self, models: Dict[str, Dict[str, Any]], source: Optional[str] = None):
+        self.models = models
+        self.source = source
+        self.aliases = {}
+        for name, entry in models.items():
+            for role in ('active', 'shadow'):
+                version = entry.get(role)
+                if version is not None and version not in entry['versions']:
+                    raise ValueError(f"Version {role} inconnue pour {name}: {version}")
+            for alias in entry.get('aliases', []):
+                self.aliases[alias] = name
+    
+    @classmethod
+    def from_config(cls, models: Mapping[str, str]) -> 'ModelRegistry':
+        """Registre d'une seule version ("default") par modèle, à partir de `Config.MODELS`"""
+        return cls({
+            name: {'active': 'default', 'shadow': None, 'aliases': [],
+                   'versions': {'default': {'path': path}}}
+            for name, path in models.items()
+        })
+    
+    @classmethod
+    def load(cls, path: str) -> 'ModelRegistry':
+        """Lire un manifeste JSON"""
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        base_dir = os.path.dirname(os.path.abspath(path))
+        models = {}
+        for name, entry in manifest['models'].items():
+            versions = {
+                version: dict(info, path=os.path.join(base_dir, info['path']))
+                for version, info in entry['versions'].items()
+            }
+            models[name] = {
+                'active': entry['active'],
+                'shadow': entry.get('shadow'),
+                'aliases': list(entry.get('aliases', [])),
+                'versions': versions
+            }
+        return cls(models, source=path)
+    
+    def resolve(self, name: str) -> Optional[str]:
+        """Nom canonique d'un modèle (ou d'un alias)"""
+        if name in self.models:
+            return name
+        return self.aliases.get(name)
+    
+    def names(self) -> List[str]:
+        return list(self.models)
+    
+    def version(self, name: str, role: str = 'active') -> Optional[str]:
+        """Version active ou shadow d'un modèle"""
+        entry = self.models.get(self.resolve(name))
+        return entry.get(role) if entry else None
+    
+    def path(self, name: str, role: str = 'active') -> Optional[str]:
+        """Chemin du fichier de la version active ou shadow"""
+        version = self.version(name, role)
+        if version is None:
+            return None
+        return self.models[self.resolve(name)]['versions'][version]['path']
+    
+    def active_paths(self) -> Dict[str, str]:
+        return {name: self.path(name) for name in self.models}
+
+
+def load_registry(path: Optional[str] = None) -> ModelRegistry:
+    """Charger le manifeste, ou construire le registre depuis `Config.MODELS` s'il est absent"""
+    path = path or Config.MODEL_REGISTRY_PATH
+    if path and os.path.exists(path):
+        return ModelRegistry.load(path)
+    return ModelRegistry.from_config(Config.MODELS)
+
+
+@dataclass(frozen=True)
+class ServedModel:
+    """Modèle servi et ce qui en dérive, remplacés ensemble par une seule affectation"""
+    model: Any
+    compiled: Optional['CompiledPipeline']
+    fingerprint: Optional[str]
+    signature: Optional[tuple]
+    path: Optional[str]
 
 
 class ModelManager:
-    """Gestionnaire centralisé des modèles ML"""
+    """
+    Gestionnaire centralisé des modèles ML.
+    
+    Les chargements sont protégés par un verrou (un seul chargement par fichier,
+    même si plusieurs threads arrivent en même temps). Les tableaux NumPy des
+    pickles joblib sont mappés en lecture seule (`Config.MODEL_MMAP_MODE`): avec
+    `preload()` dans le master gunicorn, les workers forkés partagent ces pages.
+    
+    Un thread de surveillance (un par processus) vérifie les fichiers toutes les
+    `Config.MODEL_CHECK_INTERVAL` secondes. Un fichier modifié est chargé et
+    préchauffé en arrière-plan puis substitué à l'ancien modèle: les requêtes en
+    cours terminent avec la référence qu'elles détiennent déjà.
+    
+    Chaque modèle est une entrée `ServedModel` (modèle, pipeline compilée,
+    empreinte, signature, chemin) et `_served` n'est jamais modifié en place: une
+    nouvelle version du dict est publiée par une seule affectation. Un lecteur
+    qui prend une entrée (`get_served`) voit donc un état cohérent, et le premier
+    chargement ne publie rien avant que tous les modèles soient prêts.
     
-    _models = {}
+    Les chemins viennent du registre (`Config.MODEL_REGISTRY_PATH`): changer la
+    version active dans le manifeste recharge le modèle de la même façon, et la
+    version shadow éventuelle est chargée à part (cf. `get_shadow`).
+    """
+    
+    _served: Dict[str, ServedModel] = {}
+    _shadow = {}
+    _registry = None
+    _registry_signature = None
+    _lock = threading.RLock()
+    _watcher_pid = None
+    _reload_listeners = []
+    _reload_history = deque(maxlen=50)
+    
+    @staticmethod
+    def _warmup(model: Any, compiled: Optional['CompiledPipeline']) -> None:
+        """Prédiction de sonde pour initialiser les chemins de calcul avant la bascule"""
+        if compiled is not None:
+            compiled.predict_proba([FEATURE_DEFAULTS])
+        if hasattr(model, 'predict_proba'):
+            model.predict_proba(pd.DataFrame([FEATURE_DEFAULTS], columns=FEATURE_COLUMNS))
+        else:
+            model.predict(pd.DataFrame([FEATURE_DEFAULTS], columns=FEATURE_COLUMNS))
+    
+    @classmethod
+    def _prepare_model(cls, model_name: str, model_path: str,
+                       reason: str = 'initial') -> Tuple[ServedModel, Dict[str, Any]]:
+        """Charger et préchauffer un modèle, sans l'activer"""
+        start = time.perf_counter()
+        signature = _file_signature(model_path)
+        fingerprint = file_fingerprint(model_path)
+        model = joblib.load(model_path, mmap_mode=Config.MODEL_MMAP_MODE)
+        compiled = compile_pipeline(model) if Config.COMPILE_PIPELINES else None
+        knn_index = attach_knn_index(model_name, compiled, fingerprint)
+        loaded = time.perf_counter()
+        
+        try:
+            cls._warmup(model, compiled)
+        except Exception as e:
+            # Un rechargement qui échoue à la sonde ne remplace pas le modèle en service
+            if reason != 'initial':
+                raise
+            print(f"✗ Préchauffage {model_name} impossible: {e}")
+        warmed = time.perf_counter()
+        
+        event = {
+            'model': model_name,
+            'reason': reason,
+            'version': cls.registry().version(model_name),
+            'fingerprint': fingerprint,
+            'compiled': compiled is not None,
+            'knn_index': knn_index,
+            'load_seconds': round(loaded - start, 4),
+            'warmup_seconds': round(warmed - loaded, 4),
+            'total_seconds': round(time.perf_counter() - start, 4),
+            'timestamp': time.time()
+        }
+        return ServedModel(model, compiled, fingerprint, signature, model_path), event
+    
+    @classmethod
+    def _swap(cls, entries: Dict[str, ServedModel]) -> Dict[str, ServedModel]:
+        """Publier des entrées par une seule affectation (appelant sous verrou); renvoie l'état précédent"""
+        previous = cls._served
+        served = dict(previous)
+        served.update(entries)
+        cls._served = served
+        return previous
+    
+    @classmethod
+    def _publish(cls, prepared: Dict[str, Tuple[ServedModel, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Activer des modèles préparés, puis invalider les caches qui en dépendent"""
+        previous = cls._swap({name: entry for name, (entry, _) in prepared.items()})
+        events = []
+        for model_name, (entry, event) in prepared.items():
+            event['previous_fingerprint'] = previous[model_name].fingerprint if model_name in previous else None
+            prediction_cache.invalidate(model_name)
+            for listener in list(cls._reload_listeners):
+                listener(model_name)
+            cls._reload_history.append(event)
+            events.append(event)
+            print(f"✓ Modèle chargé: {model_name} ({entry.fingerprint}, {event['total_seconds']}s)")
+        return events
+    
+    @classmethod
+    def _load_model(cls, model_name: str, model_path: str, reason: str = 'initial') -> Dict[str, Any]:
+        """Charger (ou recharger) un modèle, le préchauffer puis l'activer"""
+        return cls._publish({model_name: cls._prepare_model(model_name, model_path, reason)})[0]
+    
+    @classmethod
+    def registry(cls) -> ModelRegistry:
+        """Registre des modèles (manifeste lu au premier accès)"""
+        if cls._registry is None:
+            with cls._lock:
+                if cls._registry is None:
+                    cls._registry = cls._read_registry()
+        return cls._registry
+    
+    @classmethod
+    def _read_registry(cls) -> ModelRegistry:
+        path = Config.MODEL_REGISTRY_PATH
+        cls._registry_signature = _file_signature(path) if path and os.path.exists(path) else None
+        try:
+            return load_registry(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"✗ Erreur registre {path}: {e}")
+            return ModelRegistry.from_config(Config.MODELS)
+    
+    @classmethod
+    def resolve_name(cls, model_name: str) -> str:
+        """Nom canonique d'un modèle (les alias du registre sont acceptés)"""
+        return cls.registry().resolve(model_name) or model_name
     
     @classmethod
     def load_models(cls) -> Dict[str, Any]:
-        """Charger tous les modèles"""
-        if cls._models:
-            return cls._models
-        
-        for model_name, model_path in Config.MODELS.items():
-            if os.path.exists(model_path):
-                cls._models[model_name] = joblib.load(model_path)
-                print(f"✓ Modèle chargé: {model_name}")
-            else:
-                print(f"✗ Erreur: Fichier {model_path} non trouvé")
+        """Charger tous les modèles (publiés ensemble, une fois tous prêts)"""
+        if cls._served:
+            return cls._model_dict()
+        
+        with cls._lock:
+            if cls._served:
+                return cls._model_dict()
+            
+            prepared = {}
+            for model_name, model_path in cls.registry().active_paths().items():
+                if os.path.exists(model_path):
+                    prepared[model_name] = cls._prepare_model(model_name, model_path)
+                else:
+                    print(f"✗ Erreur: Fichier {model_path} non trouvé")
+            cls._publish(prepared)
+            cls._sync_shadows()
+        
+        return cls._model_dict()
+    
+    @classmethod
+    def _model_dict(cls) -> Dict[str, Any]:
+        return {name: entry.model for name, entry in cls._served.items()}
+    
+    @classmethod
+    def _sync_shadows(cls) -> None:
+        """Charger / retirer les versions shadow pour suivre le registre"""
+        registry = cls.registry()
+        for model_name in list(cls._shadow):
+            if registry.version(model_name, 'shadow') != cls._shadow[model_name][0]:
+                del cls._shadow[model_name]
         
-        return cls._models
+        for model_name in registry.names():
+            version = registry.version(model_name, 'shadow')
+            if version is None or model_name in cls._shadow:
+                continue
+            model_path = registry.path(model_name, 'shadow')
+            try:
+                model = joblib.load(model_path, mmap_mode=Config.MODEL_MMAP_MODE)
+                compiled = compile_pipeline(model) if Config.COMPILE_PIPELINES else None
+                cls._warmup(model, compiled)
+            except Exception as e:
+                print(f"✗ Erreur chargement shadow {model_name}/{version}: {e}")
+                continue
+            cls._shadow[model_name] = (version, model, compiled)
+            print(f"✓ Version shadow chargée: {model_name}/{version}")
+    
+    @classmethod
+    def preload(cls) -> Dict[str, Any]:
+        """
+        Charger les modèles avant le fork des workers (master gunicorn, cf. gunicorn.conf.py).
+        Les objets chargés sont ensuite gelés pour le GC, afin que les collectes dans
+        les workers ne réécrivent pas leurs pages (copy-on-write).
+        """
+        models = cls.load_models()
+        gc.collect()
+        gc.freeze()
+        return models
+    
+    @classmethod
+    def add_reload_listener(cls, listener: Callable[[str], None]) -> None:
+        """Enregistrer un callback appelé avec le nom du modèle après chaque (re)chargement"""
+        cls._reload_listeners.append(listener)
+    
+    @classmethod
+    def reload_model(cls, model_name: str) -> Dict[str, Any]:
+        """Recharger un modèle immédiatement (même fichier inchangé)"""
+        model_name = cls.resolve_name(model_name)
+        model_path = cls.registry().path(model_name)
+        if model_path is None or not os.path.exists(model_path):
+            raise ModelNotFoundError(f"Modèle {model_name} non trouvé")
+        with cls._lock:
+            return cls._load_model(model_name, model_path, reason='manual')
+    
+    @classmethod
+    def _check_registry(cls) -> bool:
+        """Relire le manifeste s'il a changé (True si le registre a été remplacé)"""
+        path = Config.MODEL_REGISTRY_PATH
+        if cls._registry is None or cls._registry.source is None or not os.path.exists(path):
+            return False
+        if _file_signature(path) == cls._registry_signature:
+            return False
+        try:
+            registry = ModelRegistry.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            # Manifeste en cours d'écriture ou invalide: l'ancien registre reste actif
+            print(f"✗ Erreur registre {path}: {e}")
+            return False
+        finally:
+            cls._registry_signature = _file_signature(path)
+        cls._registry = registry
+        return True
+    
+    @classmethod
+    def check_for_updates(cls) -> List[Dict[str, Any]]:
+        """
+        Recharger les modèles dont le fichier a changé (mtime/taille puis empreinte)
+        ou dont la version active a changé dans le manifeste.
+        """
+        events = []
+        with cls._lock:
+            registry_changed = cls._check_registry()
+            for model_name, model_path in cls.registry().active_paths().items():
+                entry = cls._served.get(model_name)
+                if entry is None or entry.signature is None or not os.path.exists(model_path):
+                    continue
+                signature = _file_signature(model_path)
+                if model_path != entry.path:
+                    reason = 'version_changed'
+                elif signature == entry.signature:
+                    continue
+                elif file_fingerprint(model_path) == entry.fingerprint:
+                    cls._swap({model_name: replace(entry, signature=signature)})
+                    continue
+                else:
+                    reason = 'file_changed'
+                try:
+                    events.append(cls._load_model(model_name, model_path, reason=reason))
+                except Exception as e:
+                    # Fichier en cours d'écriture ou invalide: l'ancien modèle reste actif
+                    print(f"✗ Erreur rechargement {model_name}: {e}")
+                    cls._reload_history.append({
+                        'model': model_name,
+                        'reason': reason,
+                        'error': str(e),
+                        'timestamp': time.time()
+                    })
+                    # Ne pas retenter ce fichier à chaque vérification
+                    cls._swap({model_name: replace(entry, signature=signature, path=model_path)})
+            if registry_changed:
+                cls._sync_shadows()
+        return events
+    
+    @classmethod
+    def _watch(cls) -> None:
+        while cls._watcher_pid == os.getpid():
+            time.sleep(Config.MODEL_CHECK_INTERVAL)
+            try:
+                cls.check_for_updates()
+            except Exception as e:
+                print(f"✗ Erreur surveillance modèles: {e}")
+    
+    @classmethod
+    def start_watcher(cls) -> None:
+        """Démarrer le thread de surveillance des fichiers (une fois par processus)"""
+        if not Config.MODEL_WATCH_ENABLED or cls._watcher_pid == os.getpid():
+            return
+        with cls._lock:
+            if cls._watcher_pid == os.getpid():
+                return
+            cls._watcher_pid = os.getpid()
+            threading.Thread(target=cls._watch, name='model-watcher', daemon=True).start()
+    
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        """État des modèles chargés et historique des (re)chargements"""
+        return {
+            'models': {
+                name: {
+                    'path': entry.path,
+                    'version': cls.registry().version(name),
+                    'shadow_version': cls._shadow[name][0] if name in cls._shadow else None,
+                    'aliases': cls.registry().models.get(name, {}).get('aliases', []),
+                    'fingerprint': entry.fingerprint,
+                    'compiled': entry.compiled is not None,
+                    'knn_index': isinstance(getattr(entry.compiled, 'estimator', None), KNNIndex),
+                    'flat_trees': isinstance(getattr(entry.compiled, 'estimator', None), FlatTreeEnsemble)
+                }
+                for name, entry in cls._served.items()
+            },
+            'registry': cls.registry().source,
+            'watcher': cls._watcher_pid == os.getpid(),
+            'check_interval': Config.MODEL_CHECK_INTERVAL,
+            'history': list(cls._reload_history)
+        }
+    
+    @classmethod
+    def memory_usage(cls) -> Dict[str, Dict[str, int]]:
+        """Mémoire des tableaux de chaque modèle chargé (privée / partagée)"""
+        return {name: estimate_model_memory(entry.model) for name, entry in cls._served.items()}
+    
+    @classmethod
+    def get_served(cls, model_name: str) -> Optional[ServedModel]:
+        """Entrée du modèle servi: modèle, pipeline compilée et empreinte d'une même version"""
+        if not cls._served:
+            cls.load_models()
+        cls.start_watcher()
+        return cls._served.get(cls.resolve_name(model_name))
     
     @classmethod
     def get_model(cls, model_name: str) -> Any:
         """Obtenir un modèle spécifique"""
-        if not cls._models:
+        entry = cls.get_served(model_name)
+        return entry.model if entry is not None else None
+    
+    @classmethod
+    def get_fingerprint(cls, model_name: str) -> Optional[str]:
+        """Empreinte du fichier du modèle actuellement chargé"""
+        entry = cls._served.get(model_name)
+        return entry.fingerprint if entry is not None else None
+    
+    @classmethod
+    def find_served(cls, model: Any) -> Optional[Tuple[str, ServedModel]]:
+        """Nom et entrée sous lesquels un objet modèle est actuellement servi (None sinon)"""
+        for name, entry in cls._served.items():
+            if entry.model is model:
+                return name, entry
+        return None
+    
+    @classmethod
+    def get_version(cls, model_name: str) -> Optional[str]:
+        """Version active (registre) d'un modèle"""
+        return cls.registry().version(model_name)
+    
+    @classmethod
+    def get_shadow(cls, model_name: str) -> Optional[tuple]:
+        """Version shadow chargée: (version, modèle, pipeline compilée) ou None"""
+        return cls._shadow.get(model_name)
+    
+    @classmethod
+    def get_compiled(cls, model_name: str) -> Optional['CompiledPipeline']:
+        """Obtenir la version compilée d'un modèle (None si non compilable)"""
+        if not cls._served:
             cls.load_models()
-        return cls._models.get(model_name)
+        entry = cls._served.get(model_name)
+        return entry.compiled if entry is not None else None
     
     @classmethod
     def get_all_models(cls) -> Dict[str, Any]:
         """Obtenir tous les modèles"""
-        if not cls._models:
+        if not cls._served:
             cls.load_models()
-        return cls._models
+        cls.start_watcher()
+        return cls._model_dict()
+
+
+class CompiledPipeline:
+    """
+    Version "compilée" d'une pipeline `preprocess` + `clf`.
+    
+    Les paramètres appris par le ColumnTransformer (tables binaires, catégories
+    ordinales et one-hot, moyennes et écarts-types du scaler, ordre des colonnes)
+    sont extraits une fois pour toutes: un enregistrement est alors encodé
+    directement en vecteur NumPy, sans DataFrame ni appel pandas.
+    """
+    
+    def __init__(self, steps: List[tuple], n_features: int, estimator: Any, dtype: Any = np.float32):
+        # steps: (colonne, type, position de sortie, paramètres)
+        self.steps = steps
+        self.n_features = n_features
+        self.estimator = estimator
+        self.dtype = dtype
+    
+    @staticmethod
+    def _column(features: Features, col: str) -> list:
+        if isinstance(features, pd.DataFrame):
+            return features[col].tolist()
+        return [record[col] for record in features]
+    
+    def transform(self, features: Features) -> np.ndarray:
+        """
+        Encoder des enregistrements en matrice (n, n_features).
+        Lève KeyError pour une modalité absente des tables compilées.
+        """
+        n_rows = len(features)
+        X = np.zeros((n_rows, self.n_features), dtype=np.float64)
+        
+        for col, kind, offset, params in self.steps:
+            values = self._column(features, col)
+            if kind == 'map':
+                X[:, offset] = [params[v] for v in values]
+            elif kind == 'onehot':
+                positions, ignore_unknown = params
+                for row, v in enumerate(values):
+                    pos = positions.get(v)
+                    if pos is not None:
+                        X[row, offset + pos] = 1.0
+                    elif not ignore_unknown:
+                        raise KeyError(v)
+            else:  # scale
+                mean, scale = params
+                X[:, offset] = (np.asarray(values, dtype=np.float64) - mean) / scale
+        
+        return X.astype(self.dtype, copy=False)
+    
+    def encode(self, record: Mapping[str, Any]) -> np.ndarray:
+        """Encoder un seul enregistrement en vecteur 1D"""
+        return self.transform([record])[0]
+    
+    def predict_proba(self, features: Features) -> np.ndarray:
+        """Probabilités pour toutes les classes, comme le `predict_proba` sklearn"""
+        return self.estimator.predict_proba(self.transform(features))
+
+
+def _unwrap_function_transformer(transformer: Any) -> Optional[FunctionTransformer]:
+    """FunctionTransformer éventuellement encapsulé dans une Pipeline à une étape"""
+    if isinstance(transformer, Pipeline) and len(transformer.steps) == 1:
+        transformer = transformer.steps[0][1]
+    return transformer if isinstance(transformer, FunctionTransformer) else None
+
+
+def _probe_function_transformer(transformer: FunctionTransformer, cols: List[str]) -> Dict[str, Dict[Any, float]]:
+    """Tabuler une transformation cellule par cellule sur les modalités connues"""
+    base = {col: CATEGORY_VALUES[col][0] for col in cols}
+    rows = []
+    for col in cols:
+        for value in CATEGORY_VALUES[col]:
+            rows.append({**base, col: value})
+    
+    out = np.asarray(transformer.transform(pd.DataFrame(rows, columns=cols)), dtype=np.float64)
+    tables = {col: {} for col in cols}
+    row = 0
+    for j, col in enumerate(cols):
+        for value in CATEGORY_VALUES[col]:
+            tables[col][value] = float(out[row, j])
+            row += 1
+    return tables
+
+
+def _parity_probe(n_rows: int = 64) -> pd.DataFrame:
+    """Échantillon synthétique déterministe couvrant les modalités connues"""
+    rng = np.random.RandomState(0)
+    data = {}
+    for col in FEATURE_COLUMNS:
+        if col in NUMERIC_COLUMNS:
+            data[col] = np.round(rng.uniform(0, 60, size=n_rows), 2)
+        else:
+            data[col] = rng.choice(CATEGORY_VALUES[col], size=n_rows)
+    return pd.DataFrame(data, columns=FEATURE_COLUMNS)
+
+
+def compile_pipeline(model: Any) -> Optional[CompiledPipeline]:
+    """
+    Compiler une pipeline sklearn en encodeur NumPy.
+    
+    Retourne None si une étape n'est pas supportée ou si le contrôle de parité
+    avec la pipeline d'origine échoue (le modèle reste alors servi tel quel).
+    """
+    if not isinstance(model, Pipeline):
+        return None
+    preprocess = model.named_steps.get('preprocess')
+    clf = model.named_steps.get('clf')
+    if not isinstance(preprocess, ColumnTransformer) or clf is None or not hasattr(clf, 'predict_proba'):
+        return None
+    
+    steps = []
+    offset = 0
+    try:
+        for name, transformer, cols in preprocess.transformers_:
+            if transformer == 'drop' or len(cols) == 0:
+                continue
+            cols = list(cols)
+            function_transformer = _unwrap_function_transformer(transformer)
+            
+            if function_transformer is not None:
+                tables = _probe_function_transformer(function_transformer, cols)
+                for col in cols:
+                    steps.append((col, 'map', offset, tables[col]))
+                    offset += 1
+            elif isinstance(transformer, OrdinalEncoder) and transformer.handle_unknown == 'error':
+                for col, categories in zip(cols, transformer.categories_):
+                    steps.append((col, 'map', offset, {v: float(i) for i, v in enumerate(categories)}))
+                    offset += 1
+            elif (isinstance(transformer, OneHotEncoder) and transformer.drop is None
+                  and transformer.min_frequency is None and transformer.max_categories is None):
+                ignore_unknown = transformer.handle_unknown != 'error'
+                for col, categories in zip(cols, transformer.categories_):
+                    positions = {v: i for i, v in enumerate(categories)}
+                    steps.append((col, 'onehot', offset, (positions, ignore_unknown)))
+                    offset += len(categories)
+            elif isinstance(transformer, StandardScaler):
+                means = transformer.mean_ if transformer.with_mean else np.zeros(len(cols))
+                scales = transformer.scale_ if transformer.with_std else np.ones(len(cols))
+                for col, mean, scale in zip(cols, means, scales):
+                    steps.append((col, 'scale', offset, (float(mean), float(scale))))
+                    offset += 1
+            else:
+                return None
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return None
+    
+    dtype = np.float32 if isinstance(clf, FLOAT32_ESTIMATORS) else np.float64
+    compiled = CompiledPipeline(steps, offset, clf, dtype=dtype)
+    
+    # Contrôle de parité avec la pipeline d'origine
+    try:
+        probe = _parity_probe()
+        if Config.COMPILE_TREE_ENSEMBLES:
+            # Arbres aplatis: retenus seulement si identiques à clf.predict_proba
+            flat = compile_tree_ensemble(clf, compiled.transform(probe), Config.FLAT_TREES_MAX_ROWS)
+            if flat is not None:
+                compiled.estimator = flat
+        expected = preprocess.transform(probe)
+        if hasattr(expected, 'toarray'):
+            expected = expected.toarray()
+        encoded = compiled.transform(probe)
+        if not np.allclose(np.asarray(expected, dtype=np.float64).astype(dtype), encoded, rtol=0, atol=1e-12):
+            return None
+        if not np.allclose(model.predict_proba(probe), compiled.predict_proba(probe),
+                           rtol=0, atol=Config.COMPILED_PARITY_ATOL):
+            return None
+    except Exception:
+        return None
+    
+    return compiled
+
+
+_ensemble_executor = None
+_ensemble_lock = threading.Lock()
+
+
+def _get_ensemble_executor() -> ThreadPoolExecutor:
+    """Pool de threads partagé pour l'ensemble (créé à la première utilisation)"""
+    global _ensemble_executor
+    if _ensemble_executor is None:
+        with _ensemble_lock:
+            if _ensemble_executor is None:
+                _ensemble_executor = ThreadPoolExecutor(
+                    max_workers=Config.ENSEMBLE_MAX_WORKERS,
+                    thread_name_prefix='ensemble'
+                )
+    return _ensemble_executor
+
+
+def _validate_weights(weights: Any) -> Mapping[str, float]:
+    """Poids d'ensemble: mapping modèle -> nombre fini positif ou nul (ValueError sinon)"""
+    if not isinstance(weights, Mapping):
+        raise ValueError("Les poids doivent être un objet {modèle: poids}")
+    for name, weight in weights.items():
+        if (not isinstance(weight, numbers.Real) or isinstance(weight, bool)
+                or not np.isfinite(weight) or weight < 0):
+            raise ValueError(f"Poids invalide pour {name}: {weight!r} (nombre fini positif ou nul attendu)")
+    return weights
+
+
+@dataclass(frozen=True)
+class PredictionResult:
+    """Résultat d'une prédiction tabulaire, partagé par toutes les interfaces"""
+    model: str
+    prediction: int
+    probability: Optional[float] = None
+    threshold: Optional[float] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Représentation JSON"""
+        return {
+            'prediction': self.prediction,
+            'probability': self.probability,
+            'model': self.model,
+            'threshold': self.threshold
+        }
+
+
+@dataclass
+class EnsembleResult:
+    """Résultat d'une prédiction par ensemble de modèles"""
+    method: str
+    prediction: int
+    probability: float
+    threshold: float
+    disagreement: float
+    models: Dict[str, PredictionResult] = field(default_factory=dict)
+    weights: Dict[str, float] = field(default_factory=dict)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Représentation JSON"""
+        return {
+            'prediction': self.prediction,
+            'probability': self.probability,
+            'method': self.method,
+            'threshold': self.threshold,
+            'disagreement': self.disagreement,
+            'weights': self.weights,
+            'models': {name: result.to_dict() for name, result in self.models.items()}
+        }
+
+
+class PredictionEngine:
+    """
+    Couche de prédiction au-dessus de ModelManager.
+    
+    La pipeline (preprocessing + classifieur) n'est exécutée qu'une seule fois
+    via `predict_proba`; le label est dérivé de la probabilité de la classe
+    positive et du seuil de décision du modèle (`Config.DECISION_THRESHOLDS`).
+    """
+    
+    @staticmethod
+    def get_threshold(model_name: str) -> float:
+        """Seuil de décision configuré pour un modèle"""
+        return Config.DECISION_THRESHOLDS.get(model_name, Config.DEFAULT_DECISION_THRESHOLD)
+    
+    @staticmethod
+    def _get_served(model_name: str) -> ServedModel:
+        entry = ModelManager.get_served(model_name)
+        if entry is None:
+            raise ModelNotFoundError(f"Modèle {model_name} non trouvé")
+        return entry
+    
+    @classmethod
+    def _get_model(cls, model_name: str) -> Any:
+        return cls._get_served(model_name).model
+    
+    @staticmethod
+    def _positive_index(model: Any) -> int:
+        classes = list(getattr(model, 'classes_', []))
+        return classes.index(1) if 1 in classes else -1
+    
+    @staticmethod
+    def _as_frame(features: Features) -> pd.DataFrame:
+        if isinstance(features, pd.DataFrame):
+            return features
+        return pd.DataFrame.from_records(list(features), columns=FEATURE_COLUMNS)
+    
+    @classmethod
+    def _score(cls, model: Any, compiled: Optional[CompiledPipeline], features: Features) -> np.ndarray:
+        """`predict_proba` complet: pipeline compilée, sinon (ou à défaut) pipeline d'origine"""
+        if compiled is not None:
+            try:
+                return compiled.predict_proba(features)
+            except KeyError:
+                # Modalité inconnue des tables compilées: pipeline d'origine
+                pass
+        return model.predict_proba(cls._as_frame(features))
+    
+    @classmethod
+    def predict_proba(cls, model_name: str, features: Features) -> Optional[np.ndarray]:
+        """Probabilités de la classe positive (None si le modèle n'en fournit pas)"""
+        model_name = ModelManager.resolve_name(model_name)
+        # Une seule entrée: pipeline compilée et modèle de la même version
+        entry = cls._get_served(model_name)
+        model, compiled = entry.model, entry.compiled
+        if not hasattr(model, 'predict_proba'):
+            return None
+        return cls._score(model, compiled, features)[:, cls._positive_index(model)]
+    
+    @classmethod
+    def predict_batch(cls, model_name: str, features: Features) -> List[PredictionResult]:
+        """Prédire toutes les lignes (DataFrame ou liste d'enregistrements) en une seule passe"""
+        model_name = ModelManager.resolve_name(model_name)
+        inference_seconds = INFERENCE_SECONDS.labels(model_name)
+        start = time.perf_counter()
+        try:
+            probabilities = cls.predict_proba(model_name, features)
+            if probabilities is None:
+                labels = cls._get_model(model_name).predict(cls._as_frame(features))
+        finally:
+            inference_seconds.observe(time.perf_counter() - start)
+        INFERENCE_ROWS.labels(model_name).inc(len(features))
+        
+        if probabilities is None:
+            return [PredictionResult(model=model_name, prediction=int(label)) for label in labels]
+        
+        threshold = cls.get_threshold(model_name)
+        # Strictement supérieur: à 0.5, même décision que predict() (argmax)
+        labels = probabilities > threshold
+        return [
+            PredictionResult(model=model_name, prediction=int(label),
+                             probability=float(proba), threshold=threshold)
+            for label, proba in zip(labels, probabilities)
+        ]
+    
+    @classmethod
+    def predict(cls, model_name: str, features: Union[Mapping[str, Any], pd.DataFrame]) -> PredictionResult:
+        """Prédire une seule ligne (enregistrement dict ou DataFrame d'une ligne)"""
+        if not isinstance(features, Mapping):
+            return cls.predict_batch(model_name, features)[0]
+        
+        # Enregistrement unique: consulter le cache LRU avant la pipeline
+        model_name = ModelManager.resolve_name(model_name)
+        fingerprint = cls._get_served(model_name).fingerprint
+        key_features = canonical_features(features) if prediction_cache.maxsize > 0 else None
+        if key_features is None:
+            return cls._predict_record(model_name, features)
+        
+        key = (model_name, fingerprint, key_features)
+        result = prediction_cache.get(key)
+        if result is None:
+            result = cls._predict_record(model_name, features)
+            # Rechargement pendant le calcul: le résultat peut venir de la nouvelle version
+            if ModelManager.get_fingerprint(model_name) == fingerprint:
+                prediction_cache.put(key, result)
+        return result
+    
+    @classmethod
+    def _predict_record(cls, model_name: str, record: Mapping[str, Any]) -> PredictionResult:
+        """Prédiction non cachée d'un enregistrement, soumise au shadow scoring si besoin"""
+        start = time.perf_counter()
+        if Config.MICRO_BATCH_ENABLED:
+            # Regroupé avec les requêtes concurrentes du même modèle
+            result = micro_batcher.submit(model_name, record)
+        else:
+            result = cls.predict_batch(model_name, [record])[0]
+        if ModelManager.get_shadow(model_name) is not None:
+            # Non bloquant: échantillonnage + file bornée, score dans le thread shadow
+            shadow_scorer.submit(model_name, record, result, (time.perf_counter() - start) * 1000,
+                                 ModelManager.get_version(model_name))
+        return result
+    
+    @classmethod
+    def predict_ensemble(
+        cls,
+        features: Union[Mapping[str, Any], pd.DataFrame],
+        model_names: Optional[List[str]] = None,
+        method: str = 'mean',
+        weights: Optional[Mapping[str, float]] = None
+    ) -> EnsembleResult:
+        """
+        Évaluer une ligne avec plusieurs modèles en parallèle et combiner leurs probabilités.
+        
+        Les modèles sont soumis simultanément au pool de threads (sklearn libère le GIL
+        dans les arbres et les k plus proches voisins): la latence est celle du modèle
+        le plus lent. `method` vaut 'mean' (moyenne simple) ou 'weighted' (poids de
+        `weights`, sinon `Config.ENSEMBLE_WEIGHTS`). Le désaccord est l'écart-type des
+        probabilités individuelles.
+        """
+        if method not in ('mean', 'weighted'):
+            raise ValueError(f"Méthode d'ensemble inconnue: {method}")
+        if method == 'weighted':
+            weights = _validate_weights(weights if weights is not None else Config.ENSEMBLE_WEIGHTS)
+        
+        if model_names is None:
+            model_names = list(ModelManager.get_all_models().keys())
+        for model_name in model_names:
+            cls._get_model(model_name)
+        if not model_names:
+            raise ModelNotFoundError("Aucun modèle disponible")
+        
+        executor = _get_ensemble_executor()
+        futures = {name: executor.submit(cls.predict, name, features) for name in model_names}
+        results = {name: future.result() for name, future in futures.items()}
+        scored = {name: r for name, r in results.items() if r.probability is not None}
+        if not scored:
+            raise ValueError("Aucun modèle ne fournit de probabilité")
+        
+        probabilities = np.array([r.probability for r in scored.values()])
+        if method == 'weighted':
+            used_weights = {name: float(weights.get(name, 1.0)) for name in scored}
+        else:
+            used_weights = {name: 1.0 for name in scored}
+        w = np.array(list(used_weights.values()))
+        if w.sum() <= 0:
+            raise ValueError("La somme des poids doit être positive")
+        
+        probability = float(np.dot(w, probabilities) / w.sum())
+        threshold = Config.ENSEMBLE_THRESHOLD
+        return EnsembleResult(
+            method=method,
+            prediction=int(probability > threshold),
+            probability=probability,
+            threshold=threshold,
+            disagreement=float(probabilities.std()),
+            models=results,
+            weights=used_weights
+        )
+
+
+# Micro-batching des prédictions unitaires (Config.MICRO_BATCH_ENABLED)
+micro_batcher = MicroBatcher(PredictionEngine.predict_batch, Config.MICRO_BATCH_WAIT_MS, Config.MICRO_BATCH_MAX_ROWS)
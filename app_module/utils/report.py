@@ -11,9 +11,17 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, mm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
+from app_module.utils.lazy import lazy_import
+from app_module.utils.metrics import STAGE_SECONDS, timed
+
+
+def _use_agg_backend():
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+
+
+# pyplot is imported on first figure conversion
+plt = lazy_import('matplotlib.pyplot', before=_use_agg_backend)
 
 # --- Constants ---
 PRIMARY_COLOR = colors.HexColor("#2563eb")  # Blue-600
@@ -77,6 +85,7 @@ def _fig_to_png_bytes(fig) -> bytes:
     plt.close(fig)
     return buf.read()
 
+@timed(STAGE_SECONDS, 'pdf_generation')
 def generate_professional_pdf(
     title: str, 
     shap_explanation: Dict[str, Any], 
@@ -0,0 +1,168 @@
+"""
+Grille de risque précalculée pour le sous-espace de features du formulaire de démonstration.
+
+L'interface Streamlit ne fait varier que le sexe, la tranche d'âge, la maladie
+cardiaque, le tabac, l'activité physique, l'état de santé général et le BMI; les
+autres champs ont des valeurs fixes. Le produit des modalités (2 x 13 x 2 x 2 x 2 x 5)
+croisé avec un axe BMI quantifié est évalué hors ligne pour chaque modèle, puis
+stocké en tableau NumPy compact. Une requête dans ce sous-espace devient une
+lecture O(1) avec interpolation linéaire sur le BMI.
+
+Construction:
+    python -m app_module.utils.risk_grid [--models log_reg knn] [--bmi-step 0.1]
+"""
+import argparse
+import itertools
+import json
+import time
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Mapping, Optional
+from app_module.config.settings import Config
+from app_module.utils.data import CATEGORY_VALUES, FEATURE_COLUMNS, FEATURE_DEFAULTS
+from app_module.utils.models import ModelManager, PredictionEngine, PredictionResult
+
+# Axes catégoriels de la grille, dans l'ordre des dimensions du tableau
+GRID_AXES = ['Sex', 'AgeCategory', 'HeartDisease', 'Smoking', 'PhysicalActivity', 'GenHealth']
+
+# Champs fixés par le formulaire de démonstration (cf. prepare_input dans app.py)
+GRID_FIXED_FEATURES = {
+    col: value for col, value in FEATURE_DEFAULTS.items()
+    if col not in GRID_AXES and col != 'BMI'
+}
+
+
+def _bmi_axis(bmi_min: float, bmi_max: float, step: float) -> np.ndarray:
+    n_points = int(round((bmi_max - bmi_min) / step)) + 1
+    return np.round(bmi_min + step * np.arange(n_points), 6)
+
+
+def build_risk_grid(
+    model_names: Optional[List[str]] = None,
+    bmi_min: float = Config.RISK_GRID_BMI_MIN,
+    bmi_max: float = Config.RISK_GRID_BMI_MAX,
+    bmi_step: float = Config.RISK_GRID_BMI_STEP
+) -> 'RiskGrid':
+    """Évaluer chaque modèle sur toute la grille (un seul appel vectorisé par modèle)"""
+    if model_names is None:
+        model_names = list(ModelManager.get_all_models().keys())
+    
+    bmi_axis = _bmi_axis(bmi_min, bmi_max, bmi_step)
+    categories = [CATEGORY_VALUES[col] for col in GRID_AXES]
+    shape = tuple(len(values) for values in categories) + (len(bmi_axis),)
+    
+    # Toutes les combinaisons, BMI en dernière dimension (ordre C du tableau final)
+    combos = list(itertools.product(*categories))
+    data = {col: np.repeat([combo[i] for combo in combos], len(bmi_axis))
+            for i, col in enumerate(GRID_AXES)}
+    data['BMI'] = np.tile(bmi_axis, len(combos))
+    for col, value in GRID_FIXED_FEATURES.items():
+        data[col] = np.full(len(combos) * len(bmi_axis), value)
+    frame = pd.DataFrame(data, columns=FEATURE_COLUMNS)
+    
+    tables = {}
+    fingerprints = {}
+    for model_name in model_names:
+        start = time.perf_counter()
+        probabilities = PredictionEngine.predict_proba(model_name, frame)
+        if probabilities is None:
+            continue
+        tables[model_name] = probabilities.astype(np.float32).reshape(shape)
+        fingerprints[model_name] = ModelManager.get_fingerprint(model_name)
+        print(f"✓ Grille {model_name}: {len(frame)} points en {time.perf_counter() - start:.1f}s")
+    
+    return RiskGrid(tables, bmi_axis, fingerprints)
+
+
+class RiskGrid:
+    """Table de probabilités précalculées avec recherche O(1)"""
+    
+    def __init__(self, tables: Dict[str, np.ndarray], bmi_axis: np.ndarray,
+                 fingerprints: Optional[Dict[str, Optional[str]]] = None):
+        self.tables = tables
+        self.bmi_axis = np.asarray(bmi_axis, dtype=np.float64)
+        self.bmi_min = float(self.bmi_axis[0])
+        self.bmi_max = float(self.bmi_axis[-1])
+        self.bmi_step = float(self.bmi_axis[1] - self.bmi_axis[0]) if len(self.bmi_axis) > 1 else 1.0
+        self.fingerprints = fingerprints or {}
+        self._index = {col: {value: i for i, value in enumerate(CATEGORY_VALUES[col])} for col in GRID_AXES}
+    
+    def save(self, path: str = Config.RISK_GRID_PATH) -> None:
+        """Sauvegarder la grille (npz compressé)"""
+        np.savez_compressed(
+            path,
+            bmi_axis=self.bmi_axis,
+            fingerprints=np.array(json.dumps(self.fingerprints)),
+            **{f'model_{name}': table for name, table in self.tables.items()}
+        )
+    
+    @classmethod
+    def load(cls, path: str = Config.RISK_GRID_PATH) -> Optional['RiskGrid']:
+        """Charger une grille (None si absente ou illisible)"""
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                tables = {key[len('model_'):]: archive[key] for key in archive.files if key.startswith('model_')}
+                return cls(tables, archive['bmi_axis'], json.loads(str(archive['fingerprints'])))
+        except (OSError, KeyError, ValueError) as e:
+            print(f"✗ Grille de risque indisponible: {e}")
+            return None
+    
+    def lookup(self, model_name: str, record: Mapping[str, Any]) -> Optional[float]:
+        """
+        Probabilité interpolée pour un enregistrement, ou None s'il sort de la grille
+        (champ fixe différent, modalité inconnue, BMI hors bornes, grille périmée).
+        """
+        table = self.tables.get(model_name)
+        if table is None:
+            return None
+        fingerprint = self.fingerprints.get(model_name)
+        if fingerprint is not None and fingerprint != ModelManager.get_fingerprint(model_name):
+            return None
+        
+        try:
+            for col, value in GRID_FIXED_FEATURES.items():
+                if record.get(col, value) != value:
+                    return None
+            index = tuple(self._index[col][record[col]] for col in GRID_AXES)
+            bmi = float(record['BMI'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        
+        if not self.bmi_min <= bmi <= self.bmi_max:
+            return None
+        
+        position = (bmi - self.bmi_min) / self.bmi_step
+        i = min(int(position), len(self.bmi_axis) - 1)
+        fraction = position - i
+        row = table[index]
+        if fraction < 1e-9 or i == len(self.bmi_axis) - 1:
+            return float(row[i])
+        return float(row[i] + fraction * (row[i + 1] - row[i]))
+
+
+def predict_with_grid(grid: Optional[RiskGrid], model_name: str, record: Mapping[str, Any]) -> PredictionResult:
+    """Lecture dans la grille si possible, sinon prédiction complète"""
+    probability = grid.lookup(model_name, record) if grid is not None else None
+    if probability is None:
+        return PredictionEngine.predict(model_name, record)
+    threshold = PredictionEngine.get_threshold(model_name)
+    return PredictionResult(model=model_name, prediction=int(probability > threshold),
+                            probability=probability, threshold=threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Précalculer la grille de risque du formulaire de démonstration")
+    parser.add_argument('--models', nargs='*', help="Modèles à évaluer (tous par défaut)")
+    parser.add_argument('--output', default=Config.RISK_GRID_PATH)
+    parser.add_argument('--bmi-min', type=float, default=Config.RISK_GRID_BMI_MIN)
+    parser.add_argument('--bmi-max', type=float, default=Config.RISK_GRID_BMI_MAX)
+    parser.add_argument('--bmi-step', type=float, default=Config.RISK_GRID_BMI_STEP)
+    args = parser.parse_args()
+    
+    grid = build_risk_grid(args.models, args.bmi_min, args.bmi_max, args.bmi_step)
+    grid.save(args.output)
+    print(f"✓ Grille sauvegardée: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Shadow scoring: évaluer la version shadow d'un modèle sur un échantillon du trafic réel,
+hors du chemin de la requête, et journaliser la comparaison dans tests.db.
+"""
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+from app_module.config.settings import Config
+
+
+class ShadowScorer:
+    """
+    File bornée + thread de fond (un par processus).
+    
+    `submit` ne bloque jamais: si la file est pleine, l'échantillon est abandonné
+    et compté dans `dropped`. Le score shadow et l'écriture SQLite se font
+    entièrement dans le thread de fond.
+    """
+    
+    def __init__(self, sample_rate: float = 0.1, queue_size: int = 1000):
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        self._db = None
+        self.submitted = 0
+        self.dropped = 0
+        self.processed = 0
+        self.errors = 0
+    
+    def _ensure_worker(self) -> None:
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            threading.Thread(target=self._run, name='shadow-scorer', daemon=True).start()
+    
+    def submit(self, model_name: str, record: Mapping[str, Any], active_result: Any,
+               active_latency_ms: float, active_version: Optional[str] = None) -> bool:
+        """Proposer un enregistrement au shadow scoring (échantillonné, non bloquant)"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((model_name, dict(record), active_result, active_latency_ms, active_version))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+    
+    def _get_db(self):
+        if self._db is None:
+            from app_module.utils.database import TestDatabase
+            self._db = TestDatabase()
+        return self._db
+    
+    def process(self, model_name: str, record: Dict[str, Any], active_result: Any,
+                active_latency_ms: float, active_version: Optional[str]) -> Optional[int]:
+        """Évaluer la version shadow et journaliser la comparaison"""
+        from app_module.utils.models import ModelManager, PredictionEngine
+        
+        shadow = ModelManager.get_shadow(model_name)
+        if shadow is None:
+            return None
+        version, model, compiled = shadow
+        
+        start = time.perf_counter()
+        # Même repli que la version active (modalité inconnue des tables compilées)
+        proba = PredictionEngine._score(model, compiled, [record])
+        shadow_probability = float(proba[0, PredictionEngine._positive_index(model)])
+        shadow_latency_ms = (time.perf_counter() - start) * 1000
+        shadow_prediction = int(shadow_probability > PredictionEngine.get_threshold(model_name))
+        
+        return self._get_db().save_shadow_prediction(
+            model_name=model_name,
+            active_version=active_version,
+            shadow_version=version,
+            active_prediction=active_result.prediction,
+            active_probability=active_result.probability,
+            shadow_prediction=shadow_prediction,
+            shadow_probability=shadow_probability,
+            active_latency_ms=active_latency_ms,
+            shadow_latency_ms=shadow_latency_ms,
+            input_features=record
+        )
+    
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                self.process(*item)
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"✗ Erreur shadow scoring: {e}")
+            finally:
+                self._queue.task_done()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du shadow scoring"""
+        return {
+            'sample_rate': self.sample_rate,
+            'queue_depth': self._queue.qsize(),
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'processed': self.processed,
+            'errors': self.errors
+        }
+
+
+# Instance globale
+shadow_scorer = ShadowScorer(Config.SHADOW_SAMPLE_RATE, Config.SHADOW_QUEUE_SIZE)
@@ -0,0 +1,158 @@
+"""
+Background SHAP prétransformé, partagé entre les requêtes.
+
+Sans cache, chaque explication relit data/dataset.csv, tire `n_background`
+lignes (graine fixe) et les passe dans le ColumnTransformer: ces entrées-sorties
+dominent le temps d'une explication sur les modèles à arbres. Le background est
+désormais transformé une fois par version de modèle, écrit en float32 (`.npy`
+mappé en mémoire, partagé entre workers) avec l'empreinte du fichier modèle
+dans meta.json, et gardé en mémoire par processus.
+
+Les arbres sklearn passent déjà leurs entrées en float32; pour les autres
+modèles l'arrondi reste très en deçà de la variance de l'explainer par
+permutations.
+
+Construction anticipée (sinon au premier usage):
+    python -m app_module.utils.shap_background [--models log_reg knn]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+from app_module.config.settings import Config
+
+DEFAULT_BACKGROUND_ROWS = 200
+
+# (modèle, lignes, colonnes) -> (empreinte, background)
+_backgrounds: Dict[Tuple[str, int, Tuple[str, ...]], Tuple[Optional[str], np.ndarray]] = {}
+_lock = threading.Lock()
+
+
+def background_directory(model_name: str) -> str:
+    return os.path.join(Config.SHAP_BACKGROUND_DIR, model_name)
+
+
+def sample_background(columns: List[str], n_background: int = DEFAULT_BACKGROUND_ROWS) -> pd.DataFrame:
+    """Échantillon du dataset (même tirage que l'ancien calcul par requête)"""
+    bg = pd.read_csv(Config.DATASET_PATH, usecols=columns)[columns]
+    if bg.shape[0] > n_background:
+        bg = bg.sample(n=n_background, random_state=42)
+    return bg
+
+
+def transform_background(model: Any, bg: pd.DataFrame) -> np.ndarray:
+    """Background dans l'espace du classifieur (preprocess de la pipeline), en float32"""
+    preprocess = model.named_steps.get('preprocess') if hasattr(model, 'named_steps') else None
+    bg_trans = preprocess.transform(bg) if preprocess is not None else bg.values
+    if hasattr(bg_trans, 'toarray'):  # sparse matrix
+        bg_trans = bg_trans.toarray()
+    return np.ascontiguousarray(bg_trans, dtype=np.float32)
+
+
+def save_background(directory: str, background: np.ndarray, fingerprint: Optional[str],
+                    columns: List[str], n_background: int) -> None:
+    """Écrire background.npy puis meta.json (remplacements atomiques, workers concurrents)"""
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f'background.{os.getpid()}.npy')
+    np.save(tmp, background)
+    os.replace(tmp, os.path.join(directory, 'background.npy'))
+    meta = {
+        'fingerprint': fingerprint,
+        'columns': list(columns),
+        'n_background': n_background,
+        'shape': list(background.shape),
+        'dtype': str(background.dtype),
+        'built_at': time.time()
+    }
+    tmp = os.path.join(directory, f'meta.{os.getpid()}.json')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, os.path.join(directory, 'meta.json'))
+
+
+def load_background(directory: str, fingerprint: Optional[str], columns: List[str],
+                    n_background: int) -> Optional[np.ndarray]:
+    """Background mappé en mémoire (None s'il est absent ou construit pour un autre modèle)"""
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta.get('fingerprint') != fingerprint or meta.get('columns') != list(columns)
+                or meta.get('n_background') != n_background):
+            return None
+        background = np.load(os.path.join(directory, 'background.npy'), mmap_mode='r')
+    except (OSError, ValueError) as e:
+        print(f"✗ Background SHAP illisible ({directory}): {e}")
+        return None
+    return background if list(background.shape) == meta.get('shape') else None
+
+
+def build_background(model_name: str, model: Any, fingerprint: Optional[str], columns: List[str],
+                     n_background: int = DEFAULT_BACKGROUND_ROWS) -> np.ndarray:
+    """Échantillonner, transformer et écrire le background d'un modèle servi"""
+    background = transform_background(model, sample_background(columns, n_background))
+    directory = background_directory(model_name)
+    try:
+        save_background(directory, background, fingerprint, columns, n_background)
+    except OSError as e:
+        # Répertoire des modèles en lecture seule: le cache reste en mémoire
+        print(f"✗ Background SHAP non sauvegardé ({directory}): {e}")
+    return background
+
+
+def get_background(model: Any, columns: List[str],
+                   n_background: int = DEFAULT_BACKGROUND_ROWS) -> Optional[np.ndarray]:
+    """
+    Background transformé (float32) d'un modèle servi par ModelManager: mémoire,
+    sinon fichier à jour, sinon construit. None pour un modèle non servi.
+    """
+    from app_module.utils.models import ModelManager
+    
+    served = ModelManager.find_served(model)
+    if served is None:
+        return None
+    model_name, fingerprint = served[0], served[1].fingerprint
+    key = (model_name, n_background, tuple(columns))
+    
+    cached = _backgrounds.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    
+    with _lock:
+        background = load_background(background_directory(model_name), fingerprint, columns, n_background)
+        if background is None:
+            start = time.perf_counter()
+            background = build_background(model_name, model, fingerprint, columns, n_background)
+            print(f"✓ Background SHAP construit: {model_name} ({background.shape[0]} lignes, "
+                  f"{time.perf_counter() - start:.2f}s)")
+        _backgrounds[key] = (fingerprint, background)
+    return background
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construire le background SHAP des modèles servis")
+    parser.add_argument('--models', nargs='*', help="Modèles à traiter (tous par défaut)")
+    parser.add_argument('--rows', type=int, default=DEFAULT_BACKGROUND_ROWS, help="Lignes du background")
+    args = parser.parse_args()
+    
+    from app_module.utils.data import FEATURE_COLUMNS
+    from app_module.utils.models import ModelManager
+    
+    models = ModelManager.load_models()
+    for name in args.models or list(models):
+        name = ModelManager.resolve_name(name)
+        start = time.perf_counter()
+        background = build_background(name, models[name], ModelManager.get_fingerprint(name),
+                                      FEATURE_COLUMNS, args.rows)
+        print(f"✓ Background SHAP sauvegardé: {background_directory(name)} "
+              f"({background.shape[0]}x{background.shape[1]}, {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
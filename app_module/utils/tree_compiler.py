@@ -0,0 +1,181 @@
+"""
+Compilation des ensembles d'arbres (RandomForest, ExtraTrees, GradientBoosting)
+en tableaux NumPy contigus.
+
+Les noeuds de tous les arbres sont concaténés (feature, seuil, enfants, valeur
+de feuille) et le parcours avance d'un niveau à la fois pour tous les couples
+(ligne, arbre) simultanément: une seule boucle Python sur la profondeur, au
+lieu d'un appel sklearn par arbre. Les couples arrivés en feuille sont retirés
+du parcours à chaque niveau. Les contributions des arbres sont cumulées
+dans l'ordre des arbres (`np.cumsum`, strictement séquentiel), comme dans
+sklearn: les probabilités sont identiques à `predict_proba`, ce que vérifie
+`compile_tree_ensemble`.
+
+Le parcours NumPy gagne surtout sur les petits lots (coût fixe d'un appel
+sklearn par arbre); au-delà de `max_rows` lignes, le parcours Cython de sklearn
+est plus rapide et l'estimateur d'origine est appelé sur la matrice déjà encodée.
+"""
+import numpy as np
+from typing import Any, List, Optional
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+
+
+class FlatTreeEnsemble:
+    """
+    Ensemble d'arbres aplati.
+    
+    `kind` vaut 'forest' (moyenne des probabilités de feuille) ou 'boosting'
+    (score initial + somme des valeurs de feuille déjà multipliées par le
+    learning rate, puis fonction de lien de la loss).
+    """
+    
+    def __init__(self, kind: str, roots: np.ndarray, feature: np.ndarray, threshold: np.ndarray,
+                 left: np.ndarray, right: np.ndarray, value: np.ndarray, max_depth: int,
+                 classes: np.ndarray, init_raw: Optional[np.ndarray] = None, loss: Any = None,
+                 estimator: Any = None, max_rows: Optional[int] = None):
+        self.kind = kind
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # Enfants entrelacés: children[2 * noeud + (x > seuil)]
+        self.children = np.column_stack([left, right]).ravel()
+        self.value = value
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.init_raw = init_raw
+        self.loss = loss
+        self.estimator = estimator
+        self.max_rows = max_rows
+        self.is_leaf = left == np.arange(len(left))
+    
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+    
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Indice (global) de la feuille atteinte dans chaque arbre: (n_lignes, n_arbres)"""
+        X = np.ascontiguousarray(X)
+        n_rows, n_features = X.shape
+        values = X.ravel()
+        leaves = np.empty(n_rows * self.n_trees, dtype=np.intp)
+        
+        # Couples (ligne, arbre) encore en cours de parcours
+        position = np.arange(n_rows * self.n_trees)
+        nodes = np.tile(self.roots, n_rows)
+        row_offset = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+        
+        for _ in range(self.max_depth + 1):
+            done = self.is_leaf[nodes]
+            if done.any():
+                leaves[position[done]] = nodes[done]
+                active = ~done
+                position, nodes, row_offset = position[active], nodes[active], row_offset[active]
+            if not len(nodes):
+                break
+            # Comparaison float32 (X) <= float64 (seuil), comme le parcours sklearn
+            go_right = ~(values[row_offset + self.feature[nodes]] <= self.threshold[nodes])
+            nodes = self.children[2 * nodes + go_right]
+        
+        return leaves.reshape(n_rows, self.n_trees)
+    
+    def _accumulate(self, leaves: np.ndarray, init: Optional[np.ndarray]) -> np.ndarray:
+        """Somme séquentielle (dans l'ordre des arbres) des valeurs de feuille"""
+        contributions = self.value[leaves]
+        if init is not None:
+            start = np.broadcast_to(init, (len(leaves), 1, contributions.shape[2]))
+            contributions = np.concatenate([start, contributions], axis=1)
+        return np.cumsum(contributions, axis=1)[:, -1, :]
+    
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        if self.max_rows is not None and len(X) > self.max_rows and self.estimator is not None:
+            return self.estimator.predict_proba(X)
+        # NaN: routage des valeurs manquantes (ou erreur) propre à sklearn
+        if self.estimator is not None and not np.isfinite(X).all():
+            return self.estimator.predict_proba(X)
+        
+        leaves = self.apply(X)
+        if self.kind == 'forest':
+            return self._accumulate(leaves, None) / self.n_trees
+        
+        raw = self._accumulate(leaves, self.init_raw)
+        if raw.shape[1] == 1:
+            raw = raw.ravel()
+        return self.loss.predict_proba(raw)
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _flatten(trees: List[Any], leaf_values: List[np.ndarray]) -> dict:
+    """Concaténer les noeuds des arbres (les feuilles bouclent sur elles-mêmes)"""
+    roots, feature, threshold, left, right = [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        n_nodes = tree.node_count
+        nodes = np.arange(n_nodes) + offset
+        leaf = tree.children_left == -1
+        roots.append(offset)
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        left.append(np.where(leaf, nodes, tree.children_left + offset))
+        right.append(np.where(leaf, nodes, tree.children_right + offset))
+        offset += n_nodes
+    
+    return {
+        'roots': np.asarray(roots, dtype=np.intp),
+        'feature': np.concatenate(feature).astype(np.intp),
+        'threshold': np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64),
+        'left': np.concatenate(left).astype(np.intp),
+        'right': np.concatenate(right).astype(np.intp),
+        'value': np.ascontiguousarray(np.concatenate(leaf_values), dtype=np.float64),
+        'max_depth': max(tree.max_depth for tree in trees)
+    }
+
+
+def _compile_forest(clf: Any) -> Optional[FlatTreeEnsemble]:
+    if clf.n_outputs_ != 1:
+        return None
+    trees = [estimator.tree_ for estimator in clf.estimators_]
+    # Probabilités de feuille, comme DecisionTreeClassifier.predict_proba
+    values = [tree.value[:, 0, :clf.n_classes_] for tree in trees]
+    return FlatTreeEnsemble('forest', classes=clf.classes_, **_flatten(trees, values))
+
+
+def _compile_boosting(clf: GradientBoostingClassifier, n_features: int) -> Optional[FlatTreeEnsemble]:
+    if clf.n_trees_per_iteration_ != 1:
+        return None
+    if not (clf.init_ == 'zero' or isinstance(clf.init_, DummyClassifier)):
+        # Estimateur initial arbitraire: le score initial dépend de la ligne
+        return None
+    
+    init_raw = clf._raw_predict_init(np.zeros((1, n_features), dtype=np.float32))[0]
+    trees = [estimator.tree_ for estimator in clf.estimators_[:, 0]]
+    # Même produit que predict_stages: learning_rate * valeur de la feuille
+    values = [clf.learning_rate * tree.value[:, :, 0] for tree in trees]
+    return FlatTreeEnsemble('boosting', classes=clf.classes_, init_raw=init_raw,
+                            loss=clf._loss, **_flatten(trees, values))
+
+
+def compile_tree_ensemble(clf: Any, X_check: np.ndarray, max_rows: Optional[int] = None) -> Optional[FlatTreeEnsemble]:
+    """
+    Aplatir un classifieur à base d'arbres (`max_rows`: taille de lot au-delà
+    de laquelle `clf` est appelé directement).
+    
+    Retourne None si le classifieur n'est pas supporté ou si les probabilités
+    diffèrent (même d'un bit) de `clf.predict_proba` sur `X_check`.
+    """
+    if isinstance(clf, (RandomForestClassifier, ExtraTreesClassifier)):
+        flat = _compile_forest(clf)
+    elif isinstance(clf, GradientBoostingClassifier):
+        flat = _compile_boosting(clf, X_check.shape[1])
+    else:
+        return None
+    
+    if flat is None or not np.array_equal(flat.predict_proba(X_check), clf.predict_proba(X_check)):
+        return None
+    flat.estimator = clf
+    flat.max_rows = max_rows
+    return flat
@@ -2,17 +2,41 @@
 XAI helpers using SHAP to compute per-feature contributions for a prediction.
 Version améliorée avec mapping correct des features.
 """
+import contextlib
+import copy
+import os
+import threading
+import time
+import types
+import weakref
 import pandas as pd
-from typing import Any, Dict, List, Tuple
-import shap
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import numpy as np
+from scipy.special import expit
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
-import lime
-import lime.lime_tabular
 from app_module.config.settings import Config
+from app_module.utils.explanation_store import stored_explanation
+from app_module.utils.lazy import lazy_import
+from app_module.utils.metrics import STAGE_SECONDS, timed
+from app_module.utils.models import ModelManager
+from app_module.utils.shap_background import get_background
+
+# Importés au premier calcul d'explication
+shap = lazy_import('shap')
+lime_tabular = lazy_import('lime.lime_tabular')
+
+TREE_TYPES = (RandomForestClassifier, GradientBoostingClassifier,
+              HistGradientBoostingClassifier, DecisionTreeClassifier)
+
+# Explainers SHAP des modèles servis: nom -> modèle, empreinte, explainer, branche retenue
+_explainers: Dict[str, Dict[str, Any]] = {}
+# Un verrou de construction par modèle (le verrou global ne protège que ce dictionnaire)
+_build_locks: Dict[str, threading.Lock] = {}
+_explainers_lock = threading.Lock()
 
 
 def _get_original_feature_mapping(preprocessor: ColumnTransformer, input_cols: List[str]) -> Dict[int, str]:
@@ -117,41 +141,282 @@ def _get_original_feature_mapping(preprocessor: ColumnTransformer, input_cols: L
     return mapping
 
 
-def _aggregate_shap_by_original_features(shap_values: np.ndarray, mapping: Dict[int, str]) -> Dict[str, float]:
+class FeatureGroups:
+    """
+    Regroupement des colonnes transformées par feature originale, compilé une fois
+    par préprocesseur: `index[j]` est le groupe de la colonne j, `names` le nom de
+    chaque groupe (ordre de première apparition), `multi` les groupes de plusieurs
+    colonnes (one-hot), agrégés en somme des valeurs absolues.
+    """
+    
+    def __init__(self, names: List[str], index: np.ndarray):
+        self.names = names
+        self.index = index
+        self.multi = np.bincount(index[index >= 0], minlength=len(names)) > 1
+    
+    @classmethod
+    def from_mapping(cls, mapping: Dict[int, str]) -> 'FeatureGroups':
+        """Compiler un mapping {colonne transformée: feature originale}"""
+        size = max(mapping) + 1 if mapping else 0
+        index = np.full(size, -1, dtype=np.intp)  # -1: colonne sans feature
+        groups = {}
+        for idx, feature_name in sorted(mapping.items()):
+            index[idx] = groups.setdefault(feature_name, len(groups))
+        return cls(list(groups), index)
+    
+    @classmethod
+    def identity(cls, input_cols: List[str]) -> 'FeatureGroups':
+        return cls.from_mapping(dict(enumerate(input_cols)))
+    
+    def aggregate(self, shap_values: np.ndarray) -> np.ndarray:
+        """
+        Valeurs SHAP (n_features,) ou (n_rows, n_features) -> (n_rows, n_groups):
+        valeur signée pour une feature simple, somme des |valeurs| pour le one-hot.
+        """
+        values = np.atleast_2d(np.asarray(shap_values, dtype=np.float64))
+        n_rows, n_columns = values.shape
+        index = self.index[:n_columns]
+        values = values[:, :len(index)]
+        valid = index >= 0
+        index, values = index[valid], values[:, valid]
+        
+        values = np.where(self.multi[index], np.abs(values), values)
+        n_groups = len(self.names)
+        offsets = (np.arange(n_rows) * n_groups)[:, None]
+        return np.bincount((index + offsets).ravel(), weights=values.ravel(),
+                           minlength=n_rows * n_groups).reshape(n_rows, n_groups)
+
+
+# Groupes compilés par préprocesseur ajusté (libérés avec le modèle)
+_feature_groups = weakref.WeakKeyDictionary()
+_feature_groups_lock = threading.Lock()
+
+
+def get_feature_groups(preprocessor: ColumnTransformer, input_cols: List[str]) -> FeatureGroups:
+    """Groupes de features d'un préprocesseur, compilés au premier appel"""
+    key = tuple(input_cols)
+    with _feature_groups_lock:
+        compiled = _feature_groups.setdefault(preprocessor, {})
+        groups = compiled.get(key)
+    if groups is None:
+        groups = FeatureGroups.from_mapping(_get_original_feature_mapping(preprocessor, list(input_cols)))
+        with _feature_groups_lock:
+            compiled[key] = groups
+    return groups
+
+
+def is_linear_classifier(clf: Any) -> bool:
+    """Régression logistique binaire ajustée (probabilité = sigmoïde de x . coef + intercept)"""
+    return isinstance(clf, LogisticRegression) and getattr(clf, 'coef_', np.empty((0, 0))).shape[0] == 1
+
+
+class LinearShap:
+    """
+    Valeurs SHAP exactes (interventionnelles) d'un classifieur linéaire binaire:
+    `coef * (x - E[x])` en log-odds, une opération vectorielle par lot.
+    
+    En probabilité (`output='probability'`), les contributions log-odds sont
+    remises à l'échelle pour sommer à p(x) - E[p(background)], base comprise:
+    ce ne sont pas des valeurs SHAP, et le résultat est marqué `approximate`.
+    """
+    
+    def __init__(self, clf: Any, background: np.ndarray, output: str = 'log_odds'):
+        if output not in ('probability', 'log_odds'):
+            raise ValueError(f"Sortie SHAP linéaire inconnue: {output}")
+        background = np.asarray(background, dtype=np.float64)
+        self.coef = np.asarray(clf.coef_[0], dtype=np.float64)
+        self.intercept = float(clf.intercept_[0])
+        self.mean = background.mean(axis=0)
+        self.output = output
+        self.base_log_odds = self.intercept + float(self.mean @ self.coef)
+        self.base_probability = float(expit(background @ self.coef + self.intercept).mean())
+    
+    def __call__(self, X: np.ndarray) -> types.SimpleNamespace:
+        """Valeurs (n_rows, n_features) et bases (n_rows,), comme un objet Explanation SHAP"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        values = (X - self.mean) * self.coef
+        if self.output == 'log_odds':
+            return types.SimpleNamespace(values=values, base_values=np.full(len(X), self.base_log_odds),
+                                         approximate=False)
+        
+        log_odds = X @ self.coef + self.intercept
+        total = values.sum(axis=1)
+        # Contributions quasi nulles en log-odds: pente de la sigmoïde au point x
+        slope = expit(log_odds) * (1 - expit(log_odds))
+        delta = expit(log_odds) - self.base_probability
+        scale = np.divide(delta, total, out=slope, where=np.abs(total) > 1e-12)
+        return types.SimpleNamespace(values=values * scale[:, None],
+                                     base_values=np.full(len(X), self.base_probability), approximate=True)
+
+
+def _explainer_branches(clf: Any) -> Tuple[str, ...]:
+    """Explainers à essayer, dans l'ordre (formes exactes d'abord: linéaire, arbres)"""
+    if is_linear_classifier(clf):
+        return ('linear', 'generic')
+    if isinstance(clf, TREE_TYPES):
+        return ('tree', 'tree_background', 'generic')
+    return ('generic',)
+
+
+def _build_explainer(branch: str, clf: Any, bg_trans: np.ndarray, predict_fn: Callable) -> Any:
+    if branch == 'linear':
+        return LinearShap(clf, bg_trans, Config.SHAP_LINEAR_OUTPUT)
+    if branch == 'tree':
+        return shap.TreeExplainer(clf, feature_perturbation="interventional")
+    if branch == 'tree_background':
+        # Fallback: utiliser le background dataset
+        return shap.TreeExplainer(clf, bg_trans[:100], feature_perturbation="interventional")
+    # Explainer générique avec background
+    return shap.Explainer(predict_fn, bg_trans[:100])
+
+
+def _cached_explainer(model_name: Optional[str], model: Any, fingerprint: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Explainer gardé pour cette version du modèle servi, s'il existe"""
+    entry = _explainers.get(model_name) if model_name else None
+    if entry is not None and entry['model'] is model and entry['fingerprint'] == fingerprint:
+        return entry
+    return None
+
+
+def _explain_cached(entry: Dict[str, Any], branches: Tuple[str, ...],
+                    input_trans: np.ndarray) -> Tuple[Any, Optional[int]]:
+    """Valeurs SHAP avec l'explainer gardé; en cas d'échec, indice de la branche suivante"""
+    try:
+        with entry['lock']:
+            return entry['explainer'](input_trans), None
+    except Exception:
+        # La branche retenue échoue sur cette entrée: essayer les suivantes
+        start = branches.index(entry['branch']) + 1
+        if start >= len(branches):
+            raise
+        return None, start
+
+
+def _run_explainer(model: Any, clf: Any, bg_trans: np.ndarray, input_trans: np.ndarray,
+                   predict_fn: Callable) -> Any:
     """
-    Agrège les valeurs SHAP par feature originale.
-    Pour les features one-hot, on prend la somme des valeurs absolues pour montrer l'impact total.
+    Valeurs SHAP de `input_trans`. Pour un modèle servi, l'explainer et la branche
+    qui a fonctionné sont gardés jusqu'au rechargement du modèle; sinon les
+    branches sont essayées à chaque appel. La construction est sérialisée par
+    modèle: des premières requêtes concurrentes ne construisent qu'un explainer.
     """
-    aggregated = {}
+    served = ModelManager.find_served(model)
+    model_name, fingerprint = (served[0], served[1].fingerprint) if served else (None, None)
+    branches = _explainer_branches(clf)
+    
+    start = 0
+    entry = _cached_explainer(model_name, model, fingerprint)
+    if entry is not None:
+        shap_values_obj, start = _explain_cached(entry, branches, input_trans)
+        if start is None:
+            return shap_values_obj
     
-    # Grouper les indices par feature originale
-    feature_groups = {}
-    for idx, feature_name in mapping.items():
-        if idx < len(shap_values):  # S'assurer que l'index est valide
-            if feature_name not in feature_groups:
-                feature_groups[feature_name] = []
-            feature_groups[feature_name].append(idx)
+    if model_name is None:
+        build_lock = contextlib.nullcontext()
+    else:
+        with _explainers_lock:
+            build_lock = _build_locks.setdefault(model_name, threading.Lock())
     
-    # Agrégation
-    for feature_name, indices in feature_groups.items():
-        # Filtrer les indices valides
-        valid_indices = [idx for idx in indices if 0 <= idx < len(shap_values)]
+    with build_lock:
+        # Construit par une autre requête pendant l'attente du verrou
+        current = _cached_explainer(model_name, model, fingerprint)
+        if current is not None and current is not entry:
+            shap_values_obj, next_start = _explain_cached(current, branches, input_trans)
+            if next_start is None:
+                return shap_values_obj
+            start = max(start, next_start)
         
-        if len(valid_indices) == 0:
-            aggregated[feature_name] = 0.0
-        elif len(valid_indices) == 1:
-            # Feature simple: prendre la valeur directement
-            aggregated[feature_name] = float(shap_values[valid_indices[0]])
+        error = None
+        for branch in branches[start:]:
+            try:
+                explainer = _build_explainer(branch, clf, bg_trans, predict_fn)
+                shap_values_obj = explainer(input_trans)
+            except Exception as e:
+                error = e
+                continue
+            if model_name is not None:
+                _explainers[model_name] = {
+                    'model': model,
+                    'fingerprint': fingerprint,
+                    'explainer': explainer,
+                    'branch': branch,
+                    # Le masker tabulaire de l'explainer générique réécrit un tampon interne
+                    'lock': threading.Lock() if branch == 'generic' else contextlib.nullcontext()
+                }
+            return shap_values_obj
+        raise error
+
+
+def _invalidate_explainer(model_name: str) -> None:
+    """Listener de rechargement: l'explainer de l'ancienne version est abandonné"""
+    _explainers.pop(model_name, None)
+
+
+def explainer_status() -> Dict[str, str]:
+    """Branche d'explainer retenue pour chaque modèle déjà expliqué"""
+    return {name: entry['branch'] for name, entry in list(_explainers.items())}
+
+
+ModelManager.add_reload_listener(_invalidate_explainer)
+
+
+def _sample_background(df_input: pd.DataFrame, n_background: int) -> pd.DataFrame:
+    """Background brut tiré du dataset (df_input dupliqué à défaut)"""
+    try:
+        df_full = pd.read_csv(Config.DATASET_PATH)
+        
+        # S'assurer que toutes les colonnes nécessaires sont présentes
+        required_cols = list(df_input.columns)
+        missing_cols = [c for c in required_cols if c not in df_full.columns]
+        
+        if missing_cols:
+            # Utiliser df_input comme fallback
+            bg = df_input.copy()
         else:
-            # Feature avec plusieurs valeurs (one-hot probablement)
-            # On prend la somme des valeurs absolues pour montrer l'impact total de la feature
-            # Cela permet d'agréger toutes les catégories one-hot en une seule importance
-            values = shap_values[np.array(valid_indices)]
-            aggregated[feature_name] = float(np.sum(np.abs(values)))
+            # Sélectionner uniquement les colonnes nécessaires
+            bg = df_full[required_cols].copy()
+            
+            # Échantillonnage stratifié si possible (pour avoir des exemples représentatifs)
+            if bg.shape[0] > n_background:
+                bg = bg.sample(n=min(n_background, bg.shape[0]), random_state=42)
+        
+        # S'assurer que l'ordre des colonnes correspond
+        bg = bg[df_input.columns]
     
-    return aggregated
+    except Exception as e:
+        # Fallback: utiliser df_input
+        bg = df_input.copy()
+        if bg.shape[0] > 1:
+            bg = pd.concat([bg] * 10, ignore_index=True)  # Dupliquer pour avoir plus de données
+    return bg
 
 
+def explain_linear_batch(model: Pipeline, df_input: pd.DataFrame, output: str = None) -> pd.DataFrame:
+    """
+    Valeurs SHAP exactes d'un lot pour une pipeline linéaire: une ligne par entrée,
+    `base_value` puis une colonne par feature originale (one-hot agrégé). En sortie
+    'probability', `result.attrs['approximate']` signale la remise à l'échelle.
+    """
+    preprocess = model.named_steps['preprocess']
+    clf = model.named_steps['clf']
+    if not is_linear_classifier(clf):
+        raise ValueError(f"Classifieur non linéaire: {type(clf).__name__}")
+    
+    columns = list(df_input.columns)
+    background = get_background(model, columns)
+    if background is None:
+        background = preprocess.transform(_sample_background(df_input, 200))
+    explanation = LinearShap(clf, background, output or Config.SHAP_LINEAR_OUTPUT)(preprocess.transform(df_input))
+    
+    groups = get_feature_groups(preprocess, columns)
+    result = pd.DataFrame(groups.aggregate(explanation.values), columns=groups.names, index=df_input.index)
+    result.insert(0, 'base_value', explanation.base_values)
+    result.attrs['approximate'] = explanation.approximate
+    return result
+
+
+@timed(STAGE_SECONDS, 'explain_shap')
+@stored_explanation('shap', settings=('SHAP_LINEAR_OUTPUT',))
 def explain_model_prediction(model: Any, df_input: pd.DataFrame, n_background: int = 200) -> Dict[str, Any]:
     """
     Retourne les contributions SHAP pour une prédiction.
@@ -159,37 +424,7 @@ def explain_model_prediction(model: Any, df_input: pd.DataFrame, n_background: i
     """
     try:
         # ------------------------------------------------------------
-        # 1) CHARGEMENT DU BACKGROUND DATASET (plus représentatif)
-        # ------------------------------------------------------------
-        try:
-            df_full = pd.read_csv(Config.DATASET_PATH)
-            
-            # S'assurer que toutes les colonnes nécessaires sont présentes
-            required_cols = list(df_input.columns)
-            missing_cols = [c for c in required_cols if c not in df_full.columns]
-            
-            if missing_cols:
-                # Utiliser df_input comme fallback
-                bg = df_input.copy()
-            else:
-                # Sélectionner uniquement les colonnes nécessaires
-                bg = df_full[required_cols].copy()
-                
-                # Échantillonnage stratifié si possible (pour avoir des exemples représentatifs)
-                if bg.shape[0] > n_background:
-                    bg = bg.sample(n=min(n_background, bg.shape[0]), random_state=42)
-            
-            # S'assurer que l'ordre des colonnes correspond
-            bg = bg[df_input.columns]
-            
-        except Exception as e:
-            # Fallback: utiliser df_input
-            bg = df_input.copy()
-            if bg.shape[0] > 1:
-                bg = pd.concat([bg] * 10, ignore_index=True)  # Dupliquer pour avoir plus de données
-        
-        # ------------------------------------------------------------
-        # 2) EXTRACTION DU PIPELINE
+        # 1) EXTRACTION DU PIPELINE
         # ------------------------------------------------------------
         clf = model
         preprocess = None
@@ -198,26 +433,40 @@ def explain_model_prediction(model: Any, df_input: pd.DataFrame, n_background: i
             preprocess = model.named_steps.get("preprocess", None)
             clf = model.named_steps.get("clf", model)
         
+        # ------------------------------------------------------------
+        # 2) CHARGEMENT DU BACKGROUND (prétransformé et partagé pour un modèle servi)
+        # ------------------------------------------------------------
+        bg_trans = None
+        if preprocess is not None:
+            try:
+                bg_trans = get_background(model, list(df_input.columns), n_background)
+            except Exception as e:
+                print(f"✗ Background SHAP en cache indisponible: {e}")
+        bg = _sample_background(df_input, n_background) if bg_trans is None else None
+        
         # ------------------------------------------------------------
         # 3) TRANSFORMATION DES DONNÉES
         # ------------------------------------------------------------
         if preprocess is not None:
             try:
-                bg_trans = preprocess.transform(bg)
+                if bg_trans is None:
+                    bg_trans = preprocess.transform(bg)
                 input_trans = preprocess.transform(df_input)
                 
-                # Créer le mapping features transformées -> originales
-                feature_mapping = _get_original_feature_mapping(preprocess, list(df_input.columns))
+                # Groupes features transformées -> originales (compilés une fois par préprocesseur)
+                feature_groups = get_feature_groups(preprocess, list(df_input.columns))
                 
             except Exception as e:
                 # Fallback: pas de preprocessing
+                if bg is None:
+                    bg = _sample_background(df_input, n_background)
                 bg_trans = bg.values
                 input_trans = df_input.values
-                feature_mapping = {i: col for i, col in enumerate(df_input.columns)}
+                feature_groups = FeatureGroups.identity(list(df_input.columns))
         else:
             bg_trans = bg.values
             input_trans = df_input.values
-            feature_mapping = {i: col for i, col in enumerate(df_input.columns)}
+            feature_groups = FeatureGroups.identity(list(df_input.columns))
         
         # Convertir en array numpy si nécessaire
         if hasattr(bg_trans, 'toarray'):  # sparse matrix
@@ -231,10 +480,6 @@ def explain_model_prediction(model: Any, df_input: pd.DataFrame, n_background: i
         # ------------------------------------------------------------
         # 4) SÉLECTION DU BON EXPLAINER SHAP
         # ------------------------------------------------------------
-        tree_types = (RandomForestClassifier, GradientBoostingClassifier,
-                      HistGradientBoostingClassifier, DecisionTreeClassifier)
-        is_tree = isinstance(clf, tree_types)
-        
         # Fonction wrapper pour predict_proba (classe positive)
         def model_predict_proba(x):
             """Wrapper pour obtenir la probabilité de la classe positive"""
@@ -263,25 +508,8 @@ def explain_model_prediction(model: Any, df_input: pd.DataFrame, n_background: i
                 return proba[:, 1]
             return proba.flatten()
         
-        # Créer l'explainer
-        if is_tree:
-            # Pour les modèles tree, utiliser TreeExplainer (plus rapide et exact)
-            try:
-                explainer = shap.TreeExplainer(clf, feature_perturbation="interventional")
-                shap_values_obj = explainer(input_trans)
-            except:
-                # Fallback: utiliser le background dataset
-                try:
-                    explainer = shap.TreeExplainer(clf, bg_trans[:100], feature_perturbation="interventional")
-                    shap_values_obj = explainer(input_trans)
-                except:
-                    # Dernier fallback: Explainer générique
-                    explainer = shap.Explainer(model_predict_proba, bg_trans[:100])
-                    shap_values_obj = explainer(input_trans)
-        else:
-            # Pour les autres modèles, utiliser Explainer avec background
-            explainer = shap.Explainer(model_predict_proba, bg_trans[:100])
-            shap_values_obj = explainer(input_trans)
+        # Créer l'explainer (réutilisé entre les requêtes pour un modèle servi)
+        shap_values_obj = _run_explainer(model, clf, bg_trans, input_trans, model_predict_proba)
         
         # ------------------------------------------------------------
         # 5) EXTRACTION DES VALEURS SHAP
@@ -315,12 +543,12 @@ def explain_model_prediction(model: Any, df_input: pd.DataFrame, n_background: i
         # ------------------------------------------------------------
         # 6) AGRÉGATION PAR FEATURE ORIGINALE
         # ------------------------------------------------------------
-        aggregated_shap = _aggregate_shap_by_original_features(shap_vals, feature_mapping)
+        aggregated_shap = feature_groups.aggregate(shap_vals)[0]
         
         # Créer la liste des contributions
         feature_contribs = [
             {"feature": feature, "shap_value": float(value)}
-            for feature, value in aggregated_shap.items()
+            for feature, value in zip(feature_groups.names, aggregated_shap)
         ]
         
         # Trier par valeur absolue décroissante
@@ -349,137 +577,283 @@ def explain_model_prediction(model: Any, df_input: pd.DataFrame, n_background: i
         except:
             base_value = None
         
-        return {
+        result = {
             "base_value": base_value,
             "top_features": feature_contribs_sorted[:10],  # Top 10 au lieu de 5
             "all_features": feature_contribs_sorted
         }
+        # Sortie linéaire 'probability': remise à l'échelle, pas des valeurs SHAP
+        if getattr(shap_values_obj, 'approximate', False):
+            result["approximate"] = True
+        return result
     
     except Exception as e:
         import traceback
         return {"error": f"Erreur SHAP: {str(e)}\n{traceback.format_exc()}"}
 
 
-def explain_model_prediction_lime(model: Any, df_input: pd.DataFrame, n_samples: int = 5000) -> Dict[str, Any]:
+class LimeContext:
     """
-    Retourne les contributions LIME pour une prédiction.
+    Données LIME construites une fois par dataset: codes entiers des colonnes
+    catégorielles (modalités triées, comme LabelEncoder) et explainer ajusté sur
+    le train set encodé. Partagé par tous les modèles.
     """
-    try:
-        # 1) CHARGEMENT DU TRAIN SET (LIME a besoin de stats sur le training set)
-        try:
-            df_full = pd.read_csv(Config.DATASET_PATH)
-            # S'assurer que les colonnes correspondent
-            train_data = df_full[df_input.columns]
-        except:
-            # Fallback
-            train_data = df_input.copy() # Très mauvais pour LIME mais évite le crash
-
-        # 2) GESTION DU PIPELINE ET PREPROCESSING
-        # LIME a besoin de travailler sur des arrays numpy si c'est un modèle sklearn standard,
-        # ou on peut lui passer le pipeline complet s'il gère les colonnes brutes.
-        # Ici nos pipelines gèrent les DataFrames bruts via 'preprocess'.
-        
-        # On va utiliser LIME sur les données BRUTES (avant preprocessing)
-        # car c'est plus interprétable pour l'utilisateur.
-        
-        # Convertir les colonnes catégorielles en indices pour LIME (si besoin) ou laisser LIME gérer
-        # LimeTabularExplainer gère les catégorielles si on lui dit lesquelles c'est.
-        
-        categorical_features = []
-        categorical_names = {}
-        for idx, col in enumerate(train_data.columns):
-            if train_data[col].dtype == 'object':
-                categorical_features.append(idx)
-                # On doit encoder les valeurs pour LIME
-                # Pour simplifier ici, on va laisser LIME se débrouiller ou
-                # convertir temporairement en label encoding pour fit l'explainer
-                pass
-
-        # NOTE: LIME est complexe à setup parfaitement avec des pipelines complexes.
-        # Approche simplifiée: On passe le train_data tel quel, mais LIME attend du numpy souvent.
-        
-        # Convert to numpy for LIME
-        train_data_np = train_data.values
-        input_np = df_input.values[0]
-
-        # Fonction de prédiction probabiliste custom
-        def predict_proba_fn(arr):
-            # arr est un numpy array de (n_samples, n_features)
-            # Reconvertir en DataFrame pour le pipeline
-            df = pd.DataFrame(arr, columns=df_input.columns)
-            
-            # Restaurer les types (LIME convertit souvent en float)
-            # Ceci est critique car le pipeline attend des strings pour les catégorielles
-            for col in df_input.columns:
-                if df_input[col].dtype == 'object':
-                     # Essayer de mapper les floats vers les valeurs originales si on avait encodé...
-                     # C'est là que ça coince souvent.
-                     # Simplification: SI le pipeline plante sur des types, on a un souci.
-                     pass
-            
-            return model.predict_proba(df)
-
-        # Pour faire fonctionner LIME proprement avec des features string/catégorielles sans prise de tête:
-        # On va créer un explainer qui 'apprend' sur le training set brut.
-        # MAIS LimeTabularExplainer attend que les catégorielles soient des entiers.
-        
-        # ==> STRATÉGIE ROBUSTE:
-        # Encoder les strings en entiers pour LIME, et décoder dans la predict_fn.
-        
-        transformers = {} # col_idx -> LabelEncoder
-        from sklearn.preprocessing import LabelEncoder
+    
+    def __init__(self, train_data: pd.DataFrame, extra: Optional[pd.DataFrame] = None):
+        self.train_data = train_data
+        self.columns = list(train_data.columns)
+        # Indice de colonne -> modalités (les codes LIME sont des positions dans ce tableau)
+        self.classes = {}
         
         train_encoded = train_data.copy()
-        
-        for idx, col in enumerate(train_data.columns):
+        for idx, col in enumerate(self.columns):
             if train_data[col].dtype == 'object':
-                le = LabelEncoder()
-                # Fit sur train + input pour être sûr d'avoir toutes les classes
-                combined = pd.concat([train_data[col], df_input[col]])
-                le.fit(combined.astype(str))
-                
-                train_encoded[col] = le.transform(train_data[col].astype(str))
-                transformers[idx] = le
-            
-        # Créer l'explainer
-        explainer = lime.lime_tabular.LimeTabularExplainer(
+                values = train_data[col].astype(str)
+                seen = values if extra is None else pd.concat([values, extra[col].astype(str)])
+                classes = np.unique(seen.to_numpy()).astype(object)
+                train_encoded[col] = np.searchsorted(classes, values.to_numpy())
+                self.classes[idx] = classes
+        
+        self.explainer = lime_tabular.LimeTabularExplainer(
             train_encoded.values,
-            feature_names=list(train_data.columns),
+            feature_names=self.columns,
             class_names=['Sain', 'Risque'],
-            categorical_features=list(transformers.keys()),
+            categorical_features=list(self.classes),
             mode='classification',
-            discretize_continuous=True
+            discretize_continuous=True,
+            random_state=42  # Échantillonnage reproductible (explications stockées)
         )
+    
+    def encode(self, df_input: pd.DataFrame) -> Optional[np.ndarray]:
+        """Première ligne de df_input en codes LIME (None si une modalité est inconnue)"""
+        row = df_input.iloc[0]
+        encoded = np.empty(len(self.columns), dtype=np.float64)
+        for idx, col in enumerate(self.columns):
+            classes = self.classes.get(idx)
+            if classes is None:
+                encoded[idx] = row[col]
+                continue
+            value = str(row[col])
+            pos = int(np.searchsorted(classes, value))
+            if pos >= len(classes) or classes[pos] != value:
+                return None
+            encoded[idx] = pos
+        return encoded
+    
+    def _codes(self, samples: np.ndarray, idx: int) -> np.ndarray:
+        # LIME perturbe en float: arrondi puis clip pour éviter les erreurs d'index
+        return np.clip(np.round(samples[:, idx]).astype(np.intp), 0, len(self.classes[idx]) - 1)
+    
+    def decode(self, samples: np.ndarray) -> pd.DataFrame:
+        """Échantillons perturbés -> DataFrame brut (tables de correspondance NumPy)"""
+        data = {
+            col: self.classes[idx][self._codes(samples, idx)] if idx in self.classes else samples[:, idx]
+            for idx, col in enumerate(self.columns)
+        }
+        return pd.DataFrame(data, columns=self.columns)
+    
+    def numeric_encoder(self, compiled: Any) -> Optional[Callable[[np.ndarray], np.ndarray]]:
+        """
+        Échantillons perturbés -> matrice du classifieur, directement à partir des
+        tables d'une pipeline compilée (None si une modalité du dataset n'y figure pas)
+        """
+        index = {col: idx for idx, col in enumerate(self.columns)}
+        plan = []
+        try:
+            for col, kind, offset, params in compiled.steps:
+                idx = index[col]
+                if kind == 'scale':
+                    plan.append((idx, kind, offset, params))
+                    continue
+                classes = self.classes[idx]
+                if kind == 'map':
+                    plan.append((idx, kind, offset, np.array([params[c] for c in classes], dtype=np.float64)))
+                else:  # onehot
+                    positions, ignore_unknown = params
+                    table = np.array([positions.get(c, -1) for c in classes], dtype=np.intp)
+                    if not ignore_unknown and (table < 0).any():
+                        return None
+                    plan.append((idx, kind, offset, table))
+        except KeyError:
+            return None
+        
+        def encode(samples: np.ndarray) -> np.ndarray:
+            X = np.zeros((len(samples), compiled.n_features), dtype=np.float64)
+            for idx, kind, offset, params in plan:
+                if kind == 'scale':
+                    mean, scale = params
+                    X[:, offset] = (samples[:, idx] - mean) / scale
+                elif kind == 'map':
+                    X[:, offset] = params[self._codes(samples, idx)]
+                else:
+                    positions = params[self._codes(samples, idx)]
+                    rows = np.flatnonzero(positions >= 0)
+                    X[rows, offset + positions[rows]] = 1.0
+            return X.astype(compiled.dtype, copy=False)
+        return encode
+    
+    def new_explainer(self) -> Any:
+        """
+        Copie légère de l'explainer avec un générateur neuf (partagé par l'explainer,
+        son discrétiseur et LimeBase): résultat reproductible, appels concurrents isolés
+        """
+        random_state = np.random.RandomState(42)
+        explainer = copy.copy(self.explainer)
+        explainer.random_state = random_state
+        if explainer.discretizer is not None:
+            explainer.discretizer = copy.copy(explainer.discretizer)
+            explainer.discretizer.random_state = random_state
+        explainer.base = copy.copy(explainer.base)
+        explainer.base.random_state = random_state
+        return explainer
 
-        # Encoder l'input
-        input_encoded = df_input.copy()
-        for idx, le in transformers.items():
-            name = df_input.columns[idx]
-            input_encoded[name] = le.transform(df_input[name].astype(str))
-            
-        # Wrapper de prédiction qui décode
-        def custom_predict(np_array):
-            # np_array: shape (n, n_features) ints/floats
-            df_temp = pd.DataFrame(np_array, columns=train_data.columns)
-            
-            # Décoder
-            for idx, le in transformers.items():
-                name = train_data.columns[idx]
-                # LIME perturbe en float, on arrondi
-                vals = df_temp[name].round().astype(int)
-                # Clip pour éviter erreurs d'index
-                vals = vals.clip(0, len(le.classes_) - 1)
-                df_temp[name] = le.inverse_transform(vals)
-                
-            return model.predict_proba(df_temp)
-
-        # Expliquer
-        exp = explainer.explain_instance(
-            input_encoded.values[0],
-            custom_predict,
-            num_features=10,
-            num_samples=n_samples
-        )
+
+# Contexte LIME par colonnes: (signature du dataset, contexte)
+_lime_contexts: Dict[Tuple[str, ...], Tuple[tuple, LimeContext]] = {}
+_lime_lock = threading.Lock()
+
+
+def get_lime_context(columns: List[str]) -> LimeContext:
+    """Contexte LIME du dataset (reconstruit si le fichier change)"""
+    stat = os.stat(Config.DATASET_PATH)
+    signature = (Config.DATASET_PATH, stat.st_mtime_ns, stat.st_size)
+    key = tuple(columns)
+    cached = _lime_contexts.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    
+    with _lime_lock:
+        cached = _lime_contexts.get(key)
+        if cached is None or cached[0] != signature:
+            start = time.perf_counter()
+            train_data = pd.read_csv(Config.DATASET_PATH, usecols=list(columns))[list(columns)]
+            cached = (signature, LimeContext(train_data))
+            _lime_contexts[key] = cached
+            print(f"✓ Contexte LIME construit ({len(train_data)} lignes, {time.perf_counter() - start:.2f}s)")
+    return cached[1]
+
+
+def _lime_rounds(n_samples: int) -> List[int]:
+    """Tailles cumulées des tours: LIME_INITIAL_SAMPLES doublé jusqu'à n_samples"""
+    rounds = []
+    size = max(1, min(Config.LIME_INITIAL_SAMPLES, n_samples))
+    while size < n_samples:
+        rounds.append(size)
+        size *= 2
+    rounds.append(n_samples)
+    return rounds
+
+
+def _lime_convergence_error(previous: List[Tuple[str, float]], current: List[Tuple[str, float]],
+                            top_k: int) -> float:
+    """
+    Écart entre deux tours: inf si le classement du top-k change, sinon variation
+    maximale de ses poids rapportée au plus grand d'entre eux
+    """
+    if [name for name, _ in previous[:top_k]] != [name for name, _ in current[:top_k]]:
+        return float('inf')
+    weights = dict(previous)
+    scale = max(abs(value) for _, value in current[:top_k]) or 1.0
+    return max(abs(value - weights[name]) for name, value in current[:top_k]) / scale
+
+
+def _explain_lime_adaptive(explainer: Any, data_row: np.ndarray, predict_fn: Callable,
+                           n_samples: int, num_features: int) -> Tuple[Any, Dict[str, Any]]:
+    """
+    LIME par tours de taille croissante sur un voisinage tiré une seule fois:
+    chaque tour ne score que ses nouveaux échantillons puis réajuste le modèle
+    local sur tout le préfixe. Arrêt dès que le top-k et ses poids sont stables
+    (LIME_TOLERANCE) ou que LIME_TIME_BUDGET est écoulé. Le dernier tour possible
+    (n_samples) donne exactement l'explication non adaptative.
+    """
+    deadline = time.perf_counter() + Config.LIME_TIME_BUDGET
+    # explain_instance tire ses échantillons via __data_inverse: l'explainer étant
+    # une copie propre à l'appel, on le remplace par des préfixes du voisinage complet
+    data, inverse = explainer._LimeTabularExplainer__data_inverse(data_row, n_samples)
+    explainer._LimeTabularExplainer__data_inverse = lambda row, num: (data[:num], inverse[:num])
+    
+    scored = []
+    
+    def predict_prefix(samples):
+        done = sum(len(chunk) for chunk in scored)
+        if len(samples) > done:
+            scored.append(predict_fn(samples[done:]))
+        return np.concatenate(scored)[:len(samples)]
+    
+    previous, error, converged = None, None, False
+    for size in _lime_rounds(n_samples):
+        exp = explainer.explain_instance(data_row, predict_prefix, num_features=num_features, num_samples=size)
+        current = exp.as_list()
+        if previous is not None:
+            error = _lime_convergence_error(previous, current, Config.LIME_TOP_K)
+            if error <= Config.LIME_TOLERANCE:
+                converged = True
+                break
+        if time.perf_counter() >= deadline:
+            break
+        previous = current
+    
+    report = {
+        "samples_used": size,
+        "convergence_error": float(error) if error is not None and np.isfinite(error) else None,
+        "converged": converged,
+        # Arrêté par LIME_TIME_BUDGET avant le plafond: dépend de la charge, non stocké
+        "truncated": not converged and size < n_samples
+    }
+    return exp, report
+
+
+@timed(STAGE_SECONDS, 'explain_lime')
+@stored_explanation('lime', settings=('LIME_ADAPTIVE', 'LIME_INITIAL_SAMPLES', 'LIME_TOP_K', 'LIME_TOLERANCE'))
+def explain_model_prediction_lime(model: Any, df_input: pd.DataFrame, n_samples: int = 5000,
+                                  adaptive: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Retourne les contributions LIME pour une prédiction.
+    
+    En mode adaptatif (LIME_ADAPTIVE par défaut), n_samples est un plafond: la
+    réponse indique les échantillons utilisés et l'écart de convergence.
+    """
+    try:
+        # 1) CONTEXTE LIME (train set encodé + explainer, construit une fois par dataset)
+        try:
+            context = get_lime_context(list(df_input.columns))
+        except Exception:
+            # Fallback: train set = df_input. Très mauvais pour LIME mais évite le crash
+            context = LimeContext(df_input.copy())
+        
+        # 2) ENCODAGE DE L'ENTRÉE
+        # LimeTabularExplainer attend des catégorielles entières: une modalité absente
+        # du train set impose un contexte ponctuel dont les codes l'incluent
+        input_encoded = context.encode(df_input)
+        if input_encoded is None:
+            context = LimeContext(context.train_data, extra=df_input)
+            input_encoded = context.encode(df_input)
+        
+        # 3) PRÉDICTION SUR LES ÉCHANTILLONS PERTURBÉS
+        # Modèle servi et compilé: codes -> espace numérique du classifieur en un appel;
+        # sinon décodage vectorisé en DataFrame brut pour la pipeline
+        served = ModelManager.find_served(model)
+        compiled = served[1].compiled if served else None
+        encode = context.numeric_encoder(compiled) if compiled is not None else None
+        if encode is not None:
+            def custom_predict(samples):
+                return compiled.estimator.predict_proba(encode(samples))
+        else:
+            def custom_predict(samples):
+                return model.predict_proba(context.decode(samples))
+        
+        # 4) EXPLIQUER
+        explainer = context.new_explainer()
+        report = {}
+        if Config.LIME_ADAPTIVE if adaptive is None else adaptive:
+            exp, report = _explain_lime_adaptive(explainer, input_encoded, custom_predict, n_samples, num_features=10)
+        else:
+            exp = explainer.explain_instance(
+                input_encoded,
+                custom_predict,
+                num_features=10,
+                num_samples=n_samples
+            )
         
         # Formater
         c = exp.as_list()
@@ -493,7 +867,7 @@ def explain_model_prediction_lime(model: Any, df_input: pd.DataFrame, n_samples:
                 "is_risk": value > 0
             })
             
-        return {"explanation": structured}
+        return {"explanation": structured, **report}
 
     except Exception as e:
         import traceback
@@ -0,0 +1,7 @@
+"""
+Micro-benchmarks des chemins critiques (hors ligne, données synthétiques).
+
+Usage:
+    python -m benchmarks.run --output benchmarks/results/run.json [--quick]
+        [--compare benchmarks/results/baseline.json]
+"""
@@ -0,0 +1,397 @@
+"""
+Générateur de charge: débit, taux d'erreur et latences p50/p95/p99 par endpoint.
+
+Le trafic (formulaire de prédiction, API JSON, upload d'image, callback du
+dashboard, liste admin) est tiré selon les poids de `--mix`. Deux régimes:
+
+- concurrence fixe (`--concurrency N`): N clients en boucle fermée, chacun
+  envoie sa requête suivante dès la réponse reçue;
+- débit d'arrivée fixe (`--rate R`): R requêtes/s planifiées à intervalles
+  réguliers, quelle que soit la vitesse du serveur. La latence est mesurée
+  depuis l'instant planifié: l'attente d'un client libre est comptée.
+
+Sans `--url`, l'application (create_app) tourne dans le processus et chaque
+client est un `test_client` Flask; `--synthetic-models` sert alors des
+pipelines synthétiques (les .pkl du dépôt sont des pointeurs LFS). Avec
+`--url`, la charge vise un serveur local (gunicorn: faire varier
+WEB_CONCURRENCY et GUNICORN_THREADS et comparer les rapports).
+
+Usage:
+    python -m benchmarks.load [--url http://localhost:5000] [--concurrency 8 | --rate 50]
+        [--duration 30] [--mix form=4,api=4,image=1,dashboard=1,admin=1] [--output load.json]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+import numpy as np
+from app_module.config.settings import Config
+from benchmarks.run import _configured, environment
+from benchmarks.synthetic import make_dataset, serve_synthetic_models
+
+ENDPOINTS = ('form', 'api', 'image', 'dashboard', 'admin')
+DEFAULT_MIX = 'form=4,api=4,image=1,dashboard=1,admin=1'
+DASH_PREFIX = '/dashboard/'
+
+
+class InProcessClient:
+    """Client Flask dans le processus (un par thread; cookies conservés)"""
+    
+    def __init__(self, app):
+        self.client = app.test_client()
+    
+    def request(self, method: str, path: str, form: Optional[Mapping] = None, json_body: Any = None,
+                files: Optional[Dict[str, Tuple[bytes, str, str]]] = None) -> Tuple[int, bytes]:
+        data = dict(form or {})
+        for field, (content, filename, content_type) in (files or {}).items():
+            data[field] = (io.BytesIO(content), filename, content_type)
+        response = self.client.open(path, method=method, data=data or None, json=json_body)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    """Client HTTP (urllib) vers un serveur, avec son propre jeu de cookies"""
+    
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+    
+    def request(self, method: str, path: str, form: Optional[Mapping] = None, json_body: Any = None,
+                files: Optional[Dict[str, Tuple[bytes, str, str]]] = None) -> Tuple[int, bytes]:
+        headers = {}
+        body = None
+        if files:
+            body, headers['Content-Type'] = _multipart(form or {}, files)
+        elif json_body is not None:
+            body, headers['Content-Type'] = json.dumps(json_body).encode(), 'application/json'
+        elif form is not None:
+            body, headers['Content-Type'] = urlencode(form).encode(), 'application/x-www-form-urlencoded'
+        
+        request = Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except HTTPError as e:
+            return e.code, e.read()
+
+
+def _multipart(form: Mapping, files: Dict[str, Tuple[bytes, str, str]]) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in form.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (content, filename, content_type) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'form=4,api=4' -> {'form': 4.0, 'api': 4.0} (poids > 0 uniquement)"""
+    mix = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, weight = item.partition('=')
+        if name not in ENDPOINTS:
+            raise ValueError(f"Endpoint inconnu dans --mix: {name} (attendus: {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        raise ValueError("--mix ne contient aucun endpoint")
+    return mix
+
+
+class Traffic:
+    """Construction des requêtes de chaque endpoint (données synthétiques, graine fixe)"""
+    
+    def __init__(self, model_names: List[str], admin_password: str, seed: int = 0):
+        self.records = make_dataset(500, seed).drop(columns='SkinCancer').to_dict('records')
+        self.model_names = model_names
+        self.admin_password = admin_password
+        self.image = _jpeg_bytes(seed)
+        self.dashboard_payload = None
+    
+    def prepare(self, client) -> bool:
+        """
+        Lire la définition du callback principal du dashboard et la valeur initiale
+        de ses entrées dans le layout (une fois). False si le callback est introuvable.
+        """
+        status, body = client.request('GET', DASH_PREFIX + '_dash-dependencies')
+        if status != 200:
+            return False
+        dependency = next((d for d in json.loads(body) if 'stat-total' in d['output']), None)
+        if dependency is None:
+            return False
+        status, body = client.request('GET', DASH_PREFIX + '_dash-layout')
+        if status != 200:
+            return False
+        props = _layout_props(json.loads(body))
+        if any(item['id'] not in props for item in dependency['inputs']):
+            return False
+        outputs = [dict(zip(('id', 'property'), item.split('.')))
+                   for item in dependency['output'].strip('.').split('...')]
+        self.dashboard_payload = {
+            'output': dependency['output'],
+            'outputs': outputs,
+            'inputs': [dict(item, value=props[item['id']].get(item['property'])) for item in dependency['inputs']],
+            'changedPropIds': [],
+            'state': []
+        }
+        return True
+    
+    def login(self, client) -> None:
+        client.request('POST', '/admin/login', form={'password': self.admin_password})
+    
+    def send(self, client, endpoint: str, rng: random.Random) -> int:
+        record = rng.choice(self.records)
+        model_name = rng.choice(self.model_names)
+        if endpoint == 'form':
+            return client.request('POST', '/api/prediction/',
+                                  form={**{k: str(v) for k, v in record.items()}, 'model_choice': model_name})[0]
+        if endpoint == 'api':
+            return client.request('POST', '/api/prediction/api', json_body={**record, 'model_choice': model_name})[0]
+        if endpoint == 'image':
+            return client.request('POST', '/api/predict-image',
+                                  files={'file': (self.image, 'lesion.jpg', 'image/jpeg')})[0]
+        if endpoint == 'dashboard':
+            return client.request('POST', DASH_PREFIX + '_dash-update-component', json_body=self.dashboard_payload)[0]
+        return client.request('GET', '/admin/tests')[0]
+
+
+def _layout_props(node: Any, props: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Propriétés des composants du layout Dash sérialisé, par id"""
+    props = {} if props is None else props
+    if isinstance(node, list):
+        for child in node:
+            _layout_props(child, props)
+    elif isinstance(node, dict) and isinstance(node.get('props'), dict):
+        if 'id' in node['props']:
+            props[str(node['props']['id'])] = node['props']
+        _layout_props(node['props'].get('children'), props)
+    return props
+
+
+def _jpeg_bytes(seed: int) -> bytes:
+    from PIL import Image
+    
+    rng = np.random.RandomState(seed)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.randint(0, 256, (480, 640, 3), dtype=np.uint8)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class Recorder:
+    """Latences et statuts par endpoint"""
+    
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, endpoint: str, seconds: float, status: int) -> None:
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            statuses = self.statuses.setdefault(endpoint, {})
+            statuses[status] = statuses.get(status, 0) + 1
+    
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        all_latencies, all_statuses = [], {}
+        for endpoint in sorted(self.latencies):
+            report[endpoint] = _summarize(self.latencies[endpoint], self.statuses[endpoint], elapsed)
+            all_latencies.extend(self.latencies[endpoint])
+            for status, count in self.statuses[endpoint].items():
+                all_statuses[status] = all_statuses.get(status, 0) + count
+        if all_latencies:
+            report['total'] = _summarize(all_latencies, all_statuses, elapsed)
+        return report
+
+
+def _summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> Dict[str, Any]:
+    ms = np.asarray(latencies) * 1000
+    errors = sum(count for status, count in statuses.items() if status >= 400 or status == 0)
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'requests': len(ms),
+        'errors': errors,
+        'error_rate': round(errors / len(ms), 4),
+        'throughput_rps': round(len(ms) / elapsed, 2),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(ms.max()), 2),
+        'status': {str(status): count for status, count in sorted(statuses.items())}
+    }
+
+
+class LoadTest:
+    """Exécution d'une campagne (concurrence fixe ou débit d'arrivée fixe)"""
+    
+    def __init__(self, make_client, traffic: Traffic, mix: Dict[str, float], seed: int = 0):
+        self.make_client = make_client
+        self.traffic = traffic
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.seed = seed
+        self.recorder = Recorder()
+        self._local = threading.local()
+        self._seeds = iter(range(seed, seed + 1_000_000))
+        self._seed_lock = threading.Lock()
+    
+    def _client(self) -> Tuple[Any, random.Random]:
+        """Client et générateur propres au thread (connecté à l'admin si besoin)"""
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            client = self.make_client()
+            if 'admin' in self.endpoints:
+                self.traffic.login(client)
+            with self._seed_lock:
+                rng = random.Random(next(self._seeds))
+            state = self._local.state = (client, rng)
+        return state
+    
+    def _send(self, scheduled: float, record_after: float) -> None:
+        client, rng = self._client()
+        endpoint = rng.choices(self.endpoints, self.weights)[0]
+        try:
+            status = self.traffic.send(client, endpoint, rng)
+        except Exception:
+            status = 0
+        if scheduled >= record_after:
+            self.recorder.add(endpoint, time.perf_counter() - scheduled, status)
+    
+    def run_concurrency(self, concurrency: int, duration: float, warmup: float = 0.0) -> float:
+        start = time.perf_counter()
+        record_after = start + warmup
+        deadline = record_after + duration
+        
+        def worker():
+            while time.perf_counter() < deadline:
+                self._send(time.perf_counter(), record_after)
+        
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - record_after
+    
+    def run_rate(self, rate: float, duration: float, warmup: float = 0.0, max_workers: int = 64) -> float:
+        start = time.perf_counter()
+        record_after = start + warmup
+        total = int((warmup + duration) * rate)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for i in range(total):
+                scheduled = start + i / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._send, scheduled, record_after)
+        return time.perf_counter() - record_after
+
+
+def run(url: Optional[str] = None, concurrency: Optional[int] = None, rate: Optional[float] = None,
+        duration: float = 30.0, warmup: float = 0.0, mix: str = DEFAULT_MIX, models: Optional[List[str]] = None,
+        synthetic_models: bool = False, admin_password: Optional[str] = None, max_workers: int = 64,
+        seed: int = 0) -> Dict[str, Any]:
+    """Exécuter une campagne et retourner le rapport par endpoint"""
+    if (concurrency is None) == (rate is None):
+        raise ValueError("Choisir soit une concurrence fixe, soit un débit d'arrivée")
+    weights = parse_mix(mix)
+    admin_password = admin_password or os.getenv('ADMIN_PASSWORD', 'admin123')
+    
+    with tempfile.TemporaryDirectory(prefix='loadtest-') as workdir:
+        with _configured(KNN_INDEX_DIR=os.path.join(workdir, 'knn_index'),
+                         DATABASE_PATH=os.path.join(workdir, 'tests.db'), MODEL_WATCH_ENABLED=False):
+            if url:
+                make_client = lambda: HttpClient(url)
+                model_names = models or list(Config.MODELS)
+            else:
+                from app_module import create_app
+                
+                if synthetic_models:
+                    serve_synthetic_models(make_dataset(3_000), workdir)
+                app = create_app()
+                model_names = models or list(Config.MODELS)
+                make_client = lambda: InProcessClient(app)
+                if 'image' in weights and not any(rule.rule == '/api/predict-image' for rule in app.url_map.iter_rules()):
+                    print("✗ /api/predict-image non enregistré: endpoint image retiré du mélange")
+                    del weights['image']
+                    if not weights:
+                        raise ValueError("--mix ne contient aucun endpoint disponible")
+            
+            traffic = Traffic(model_names, admin_password, seed)
+            if not traffic.prepare(make_client()) and 'dashboard' in weights:
+                print("✗ Callback du dashboard introuvable: endpoint dashboard retiré du mélange")
+                del weights['dashboard']
+                if not weights:
+                    raise ValueError("--mix ne contient aucun endpoint disponible")
+            test = LoadTest(make_client, traffic, weights, seed)
+            if concurrency is not None:
+                elapsed = test.run_concurrency(concurrency, duration, warmup)
+            else:
+                elapsed = test.run_rate(rate, duration, warmup, max_workers)
+    
+    return {
+        'environment': environment(),
+        'target': url or 'in-process',
+        'mode': 'concurrency' if concurrency is not None else 'rate',
+        'concurrency': concurrency,
+        'rate': rate,
+        'duration_seconds': round(elapsed, 2),
+        'mix': weights,
+        'endpoints': test.recorder.summary(elapsed)
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    load = f"{report['concurrency']} clients" if report['mode'] == 'concurrency' else f"{report['rate']} req/s"
+    print(f"✓ {report['target']}, {load}, {report['duration_seconds']}s")
+    for endpoint, stats in report['endpoints'].items():
+        flag = '✗' if stats['errors'] else '✓'
+        print(f"{flag} {endpoint:<10} {stats['requests']:>7} req  {stats['throughput_rps']:>8.1f} req/s  "
+              f"erreurs {stats['error_rate']:.1%}  p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  "
+              f"p99 {stats['p99_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Campagne de charge: débit, erreurs et latences par endpoint")
+    parser.add_argument('--url', help="Serveur cible (dans le processus par défaut)")
+    load = parser.add_mutually_exclusive_group(required=True)
+    load.add_argument('--concurrency', type=int, help="Clients simultanés (boucle fermée)")
+    load.add_argument('--rate', type=float, help="Requêtes par seconde (arrivées planifiées)")
+    parser.add_argument('--duration', type=float, default=30.0, help="Secondes mesurées")
+    parser.add_argument('--warmup', type=float, default=0.0, help="Secondes de chauffe non comptées")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Poids par endpoint ({DEFAULT_MIX})")
+    parser.add_argument('--models', nargs='*', help="Modèles tirés pour les prédictions (Config.MODELS par défaut)")
+    parser.add_argument('--synthetic-models', action='store_true',
+                        help="Dans le processus: servir des pipelines synthétiques")
+    parser.add_argument('--max-workers', type=int, default=64, help="Clients disponibles en mode --rate")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Rapport JSON")
+    args = parser.parse_args()
+    
+    report = run(args.url, args.concurrency, args.rate, args.duration, args.warmup, args.mix, args.models,
+                 args.synthetic_models, max_workers=args.max_workers, seed=args.seed)
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Rapport écrit dans {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+Micro-benchmarks des chemins critiques, résultats en JSON comparables entre deux runs.
+
+Tout tourne dans un dossier temporaire (dataset et modèles synthétiques, index
+KNN, bases SQLite, certificats): les chemins de Config concernés, dont
+DATABASE_PATH, y sont redirigés le temps du run. Chaque cas est
+répété jusqu'à `--budget` secondes (au moins 3 fois) après un appel de chauffe;
+les durées sont en millisecondes (min, médiane, p95, moyenne).
+
+Usage:
+    python -m benchmarks.run [--output benchmarks/results/latest.json] [--quick]
+        [--cases predict_proba database ...] [--compare baseline.json] [--tolerance 0.2]
+
+Avec --compare, le code de sortie vaut 1 si une médiane dépasse celle de la
+référence de plus de `tolerance` (20 % par défaut).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+import sklearn
+from app_module.config.settings import Config
+from benchmarks.synthetic import make_dataset, serve_synthetic_models
+
+BATCH_SIZES = (1, 64, 4096)
+DB_SIZES = (1_000, 100_000, 1_000_000)
+CASES = ('prepare_input', 'predict_proba', 'explain', 'pdf', 'certificate', 'dashboard', 'database', 'image')
+
+
+def measure(func: Callable[[], Any], budget: float, min_runs: int = 3, max_runs: int = 1000) -> Dict[str, Any]:
+    """Durées (ms) de `func` après un appel de chauffe"""
+    func()
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < min_runs or (time.perf_counter() - start < budget and len(samples) < max_runs):
+        t0 = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples = np.asarray(samples)
+    return {
+        'runs': len(samples),
+        'min_ms': round(float(samples.min()), 4),
+        'median_ms': round(float(np.median(samples)), 4),
+        'p95_ms': round(float(np.percentile(samples, 95)), 4),
+        'mean_ms': round(float(samples.mean()), 4)
+    }
+
+
+@contextmanager
+def _configured(**overrides) -> Iterator[None]:
+    """Remplacer temporairement des attributs de Config"""
+    previous = {name: getattr(Config, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(Config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(Config, name, value)
+
+
+class BenchmarkRun:
+    """Contexte partagé par les cas (dossier de travail, dataset, modèles)"""
+    
+    def __init__(self, workdir: str, quick: bool, budget: float):
+        self.workdir = workdir
+        self.quick = quick
+        self.budget = budget
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.dataset = make_dataset(5_000 if quick else 50_000)
+        self.dataset_path = os.path.join(workdir, 'dataset.csv')
+        self.dataset.to_csv(self.dataset_path, index=False)
+        self.features = self.dataset.drop(columns='SkinCancer')
+        self._explanations: Dict[str, Any] = {}
+    
+    def record(self, name: str, func: Callable[[], Any], budget: Optional[float] = None, **kwargs) -> None:
+        self.results[name] = measure(func, self.budget if budget is None else budget, **kwargs)
+        print(f"✓ {name}: {self.results[name]['median_ms']} ms (médiane, {self.results[name]['runs']} runs)")
+    
+    def load_models(self) -> None:
+        serve_synthetic_models(self.dataset.sample(n=3_000, random_state=42), self.workdir)
+    
+    # --- Cas ---
+    
+    def bench_prepare_input(self) -> None:
+        from app_module.utils.data import prepare_batch_prediction_input, prepare_prediction_input
+        
+        forms = self.features.astype(str).to_dict('records')
+        self.record('prepare_input/1', lambda: prepare_prediction_input(forms[0]))
+        for size in BATCH_SIZES[1:]:
+            self.record(f'prepare_input/{size}', lambda size=size: prepare_batch_prediction_input(forms[:size]))
+    
+    def bench_predict_proba(self) -> None:
+        from app_module.utils.models import ModelManager, PredictionEngine
+        
+        for name in ModelManager.registry().names():
+            for size in BATCH_SIZES:
+                batch = self.features.iloc[:size].reset_index(drop=True)
+                self.record(f'predict_proba/{name}/{size}',
+                            lambda name=name, batch=batch: PredictionEngine.predict_proba(name, batch))
+    
+    def bench_explain(self) -> None:
+        from app_module.utils.models import ModelManager
+        from app_module.utils.xai import explain_model_prediction, explain_model_prediction_lime
+        
+        df_input = self.features.iloc[[0]].reset_index(drop=True)
+        for name in ModelManager.registry().names():
+            model = ModelManager.get_model(name)
+            for kind, explain in (('shap', explain_model_prediction), ('lime', explain_model_prediction_lime)):
+                explanation = explain(model, df_input)
+                if 'error' in explanation:
+                    print(f"✗ explain_{kind}/{name}: {explanation['error'].splitlines()[0]}")
+                    continue
+                self._explanations.setdefault(kind, explanation)
+                self.record(f'explain_{kind}/{name}', lambda model=model, explain=explain: explain(model, df_input),
+                            min_runs=1 if self.quick else 3)
+            self.record(f'explain_lime_adaptive/{name}',
+                        lambda model=model: explain_model_prediction_lime(model, df_input, adaptive=True),
+                        min_runs=1 if self.quick else 3)
+        
+        # Explication déjà stockée: une recherche indexée dans le store SQLite
+        from app_module.utils import explanation_store
+        
+        store = explanation_store.ExplanationStore(os.path.join(self.workdir, 'explanations.db'))
+        default_store, explanation_store.explanation_store = explanation_store.explanation_store, store
+        try:
+            with _configured(EXPLANATION_STORE_ENABLED=True):
+                model = ModelManager.get_model('log_reg')
+                explain_model_prediction(model, df_input)
+                self.record('explain_stored', lambda: explain_model_prediction(model, df_input))
+        finally:
+            explanation_store.explanation_store = default_store
+    
+    def bench_pdf(self) -> None:
+        import plotly.graph_objects as go
+        from app_module.utils.report import generate_professional_pdf
+        
+        if 'shap' not in self._explanations:
+            self.bench_explain()
+        shap_explanation = self._explanations.get('shap', {})
+        lime_explanation = self._explanations.get('lime')
+        top = shap_explanation.get('top_features', [])
+        shap_fig = go.Figure(go.Bar(x=[f['shap_value'] for f in top], y=[f['feature'] for f in top], orientation='h'))
+        input_data = self.features.iloc[0].to_dict()
+        meta = {'Model': 'log_reg', 'Prediction': '1', 'Probability': '0.73', 'Date': '2024-01-01 12:00'}
+        self.record('pdf', lambda: generate_professional_pdf(
+            'Rapport de prédiction', shap_explanation, lime_explanation,
+            shap_fig=shap_fig, meta=meta, input_data=input_data))
+    
+    def bench_certificate(self) -> None:
+        from app_module.utils.certificate import generate_certificate_image
+        
+        input_features = self.features.iloc[0].to_dict()
+        with _configured(BASE_DIR=self.workdir):
+            self.record('certificate', lambda: generate_certificate_image(
+                1, 1, 0.73, 'log_reg', '2024-01-01 12:00:00', input_features))
+    
+    def bench_dashboard(self) -> None:
+        from flask import Flask
+        from app_module.routes.dashboard import dashboard_bp
+        
+        dash_app = dashboard_bp(Flask(__name__))
+        callback = next(entry['callback'] for key, entry in dash_app.callback_map.items() if 'stat-total' in key)
+        update_dashboard = getattr(callback, '__wrapped__', callback)
+        self.record('dashboard/all', lambda: update_dashboard('all', 'all', 'all', 'all'))
+        self.record('dashboard/filtered', lambda: update_dashboard(['60-64', '65-69'], 'Yes', 'Female', 'all'))
+    
+    def bench_database(self) -> None:
+        from app_module.utils.database import TestDatabase
+        
+        record = self.features.iloc[0].to_dict()
+        features_json = json.dumps(record)
+        for size in DB_SIZES[:1] if self.quick else DB_SIZES:
+            path = os.path.join(self.workdir, f'tests_{size}.db')
+            db = TestDatabase(path)
+            _fill_tests(path, size, features_json)
+            self.record(f'db_save_test/{size}',
+                        lambda db=db: db.save_test('log_reg', 1, 0.73, record, user_ip='127.0.0.1'))
+            self.record(f'db_get_all_tests/{size}', lambda db=db: db.get_all_tests(limit=100))
+            os.remove(path)
+    
+    def bench_image(self) -> None:
+        from PIL import Image
+        from app_module.utils.image import preprocess_image
+        
+        rng = np.random.RandomState(0)
+        buffer = io.BytesIO()
+        Image.fromarray(rng.randint(0, 256, (768, 1024, 3), dtype=np.uint8)).save(buffer, format='JPEG')
+        image_bytes = buffer.getvalue()
+        self.record('image_preprocess', lambda: preprocess_image(image_bytes, 236))
+
+
+def _fill_tests(path: str, n_rows: int, features_json: str, chunk_size: int = 50_000) -> None:
+    """Remplir la table tests (horodatages croissants, une ligne par seconde)"""
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    for offset in range(0, n_rows, chunk_size):
+        rows = [
+            ((start + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S'), 'log_reg', i % 2,
+             (i % 100) / 100, features_json, None, None, '127.0.0.1')
+            for i in range(offset, min(offset + chunk_size, n_rows))
+        ]
+        conn.executemany('''
+            INSERT INTO tests
+            (timestamp, model_used, prediction, probability, input_features, explanation, certificate_path, user_ip)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    conn.close()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Cas dont la médiane dépasse celle de la référence de plus de `tolerance`"""
+    regressions = []
+    for name, current in sorted(results.items()):
+        reference = baseline.get(name)
+        if not reference or not reference.get('median_ms'):
+            continue
+        ratio = current['median_ms'] / reference['median_ms']
+        flag = '✗' if ratio > 1 + tolerance else '✓'
+        print(f"{flag} {name}: {reference['median_ms']} -> {current['median_ms']} ms (x{ratio:.2f})")
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def run(cases: Optional[List[str]] = None, quick: bool = False, budget: Optional[float] = None) -> Dict[str, Any]:
+    """Exécuter les cas demandés (tous par défaut) et retourner le rapport"""
+    cases = cases or list(CASES)
+    budget = budget if budget is not None else (0.2 if quick else 1.0)
+    with tempfile.TemporaryDirectory(prefix='benchmarks-') as workdir:
+        with _configured(DATASET_PATH=os.path.join(workdir, 'dataset.csv'),
+                         KNN_INDEX_DIR=os.path.join(workdir, 'knn_index'),
+                         SHAP_BACKGROUND_DIR=os.path.join(workdir, 'shap_background'),
+                         DATABASE_PATH=os.path.join(workdir, 'tests.db'),
+                         EXPLANATION_STORE_ENABLED=False,
+                         MODEL_WATCH_ENABLED=False, MICRO_BATCH_ENABLED=False):
+            bench = BenchmarkRun(workdir, quick, budget)
+            if {'predict_proba', 'explain', 'pdf'} & set(cases):
+                bench.load_models()
+            for case in cases:
+                getattr(bench, f'bench_{case}')()
+    return {'environment': environment(), 'quick': quick, 'budget_seconds': budget, 'results': bench.results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks des chemins critiques (JSON)")
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'results', 'latest.json'))
+    parser.add_argument('--cases', nargs='*', choices=CASES, help="Cas à exécuter (tous par défaut)")
+    parser.add_argument('--quick', action='store_true', help="Petits volumes (dataset 5k, base 1k lignes)")
+    parser.add_argument('--budget', type=float, default=None, help="Secondes de mesure par cas")
+    parser.add_argument('--compare', help="Rapport JSON de référence")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Ralentissement toléré (0.2 = +20 %%)")
+    args = parser.parse_args()
+    
+    report = run(args.cases, args.quick, args.budget)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Résultats écrits dans {args.output}")
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(report['results'], baseline, args.tolerance)
+        if regressions:
+            print(f"✗ {len(regressions)} régression(s) au-delà de {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
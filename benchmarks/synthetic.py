@@ -0,0 +1,102 @@
+"""
+Dataset et pipelines synthétiques, de même structure que ceux de models/Training.ipynb.
+
+Les .pkl du dépôt sont des pointeurs LFS: les benchmarks entraînent leurs propres
+pipelines (petites, graine fixe) pour rester reproductibles hors ligne.
+"""
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, OrdinalEncoder, StandardScaler
+from app_module.utils.data import CATEGORY_VALUES, FEATURE_COLUMNS, NUMERIC_COLUMNS
+
+BINARY_COLS = ['HeartDisease', 'Smoking', 'AlcoholDrinking', 'Stroke', 'DiffWalking',
+               'Sex', 'Diabetic', 'PhysicalActivity', 'Asthma', 'KidneyDisease']
+GENHEALTH_CATEGORIES = ['Poor', 'Fair', 'Good', 'Very good', 'Excellent']
+
+# Bornes des colonnes numériques (cf. data/dataset.csv)
+NUMERIC_RANGES = {
+    'BMI': (12.0, 60.0),
+    'PhysicalHealth': (0.0, 30.0),
+    'MentalHealth': (0.0, 30.0),
+    'SleepTime': (1.0, 24.0)
+}
+
+
+def binary_map(x):
+    return 1 if x in ['Yes', 'Male', 'Yes (during pregnancy)'] else 0
+
+
+def binary_transform(df):
+    return df.map(binary_map)
+
+
+def build_pipeline(clf: Any) -> Pipeline:
+    """Pipeline preprocess + clf, comme dans models/Training.ipynb"""
+    preprocessor = ColumnTransformer(transformers=[
+        ('binary', FunctionTransformer(binary_transform), BINARY_COLS),
+        ('ordinal', OrdinalEncoder(categories=[GENHEALTH_CATEGORIES, CATEGORY_VALUES['AgeCategory']]),
+         ['GenHealth', 'AgeCategory']),
+        ('onehot', OneHotEncoder(sparse_output=False, handle_unknown='ignore'), ['Race']),
+        ('scale', StandardScaler(), NUMERIC_COLUMNS)
+    ])
+    return Pipeline([('preprocess', preprocessor), ('clf', clf)])
+
+
+def make_dataset(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Patients aléatoires au format data/dataset.csv (SkinCancer dépend surtout de l'âge)"""
+    rng = np.random.RandomState(seed)
+    data = {}
+    for col in FEATURE_COLUMNS:
+        if col in NUMERIC_COLUMNS:
+            low, high = NUMERIC_RANGES[col]
+            data[col] = np.round(rng.uniform(low, high, n_rows), 2)
+        else:
+            data[col] = rng.choice(CATEGORY_VALUES[col], n_rows)
+    df = pd.DataFrame(data, columns=FEATURE_COLUMNS)
+    
+    age = df['AgeCategory'].map({v: i for i, v in enumerate(CATEGORY_VALUES['AgeCategory'])})
+    logit = -3.5 + 0.25 * age + 0.8 * (df['Race'] == 'White') + 0.3 * (df['Smoking'] == 'Yes')
+    df['SkinCancer'] = np.where(rng.uniform(size=n_rows) < 1 / (1 + np.exp(-logit)), 'Yes', 'No')
+    return df
+
+
+def train_pipelines(df: pd.DataFrame) -> Dict[str, Pipeline]:
+    """Les quatre modèles servis (noms de Config.MODELS), en petite taille"""
+    X = df[FEATURE_COLUMNS]
+    y = (df['SkinCancer'] == 'Yes').astype(int)
+    models = {
+        'log_reg': LogisticRegression(max_iter=1000),
+        'random_forest': RandomForestClassifier(n_estimators=50, max_depth=12, random_state=42),
+        'gradient_boosting': GradientBoostingClassifier(n_estimators=50, random_state=42),
+        'knn': KNeighborsClassifier(n_neighbors=5)
+    }
+    return {name: build_pipeline(clf).fit(X, y) for name, clf in models.items()}
+
+
+def serve_synthetic_models(df: pd.DataFrame, directory: str) -> List[str]:
+    """
+    Entraîner les pipelines, les écrire dans `directory` et les servir via
+    ModelManager (compilation, index KNN dans Config.KNN_INDEX_DIR)
+    """
+    from app_module.utils.knn_index import build_knn_index, index_directory, supports_index
+    from app_module.utils.models import ModelManager, ModelRegistry, file_fingerprint
+    
+    paths = {}
+    for name, pipeline in train_pipelines(df).items():
+        paths[name] = os.path.join(directory, f'pipeline_{name}.pkl')
+        joblib.dump(pipeline, paths[name])
+        if supports_index(pipeline.named_steps['clf']):
+            build_knn_index(pipeline).save(index_directory(name), file_fingerprint(paths[name]))
+    
+    for attr in ('_served', '_shadow'):
+        setattr(ModelManager, attr, {})
+    ModelManager._registry = ModelRegistry.from_config(paths)
+    return list(ModelManager.load_models())
@@ -0,0 +1,21 @@
+"""
+Configuration gunicorn
+
+Les modèles sont chargés une seule fois dans le master avant le fork des workers
+(preload): les tableaux mappés depuis les pickles et les objets gelés par
+`ModelManager.preload()` sont partagés en copy-on-write au lieu d'être dupliqués
+par chaque worker.
+"""
+import os
+
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+preload_app = True
+
+
+def when_ready(server):
+    """Master prêt, workers pas encore forkés: charger les modèles"""
+    from app_module.utils.models import ModelManager
+    models = ModelManager.preload()
+    server.log.info("Modèles préchargés: %s", ", ".join(models))
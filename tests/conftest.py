@@ -0,0 +1,94 @@
+import os
+import pytest
+import pandas as pd
+from flask import Flask
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.neighbors import KNeighborsClassifier
+from benchmarks.synthetic import build_pipeline
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'dataset.csv')
+
+
+@pytest.fixture(autouse=True)
+def database_path(tmp_path, monkeypatch):
+    """Base SQLite temporaire: les tests n'écrivent jamais dans data/tests.db"""
+    from app_module.config.settings import Config
+    path = str(tmp_path / 'tests.db')
+    monkeypatch.setattr(Config, 'DATABASE_PATH', path)
+    return path
+
+
+@pytest.fixture(scope='session')
+def dataset():
+    return pd.read_csv(DATASET_PATH).sample(n=3000, random_state=42).reset_index(drop=True)
+
+
+@pytest.fixture(scope='session')
+def pipelines(dataset):
+    X = dataset.drop(columns='SkinCancer')
+    y = (dataset['SkinCancer'] == 'Yes').astype(int)
+    models = {
+        'log_reg': LogisticRegression(max_iter=1000),
+        'random_forest': RandomForestClassifier(n_estimators=20, random_state=42),
+        'gradient_boosting': GradientBoostingClassifier(n_estimators=20, random_state=42),
+        'knn': KNeighborsClassifier(n_neighbors=5)
+    }
+    return {name: build_pipeline(clf).fit(X, y) for name, clf in models.items()}
+
+
+@pytest.fixture(scope='session')
+def compiled_pipelines(pipelines):
+    from app_module.utils.models import compile_pipeline
+    return {name: compile_pipeline(pipeline) for name, pipeline in pipelines.items()}
+
+
+@pytest.fixture
+def model_manager(pipelines, compiled_pipelines, monkeypatch):
+    from app_module.utils.cache import prediction_cache
+    from app_module.utils.models import ModelManager, ServedModel
+    prediction_cache.invalidate()
+    monkeypatch.setattr(ModelManager, '_served', {
+        name: ServedModel(pipeline, compiled_pipelines[name], None, None, None) for name, pipeline in pipelines.items()
+    })
+    return ModelManager
+
+
+@pytest.fixture
+def set_fingerprint(model_manager):
+    """Simuler une version (empreinte du fichier) d'un modèle servi par model_manager"""
+    from dataclasses import replace
+    
+    def set_(model_name, fingerprint):
+        served = model_manager._served
+        model_manager._served = {**served, model_name: replace(served[model_name], fingerprint=fingerprint)}
+    return set_
+
+
+@pytest.fixture
+def model_files(monkeypatch):
+    """ModelManager vide, servant les fichiers d'un registre de test (dict nom -> chemin)"""
+    from app_module.utils.cache import prediction_cache
+    from app_module.utils.models import ModelManager, ModelRegistry
+    prediction_cache.invalidate()
+    for attr in ('_served', '_shadow'):
+        monkeypatch.setattr(ModelManager, attr, {})
+    
+    def use(registry):
+        if not isinstance(registry, ModelRegistry):
+            registry = ModelRegistry.from_config(registry)
+        monkeypatch.setattr(ModelManager, '_registry', registry)
+        return ModelManager
+    return use
+
+
+@pytest.fixture
+def api_client(model_manager):
+    from app_module.routes import metrics_bp
+    from app_module.routes.prediction import prediction_bp
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.register_blueprint(prediction_bp)
+    app.register_blueprint(metrics_bp)
+    with app.test_client() as client:
+        yield client
@@ -0,0 +1,38 @@
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from app_module import batch
+
+
+def test_batch_job_scores_all_rows_and_resumes(pipelines, dataset, model_files, tmp_path, monkeypatch):
+    from app_module.config.settings import Config
+    paths = {}
+    for name in ('log_reg', 'random_forest'):
+        paths[name] = str(tmp_path / f'{name}.pkl')
+        joblib.dump(pipelines[name], paths[name])
+    model_files(paths)
+    monkeypatch.setattr(Config, 'MODEL_WATCH_ENABLED', False)
+    
+    input_path = tmp_path / 'archive.csv'
+    dataset.head(250).to_csv(input_path, index=False)
+    output = tmp_path / 'out'
+    summary = batch.run(str(input_path), str(output), chunk_size=100, workers=2)
+    assert summary['rows'] == 250 and summary['chunks'] == 3
+    
+    # Interruption simulée: le dernier paquet n'a pas été écrit
+    checkpoint_path = output / batch.CHECKPOINT_FILE
+    checkpoint = json.loads(checkpoint_path.read_text())
+    del checkpoint['completed']['2']
+    checkpoint_path.write_text(json.dumps(checkpoint))
+    os.remove(output / 'part-000002.csv')
+    
+    summary = batch.run(str(input_path), str(output), chunk_size=100, workers=2)
+    assert summary['resumed_rows'] == 200 and summary['rows'] == 50
+    
+    result = pd.concat([pd.read_csv(output / f'part-{i:06d}.csv') for i in range(3)])
+    assert list(result['index']) == list(range(250))
+    features = dataset.drop(columns='SkinCancer').head(250)
+    np.testing.assert_allclose(result['random_forest_probability'],
+                               pipelines['random_forest'].predict_proba(features)[:, 1], rtol=0, atol=1e-12)
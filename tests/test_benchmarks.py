@@ -0,0 +1,13 @@
+from benchmarks.run import compare, run
+
+
+def test_quick_run_reports_timings_and_detects_regressions():
+    report = run(['prepare_input', 'image'], quick=True, budget=0)
+    results = report['results']
+    assert set(results) == {'prepare_input/1', 'prepare_input/64', 'prepare_input/4096', 'image_preprocess'}
+    assert all(r['runs'] >= 3 and r['min_ms'] <= r['median_ms'] <= r['p95_ms'] for r in results.values())
+    assert report['environment']['sklearn']
+    
+    baseline = {name: dict(r, median_ms=r['median_ms'] / 2) for name, r in results.items()}
+    assert compare(results, baseline, tolerance=0.2) == sorted(results)
+    assert compare(results, results, tolerance=0.2) == []
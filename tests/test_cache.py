@@ -0,0 +1,44 @@
+import os
+import joblib
+import pytest
+from app_module.utils.cache import PredictionCache, canonical_features
+from app_module.utils.data import prepare_prediction_record
+from app_module.utils.models import ModelManager, PredictionEngine
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = PredictionCache(maxsize=2, ttl=10)
+    cache.put(('m', 1), 'a')
+    cache.put(('m', 2), 'b')
+    assert cache.get(('m', 1)) == 'a'
+    cache.put(('m', 3), 'c')
+    assert cache.get(('m', 2)) is None
+    assert cache.stats()['evictions'] == 1
+    
+    import app_module.utils.cache as cache_module
+    now = cache_module.time.monotonic()
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now + 11)
+    assert cache.get(('m', 3)) is None
+
+
+def test_canonical_features_skips_extra_precision():
+    assert canonical_features(prepare_prediction_record({'BMI': '24.5'})) is not None
+    assert canonical_features(prepare_prediction_record({'BMI': '24.53'})) is None
+
+
+def test_model_file_change_invalidates_cache(pipelines, model_files, tmp_path, monkeypatch):
+    path = str(tmp_path / 'model.pkl')
+    joblib.dump(pipelines['log_reg'], path)
+    model_files({'m': path})
+    
+    record = prepare_prediction_record({'BMI': 31.0})
+    first = PredictionEngine.predict('m', record)
+    assert PredictionEngine.predict('m', record) is first
+    
+    joblib.dump(pipelines['random_forest'], path)
+    os.utime(path, ns=(0, 0))
+    ModelManager.check_for_updates()
+    second = PredictionEngine.predict('m', record)
+    assert second is not first
+    assert second.probability == pytest.approx(pipelines['random_forest'].predict_proba(
+        PredictionEngine._as_frame([record]))[0, 1])
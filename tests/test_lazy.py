@@ -0,0 +1,37 @@
+import sys
+from app_module import create_app
+from app_module.utils import lazy
+
+
+def test_lazy_module_imports_on_first_attribute_access(tmp_path, monkeypatch):
+    (tmp_path / 'heavy_subsystem.py').write_text("VALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(lazy, '_lazy_modules', [])
+    
+    module = lazy.lazy_import('heavy_subsystem')
+    assert 'heavy_subsystem' not in sys.modules and not module.loaded
+    assert module.VALUE == 42
+    assert module.loaded and lazy.status() == {'heavy_subsystem': True}
+    sys.modules.pop('heavy_subsystem')
+
+
+def test_dashboard_is_mounted_on_first_request(model_manager):
+    app = create_app()
+    mount = app.wsgi_app
+    assert isinstance(mount, lazy.LazyMount) and mount._mounted is None
+    
+    client = app.test_client()
+    assert client.get('/api/prediction/models').status_code == 200
+    assert mount._mounted is None
+    assert client.get('/dashboard/_dash-dependencies').status_code == 200
+    assert mount._mounted is not None
+
+
+def test_parse_importtime():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     _sre\n"
+        "import time:      1500 |       1620 |   re\n"
+        "import time:       300 |       1920 | app_module\n"
+    )
+    assert lazy.parse_importtime(stderr) == [('_sre', 2, 120, 120), ('re', 1, 1500, 1620), ('app_module', 0, 300, 1920)]
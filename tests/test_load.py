@@ -0,0 +1,58 @@
+import json
+import threading
+from werkzeug.serving import make_server
+from app_module import create_app
+from benchmarks.load import Traffic, parse_mix, run
+
+
+def test_parse_mix_rejects_unknown_endpoint():
+    assert parse_mix('form=2,api=1,image=0') == {'form': 2.0, 'api': 1.0}
+    try:
+        parse_mix('upload=1')
+    except ValueError as e:
+        assert 'upload' in str(e)
+    else:
+        raise AssertionError
+
+
+def test_dashboard_payload_reads_input_values_from_layout():
+    class StubClient:
+        responses = {
+            '/dashboard/_dash-dependencies': [{'output': '..stat-total.children...', 'inputs': [
+                {'id': 'age-filter', 'property': 'value'}, {'id': 'sex-filter', 'property': 'value'}]}],
+            '/dashboard/_dash-layout': {'props': {'children': [
+                {'props': {'id': 'age-filter', 'value': []}},
+                {'props': {'children': {'props': {'id': 'sex-filter', 'value': ['Female']}}}}]}}
+        }
+        
+        def request(self, method, path, **kwargs):
+            if path not in self.responses:
+                return 404, b''
+            return 200, json.dumps(self.responses[path]).encode()
+    
+    traffic = Traffic(['log_reg'], 'secret')
+    assert traffic.prepare(StubClient())
+    assert [item['value'] for item in traffic.dashboard_payload['inputs']] == [[], ['Female']]
+    
+    del StubClient.responses['/dashboard/_dash-layout']
+    assert not Traffic(['log_reg'], 'secret').prepare(StubClient())
+
+
+def test_in_process_and_http_campaigns(model_manager):
+    report = run(concurrency=2, duration=0.5, mix='form=1,api=1,admin=1')
+    endpoints = report['endpoints']
+    assert set(endpoints) == {'form', 'api', 'admin', 'total'}
+    assert endpoints['total']['errors'] == 0
+    assert set(endpoints['admin']['status']) == {'200'}
+    assert endpoints['api']['p50_ms'] <= endpoints['api']['p95_ms'] <= endpoints['api']['p99_ms']
+    
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        report = run(url=f'http://127.0.0.1:{server.server_port}', rate=40, duration=0.5, mix='api=1,admin=1')
+    finally:
+        server.shutdown()
+    assert report['mode'] == 'rate'
+    assert report['endpoints']['total']['requests'] == 20
+    assert report['endpoints']['total']['errors'] == 0
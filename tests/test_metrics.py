@@ -0,0 +1,52 @@
+import threading
+from app_module.utils.database import TestDatabase as Database
+from app_module.utils.metrics import Histogram, timed
+
+
+def test_histogram_merges_thread_shards():
+    histogram = Histogram('test_seconds', "test", ['stage'], buckets=(0.1, 1.0))
+    series = histogram.labels('a')
+    
+    def observe():
+        for value in (0.05, 0.5, 5.0):
+            series.observe(value)
+    
+    threads = [threading.Thread(target=observe) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    series.observe(0.05)
+    
+    lines = list(histogram.render())
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 5' in lines
+    assert 'test_seconds_bucket{stage="a",le="1.0"} 9' in lines
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 13' in lines
+    assert 'test_seconds_count{stage="a"} 13' in lines
+    
+    @timed(histogram, 'b')
+    def fail():
+        raise ValueError
+    
+    try:
+        fail()
+    except ValueError:
+        pass
+    assert 'test_seconds_count{stage="b"} 1' in list(histogram.render())
+
+
+def test_metrics_endpoint_reports_stages(api_client, pipelines, tmp_path):
+    Database(str(tmp_path / 'tests.db')).get_test_count()
+    records = [{'BMI': 28.0}, {'BMI': 31.0}]
+    assert api_client.post('/api/prediction/batch', json={'model_choice': 'knn', 'records': records}).status_code == 200
+    
+    response = api_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert '# TYPE app_model_inference_duration_seconds histogram' in body
+    assert 'app_model_inference_duration_seconds_count{model="knn"}' in body
+    assert 'app_model_inference_rows_total{model="knn"}' in body
+    assert 'app_db_call_duration_seconds_count{method="get_test_count"}' in body
+    # Méthodes internes non chronométrées (pas de séries imbriquées)
+    assert not hasattr(Database._ensure_shadow_table, '__wrapped__')
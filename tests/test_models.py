@@ -0,0 +1,279 @@
+import numpy as np
+import pytest
+from app_module.utils.data import prepare_batch_prediction_input
+from app_module.utils.models import ModelNotFoundError, PredictionEngine
+
+
+@pytest.fixture
+def batch(dataset):
+    df, errors = prepare_batch_prediction_input(dataset.drop(columns='SkinCancer').head(200))
+    assert errors == []
+    return df
+
+
+@pytest.mark.parametrize('model_name', ['log_reg', 'random_forest', 'gradient_boosting', 'knn'])
+def test_engine_matches_pipeline(model_manager, pipelines, batch, model_name):
+    results = PredictionEngine.predict_batch(model_name, batch)
+    pipeline = pipelines[model_name]
+    np.testing.assert_array_equal([r.prediction for r in results], pipeline.predict(batch))
+    np.testing.assert_allclose([r.probability for r in results], pipeline.predict_proba(batch)[:, 1])
+
+
+def test_engine_uses_configured_threshold(model_manager, batch, monkeypatch):
+    from app_module.config.settings import Config
+    monkeypatch.setitem(Config.DECISION_THRESHOLDS, 'log_reg', 0.0)
+    results = PredictionEngine.predict_batch('log_reg', batch)
+    assert all(r.prediction == 1 and r.threshold == 0.0 for r in results)
+
+
+def test_engine_unknown_model(model_manager, batch):
+    with pytest.raises(ModelNotFoundError):
+        PredictionEngine.predict('unknown', batch)
+
+
+@pytest.mark.parametrize('model_name', ['log_reg', 'random_forest', 'gradient_boosting', 'knn'])
+def test_compiled_pipeline_parity(pipelines, compiled_pipelines, batch, model_name):
+    compiled = compiled_pipelines[model_name]
+    assert compiled is not None
+    pipeline = pipelines[model_name]
+    expected = pipeline.named_steps['preprocess'].transform(batch).astype(compiled.dtype)
+    np.testing.assert_array_equal(compiled.transform(batch), expected)
+    records = batch.to_dict(orient='records')
+    np.testing.assert_allclose(compiled.predict_proba(records), pipeline.predict_proba(batch), rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('model_name', ['random_forest', 'gradient_boosting'])
+def test_flat_tree_ensemble_is_bit_identical(pipelines, compiled_pipelines, batch, model_name, monkeypatch):
+    from app_module.utils.tree_compiler import FlatTreeEnsemble
+    flat = compiled_pipelines[model_name].estimator
+    assert isinstance(flat, FlatTreeEnsemble)
+    clf = pipelines[model_name].named_steps['clf']
+    X = compiled_pipelines[model_name].transform(batch)
+    
+    monkeypatch.setattr(flat, 'max_rows', None)
+    np.testing.assert_array_equal(flat.predict_proba(X), clf.predict_proba(X))
+    first_tree = clf.estimators_[0] if model_name == 'random_forest' else clf.estimators_[0, 0]
+    np.testing.assert_array_equal(flat.apply(X)[:, 0], first_tree.tree_.apply(X))
+    
+    # Ligne NaN: même routage (ou même erreur) que sklearn
+    X[0, 0] = np.nan
+    try:
+        expected = clf.predict_proba(X)
+    except ValueError:
+        with pytest.raises(ValueError):
+            flat.predict_proba(X)
+    else:
+        np.testing.assert_array_equal(flat.predict_proba(X), expected)
+
+
+def test_engine_falls_back_to_pipeline_for_unknown_category(model_manager):
+    from app_module.utils.data import prepare_prediction_record
+    record = prepare_prediction_record({'Race': 'Martian'})
+    result = PredictionEngine.predict('log_reg', record)
+    assert 0.0 <= result.probability <= 1.0
+
+
+def test_shadow_scoring_falls_back_to_pipeline_for_unknown_category(model_manager, pipelines, compiled_pipelines,
+                                                                     tmp_path, monkeypatch):
+    from app_module.utils.data import prepare_prediction_record
+    from app_module.utils.database import TestDatabase
+    from app_module.utils.shadow import ShadowScorer
+    
+    monkeypatch.setattr(model_manager, 'get_shadow', lambda name: (
+        'v2', pipelines['random_forest'], compiled_pipelines['random_forest']))
+    # Valeur absente des tables compilées du FunctionTransformer binaire (KeyError)
+    record = prepare_prediction_record({'Smoking': 'Sometimes'})
+    active = PredictionEngine.predict('log_reg', record)
+    scorer = ShadowScorer(sample_rate=1.0)
+    scorer._db = TestDatabase(str(tmp_path / 'tests.db'))
+    
+    assert scorer.process('log_reg', record, active, 1.0, 'v1') is not None
+    [summary] = scorer._db.get_shadow_summary('log_reg')
+    expected = pipelines['random_forest'].predict_proba(PredictionEngine._as_frame([record]))[0, 1]
+    assert summary['mean_abs_probability_diff'] == pytest.approx(abs(active.probability - expected))
+
+
+def test_concurrent_first_load_loads_each_file_once(pipelines, model_files, tmp_path, monkeypatch):
+    import joblib
+    import threading
+    import time
+    from app_module.config.settings import Config
+    from app_module.utils.models import ModelManager
+    
+    paths = {}
+    for name in pipelines:
+        paths[name] = str(tmp_path / f'{name}.pkl')
+        joblib.dump(pipelines[name], paths[name])
+    model_files(paths)
+    # Surveillance déjà démarrée (ou désactivée): start_watcher ne prend pas le verrou
+    monkeypatch.setattr(Config, 'MODEL_WATCH_ENABLED', False)
+    
+    calls = []
+    seen = []
+    real_load = joblib.load
+    
+    def first_request(i):
+        if i % 2:
+            seen.append(set(ModelManager.get_all_models()))
+        else:
+            seen.append({name for name in pipelines if ModelManager.get_model(name) is not None})
+    late = [threading.Thread(target=first_request, args=(i,)) for i in range(1, 8)]
+    
+    def load_then_let_requests_in(*args, **kwargs):
+        calls.append(args[0])
+        if len(calls) == 2:
+            # Premier modèle déjà chargé: d'autres requêtes arrivent pendant le chargement
+            for t in late:
+                t.start()
+            time.sleep(0.05)
+        return real_load(*args, **kwargs)
+    monkeypatch.setattr(joblib, 'load', load_then_let_requests_in)
+    
+    first_request(0)
+    for t in late:
+        t.join()
+    assert sorted(calls) == sorted(paths.values())
+    assert seen == [set(pipelines)] * 8
+    
+    # Matrice d'entraînement KNN mappée depuis le fichier
+    memory = ModelManager.memory_usage()
+    knn = ModelManager.get_model('knn').named_steps['clf']
+    assert memory['knn']['shared_bytes'] >= knn._fit_X.nbytes
+
+
+def test_hot_reload_swaps_model_and_keeps_old_reference(pipelines, model_files, tmp_path, monkeypatch):
+    import joblib
+    import os
+    from app_module.config.settings import Config
+    from app_module.utils.models import ModelManager
+    
+    path = str(tmp_path / 'model.pkl')
+    joblib.dump(pipelines['log_reg'], path)
+    model_files({'m': path})
+    monkeypatch.setattr(Config, 'MODEL_WATCH_ENABLED', False)
+    
+    in_flight = ModelManager.get_model('m')
+    old_fingerprint = ModelManager.get_fingerprint('m')
+    snapshot = ModelManager.get_served('m')
+    assert ModelManager.check_for_updates() == []
+    
+    notified = []
+    monkeypatch.setattr(ModelManager, '_reload_listeners', [notified.append])
+    joblib.dump(pipelines['gradient_boosting'], path)
+    os.utime(path, ns=(0, 0))
+    events = ModelManager.check_for_updates()
+    
+    assert [e['previous_fingerprint'] for e in events] == [old_fingerprint]
+    assert events[0]['warmup_seconds'] >= 0 and notified == ['m']
+    assert ModelManager.get_model('m') is not in_flight
+    # Une entrée prise avant la bascule garde modèle, pipeline compilée et empreinte de l'ancienne version
+    current = ModelManager.get_served('m')
+    assert snapshot.model is in_flight and snapshot.fingerprint == old_fingerprint
+    assert current.fingerprint == events[0]['fingerprint'] != old_fingerprint
+    assert type(current.compiled.estimator).__name__ != type(snapshot.compiled.estimator).__name__
+    assert type(ModelManager.get_model('m').named_steps['clf']).__name__ == 'GradientBoostingClassifier'
+    assert in_flight.predict_proba(prepare_batch_prediction_input([{}])[0]).shape == (1, 2)
+
+
+def test_registry_aliases_shadow_scoring_and_promotion(pipelines, model_files, tmp_path, monkeypatch):
+    import joblib
+    import json
+    from app_module.config.settings import Config
+    from app_module.utils.database import TestDatabase
+    from app_module.utils.data import prepare_prediction_record
+    from app_module.utils.models import ModelRegistry
+    from app_module.utils.shadow import ShadowScorer, shadow_scorer
+    
+    joblib.dump(pipelines['log_reg'], tmp_path / 'v1.pkl')
+    joblib.dump(pipelines['random_forest'], tmp_path / 'v2.pkl')
+    manifest = tmp_path / 'registry.json'
+    entry = {'active': 'v1', 'shadow': 'v2', 'aliases': ['lr'],
+             'versions': {'v1': {'path': 'v1.pkl'}, 'v2': {'path': 'v2.pkl'}}}
+    manifest.write_text(json.dumps({'models': {'m': entry}}))
+    monkeypatch.setattr(Config, 'MODEL_REGISTRY_PATH', str(manifest))
+    monkeypatch.setattr(Config, 'MODEL_WATCH_ENABLED', False)
+    manager = model_files(ModelRegistry.load(str(manifest)))
+    monkeypatch.setattr(manager, '_registry_signature', None)
+    
+    # Alias résolu, version shadow chargée à côté de la version active
+    submitted = []
+    monkeypatch.setattr(shadow_scorer, 'submit', lambda *args: submitted.append(args))
+    record = prepare_prediction_record({'BMI': 30.0})
+    result = PredictionEngine.predict('lr', record)
+    assert result.model == 'm' and manager.get_shadow('m')[0] == 'v2'
+    assert [args[0] for args in submitted] == ['m'] and submitted[0][4] == 'v1'
+    
+    # Table shadow créée à la première écriture, pas à l'ouverture de la base
+    db = TestDatabase(str(tmp_path / 'tests.db'))
+    assert db.get_shadow_summary('m') == []
+    scorer = ShadowScorer(sample_rate=1.0)
+    scorer._db = db
+    scorer.process(*submitted[0])
+    [summary] = db.get_shadow_summary('m')
+    assert summary['count'] == 1 and summary['shadow_version'] == 'v2'
+    assert summary['mean_abs_probability_diff'] == pytest.approx(abs(
+        result.probability - pipelines['random_forest'].predict_proba(PredictionEngine._as_frame([record]))[0, 1]))
+    
+    # Promotion: le manifeste change de version active, le modèle est rechargé
+    entry.update(active='v2', shadow=None)
+    manifest.write_text(json.dumps({'models': {'m': entry}}))
+    events = manager.check_for_updates()
+    assert [e['reason'] for e in events] == ['version_changed'] and events[0]['version'] == 'v2'
+    assert manager.get_shadow('m') is None
+    assert type(manager.get_model('lr').named_steps['clf']).__name__ == 'RandomForestClassifier'
+
+
+def test_knn_index_from_disk_matches_estimator(pipelines, model_files, batch, tmp_path, monkeypatch):
+    import joblib
+    from app_module.config.settings import Config
+    from app_module.utils.knn_index import KNNIndex, build_knn_index, index_directory
+    from app_module.utils.models import file_fingerprint
+    
+    path = str(tmp_path / 'knn.pkl')
+    joblib.dump(pipelines['knn'], path)
+    monkeypatch.setattr(Config, 'KNN_INDEX_DIR', str(tmp_path / 'knn_index'))
+    monkeypatch.setattr(Config, 'MODEL_WATCH_ENABLED', False)
+    build_knn_index(pipelines['knn']).save(index_directory('knn'), file_fingerprint(path))
+    manager = model_files({'knn': path})
+    
+    compiled = manager.get_compiled('knn')
+    assert isinstance(compiled.estimator, KNNIndex) and manager.status()['models']['knn']['knn_index']
+    assert isinstance(compiled.estimator.X, np.memmap)
+    np.testing.assert_array_equal(PredictionEngine.predict_proba('knn', batch),
+                                  pipelines['knn'].predict_proba(batch)[:, 1])
+    
+    # Index construit pour un autre fichier: ignoré
+    assert KNNIndex.load(index_directory('knn'), fingerprint='autre') is None
+
+
+def test_micro_batcher_groups_concurrent_requests(model_manager, pipelines, monkeypatch):
+    import threading
+    from app_module.config.settings import Config
+    from app_module.utils import models
+    from app_module.utils.batching import MicroBatcher
+    from app_module.utils.data import prepare_prediction_record
+    
+    batcher = MicroBatcher(PredictionEngine.predict_batch, max_wait_ms=200, max_rows=16)
+    monkeypatch.setattr(models, 'micro_batcher', batcher)
+    monkeypatch.setattr(Config, 'MICRO_BATCH_ENABLED', True)
+    # BMI à deux décimales: pas de cache, chaque requête passe par le batcher
+    records = [prepare_prediction_record({'BMI': 20 + i / 100}) for i in range(32)]
+    results = [None] * len(records)
+    
+    def score(i):
+        results[i] = PredictionEngine.predict('random_forest', records[i])
+    threads = [threading.Thread(target=score, args=(i,)) for i in range(len(records))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    expected = pipelines['random_forest'].predict_proba(PredictionEngine._as_frame(records))[:, 1]
+    np.testing.assert_array_equal([r.probability for r in results], expected)
+    stats = batcher.stats()
+    assert stats['rows'] == 32 and stats['batches'] < 32 and stats['max_queue_depth'] > 1
+    
+    from app_module.utils.metrics import registry
+    body = registry.render()
+    assert 'app_micro_batch_size_count{model="random_forest"}' in body
+    assert 'app_micro_batch_queue_depth_count{model="random_forest"}' in body
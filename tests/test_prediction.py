@@ -0,0 +1,107 @@
+import io
+import pytest
+from app_module.utils.data import (FEATURE_COLUMNS, prepare_batch_prediction_input, prepare_prediction_input,
+                                   prepare_prediction_record)
+
+
+def test_batch_input_matches_single_row_input():
+    records = [{'Sex': 'Female', 'BMI': '31.2', 'AgeCategory': '60-64'}, {}]
+    df, errors = prepare_batch_prediction_input(records)
+    assert errors == []
+    assert list(df.columns) == FEATURE_COLUMNS
+    for idx, record in enumerate(records):
+        expected = prepare_prediction_input(record)
+        assert df.loc[[idx]].reset_index(drop=True).equals(expected)
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', float('-inf')])
+def test_single_record_rejects_non_finite_numbers(value):
+    with pytest.raises(ValueError, match='BMI'):
+        prepare_prediction_record({'BMI': value})
+
+
+def test_batch_input_reports_invalid_rows_without_failing():
+    records = [{'BMI': 'abc'}, {'AgeCategory': '12-17'}, 'not a record', {'BMI': 22}]
+    df, errors = prepare_batch_prediction_input(records)
+    assert list(df.index) == [3]
+    assert [e['index'] for e in errors] == [0, 1, 2]
+    assert 'BMI' in errors[0]['error']
+    assert 'AgeCategory' in errors[1]['error']
+
+
+def test_batch_endpoint_json(api_client, pipelines):
+    records = [{'BMI': 28.0, 'Smoking': 'Yes'}, {'BMI': 'x'}, {'AgeCategory': '80 or older'}]
+    response = api_client.post('/api/prediction/batch', json={'model_choice': 'random_forest', 'records': records})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['count'] == 2
+    assert [r['index'] for r in data['results']] == [0, 2]
+    assert data['errors'][0]['index'] == 1
+    
+    expected = pipelines['random_forest'].predict_proba(prepare_prediction_input(records[2]))[0][1]
+    assert abs(data['results'][1]['probability'] - expected) < 1e-12
+
+
+def test_batch_endpoint_csv(api_client, dataset):
+    csv = dataset.drop(columns='SkinCancer').head(50).to_csv(index=False).encode()
+    response = api_client.post(
+        '/api/prediction/batch',
+        data={'model_choice': 'log_reg', 'file': (io.BytesIO(csv), 'patients.csv')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 200
+    assert response.get_json()['data']['count'] == 50
+
+
+def test_ensemble_endpoint(api_client, pipelines):
+    record = {'BMI': 33.0, 'AgeCategory': '70-74', 'Smoking': 'Yes'}
+    response = api_client.post('/api/prediction/ensemble', json={**record, 'method': 'weighted',
+                                                                'weights': {'knn': 3.0}})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert set(data['models']) == set(pipelines)
+    
+    probabilities = {name: m['probability'] for name, m in data['models'].items()}
+    weights = {name: 3.0 if name == 'knn' else 1.0 for name in probabilities}
+    expected = sum(weights[n] * p for n, p in probabilities.items()) / sum(weights.values())
+    assert abs(data['probability'] - expected) < 1e-12
+    assert data['disagreement'] >= 0.0
+
+
+@pytest.mark.parametrize('weights', [[1, 2], 'x', {'knn': -1.0, 'log_reg': 5.0}, {'knn': 'inf'}, {'knn': True}])
+def test_ensemble_endpoint_rejects_invalid_weights(api_client, pipelines, weights):
+    response = api_client.post('/api/prediction/ensemble', json={'BMI': 33.0, 'method': 'weighted', 'weights': weights})
+    assert response.status_code == 400
+
+
+def test_ensemble_endpoint_unknown_model(api_client):
+    response = api_client.post('/api/prediction/ensemble', json={'models': ['nope']})
+    assert response.status_code == 404
+
+
+def test_stream_endpoint_ndjson_chunks(api_client, pipelines, monkeypatch):
+    import json
+    from app_module.config.settings import Config
+    monkeypatch.setattr(Config, 'STREAM_CHUNK_SIZE', 2)
+    lines = [json.dumps({'BMI': 20 + i}) for i in range(4)] + ['{oops', json.dumps({'BMI': 'x'})]
+    response = api_client.post('/api/prediction/stream?model_choice=gradient_boosting',
+                               data='\n'.join(lines), content_type='application/x-ndjson')
+    assert response.status_code == 200 and response.is_streamed
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    
+    assert [row['index'] for row in rows] == list(range(6))
+    assert 'JSON invalide' in rows[4]['error'] and 'BMI' in rows[5]['error']
+    expected = pipelines['gradient_boosting'].predict_proba(prepare_prediction_input({'BMI': 23}))[0][1]
+    assert rows[3]['probability'] == expected
+
+
+def test_stream_endpoint_csv_body_to_csv(api_client, dataset, monkeypatch):
+    import pandas as pd
+    from app_module.config.settings import Config
+    monkeypatch.setattr(Config, 'STREAM_CHUNK_SIZE', 7)
+    body = dataset.head(30).to_csv(index=False)
+    response = api_client.post('/api/prediction/stream?model_choice=log_reg&format=csv',
+                               data=body, content_type='text/csv')
+    assert response.status_code == 200 and response.mimetype == 'text/csv'
+    out = pd.read_csv(io.StringIO(response.get_data(as_text=True)))
+    assert list(out['index']) == list(range(30)) and out['error'].isna().all()
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from app_module.utils.data import prepare_prediction_record
+from app_module.utils.models import PredictionEngine
+from app_module.utils.risk_grid import RiskGrid, build_risk_grid, predict_with_grid
+
+
+@pytest.fixture
+def grid(model_manager, tmp_path):
+    path = str(tmp_path / 'grid.npz')
+    build_risk_grid(['log_reg', 'random_forest'], bmi_min=20.0, bmi_max=30.0, bmi_step=0.5).save(path)
+    return RiskGrid.load(path)
+
+
+def test_grid_points_match_live_scoring(grid):
+    for model_name in ('log_reg', 'random_forest'):
+        for bmi in (20.0, 24.5, 30.0):
+            record = prepare_prediction_record({'BMI': bmi, 'Sex': 'Female', 'AgeCategory': '55-59', 'Smoking': 'Yes'})
+            expected = PredictionEngine.predict(model_name, record).probability
+            assert grid.lookup(model_name, record) == pytest.approx(expected, abs=1e-6)
+
+
+def test_grid_interpolates_and_falls_back(grid):
+    low = grid.lookup('log_reg', prepare_prediction_record({'BMI': 24.5}))
+    high = grid.lookup('log_reg', prepare_prediction_record({'BMI': 25.0}))
+    mid = grid.lookup('log_reg', prepare_prediction_record({'BMI': 24.75}))
+    assert mid == pytest.approx((low + high) / 2, abs=1e-6)
+    
+    assert grid.lookup('log_reg', prepare_prediction_record({'BMI': 35.0})) is None
+    assert grid.lookup('log_reg', prepare_prediction_record({'Race': 'Asian'})) is None
+    assert grid.lookup('knn', prepare_prediction_record({})) is None
+    
+    record = prepare_prediction_record({'BMI': 35.0})
+    assert predict_with_grid(grid, 'log_reg', record) == PredictionEngine.predict('log_reg', record)
@@ -0,0 +1,253 @@
+from dataclasses import replace
+import numpy as np
+import pandas as pd
+import pytest
+from app_module.config.settings import Config
+from app_module.utils import shap_background
+from app_module.utils.data import FEATURE_COLUMNS
+from app_module.utils.explanation_store import ExplanationStore
+from app_module.utils.xai import (FeatureGroups, LinearShap, explain_linear_batch, explain_model_prediction,
+                                  get_feature_groups)
+
+
+@pytest.fixture(autouse=True)
+def explanation_store(tmp_path, monkeypatch):
+    """Store d'explications vide, propre au test"""
+    from app_module.utils import explanation_store as module
+    store = ExplanationStore(str(tmp_path / 'explanations.db'))
+    monkeypatch.setattr(module, 'explanation_store', store)
+    return store
+
+
+def test_shap_background_is_cached_per_model_fingerprint(set_fingerprint, pipelines, dataset, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'SHAP_BACKGROUND_DIR', str(tmp_path))
+    set_fingerprint('random_forest', 'v1')
+    monkeypatch.setattr(shap_background, '_backgrounds', {})
+    model = pipelines['random_forest']
+    df_input = dataset[FEATURE_COLUMNS].iloc[[0]].reset_index(drop=True)
+    
+    first = explain_model_prediction(model, df_input)
+    background = shap_background.get_background(model, FEATURE_COLUMNS)
+    expected = model.named_steps['preprocess'].transform(
+        pd.read_csv(Config.DATASET_PATH)[FEATURE_COLUMNS].sample(n=200, random_state=42))
+    assert background.dtype == np.float32
+    np.testing.assert_array_equal(background, expected.astype(np.float32))
+    assert (tmp_path / 'random_forest' / 'background.npy').exists()
+    
+    # Plus de lecture du dataset: mémoire, puis fichier mappé pour un nouveau processus
+    monkeypatch.setattr(pd, 'read_csv', lambda *a, **k: (_ for _ in ()).throw(AssertionError('read_csv')))
+    assert explain_model_prediction(model, df_input) == first
+    monkeypatch.setattr(shap_background, '_backgrounds', {})
+    assert isinstance(shap_background.get_background(model, FEATURE_COLUMNS), np.memmap)
+    
+    # Nouvelle version du modèle: le fichier obsolète est ignoré
+    set_fingerprint('random_forest', 'v2')
+    assert shap_background.load_background(str(tmp_path / 'random_forest'), 'v2', FEATURE_COLUMNS, 200) is None
+
+
+def test_shap_explainer_is_reused_until_model_reload(set_fingerprint, pipelines, dataset, tmp_path, monkeypatch):
+    from app_module.utils import xai
+    
+    monkeypatch.setattr(Config, 'SHAP_BACKGROUND_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'EXPLANATION_STORE_ENABLED', False)
+    set_fingerprint('gradient_boosting', 'v1')
+    monkeypatch.setattr(xai, '_explainers', {})
+    built = []
+    build_explainer = xai._build_explainer
+    
+    def failing_tree_explainer(branch, *args):
+        built.append(branch)
+        if branch == 'tree':
+            raise ValueError('tree')
+        return build_explainer(branch, *args)
+    
+    monkeypatch.setattr(xai, '_build_explainer', failing_tree_explainer)
+    model = pipelines['gradient_boosting']
+    df_input = dataset[FEATURE_COLUMNS].iloc[[0]].reset_index(drop=True)
+    
+    first = explain_model_prediction(model, df_input)
+    assert explain_model_prediction(model, df_input) == first
+    assert built == ['tree', 'tree_background']
+    assert xai.explainer_status() == {'gradient_boosting': 'tree_background'}
+    
+    xai._invalidate_explainer('gradient_boosting')
+    explain_model_prediction(model, df_input)
+    assert built == ['tree', 'tree_background', 'tree', 'tree_background']
+
+
+def test_concurrent_first_explanations_build_one_explainer_per_model(set_fingerprint, pipelines, dataset,
+                                                                     tmp_path, monkeypatch):
+    import threading
+    from app_module.utils import xai
+    
+    monkeypatch.setattr(Config, 'SHAP_BACKGROUND_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'EXPLANATION_STORE_ENABLED', False)
+    set_fingerprint('random_forest', 'v1')
+    set_fingerprint('log_reg', 'v1')
+    monkeypatch.setattr(xai, '_explainers', {})
+    monkeypatch.setattr(xai, '_build_locks', {})
+    df_input = dataset[FEATURE_COLUMNS].iloc[[0]].reset_index(drop=True)
+    for name in ('random_forest', 'log_reg'):
+        shap_background.get_background(pipelines[name], FEATURE_COLUMNS)
+    
+    built, release = [], threading.Event()
+    build_explainer = xai._build_explainer
+    
+    def slow_build(branch, *args):
+        built.append(branch)
+        if branch == 'tree':
+            assert release.wait(10)
+        return build_explainer(branch, *args)
+    
+    monkeypatch.setattr(xai, '_build_explainer', slow_build)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        explain_model_prediction(pipelines['random_forest'], df_input))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    
+    # Construction en cours pour random_forest: un autre modèle n'attend pas
+    explain_model_prediction(pipelines['log_reg'], df_input)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert built == ['linear', 'tree'] or built == ['tree', 'linear']
+    assert len(results) == 4 and all(result == results[0] for result in results)
+
+
+def test_feature_groups_aggregate_batches_and_one_hot_columns(pipelines):
+    groups = FeatureGroups.from_mapping({0: 'BMI', 1: 'Race', 2: 'Race', 3: 'Sex'})
+    values = np.array([[0.5, -0.2, 0.1, -0.3], [-1.0, 0.4, -0.4, 0.0]])
+    assert groups.names == ['BMI', 'Race', 'Sex']
+    np.testing.assert_allclose(groups.aggregate(values), [[0.5, 0.3, -0.3], [-1.0, 0.8, 0.0]])
+    np.testing.assert_allclose(groups.aggregate(values[1]), groups.aggregate(values)[1:])
+    
+    preprocess = pipelines['log_reg'].named_steps['preprocess']
+    compiled = get_feature_groups(preprocess, FEATURE_COLUMNS)
+    assert compiled is get_feature_groups(preprocess, FEATURE_COLUMNS)
+    assert sorted(compiled.names) == sorted(FEATURE_COLUMNS)
+    assert compiled.multi.sum() == 1 and compiled.names[compiled.multi.argmax()] == 'Race'
+
+
+def test_linear_shap_is_exact_for_logistic_regression(set_fingerprint, pipelines, dataset, tmp_path, monkeypatch):
+    from app_module.utils import xai
+    
+    monkeypatch.setattr(Config, 'SHAP_BACKGROUND_DIR', str(tmp_path))
+    set_fingerprint('log_reg', 'v1')
+    monkeypatch.setattr(xai, '_explainers', {})
+    model = pipelines['log_reg']
+    clf = model.named_steps['clf']
+    features = dataset[FEATURE_COLUMNS].iloc[:50]
+    X = model.named_steps['preprocess'].transform(features)
+    background = shap_background.get_background(model, FEATURE_COLUMNS)
+    
+    # Efficacité: base + somme des contributions = sortie du modèle, dans les deux espaces
+    log_odds = LinearShap(clf, background, 'log_odds')(X)
+    np.testing.assert_allclose(log_odds.values.sum(axis=1) + log_odds.base_values, clf.decision_function(X))
+    proba = LinearShap(clf, background, 'probability')(X)
+    np.testing.assert_allclose(proba.values.sum(axis=1) + proba.base_values, clf.predict_proba(X)[:, 1])
+    assert proba.approximate and not log_odds.approximate
+    
+    explanation = explain_model_prediction(model, features.iloc[[3]].reset_index(drop=True))
+    assert xai.explainer_status() == {'log_reg': 'linear'}
+    assert 'approximate' not in explanation and explanation['base_value'] == log_odds.base_values[0]
+    batch = explain_linear_batch(model, features)
+    assert set(batch.columns[1:]) == {item['feature'] for item in explanation['all_features']}
+    assert batch['base_value'].iloc[3] == explanation['base_value']
+    for item in explanation['all_features']:
+        assert abs(batch[item['feature']].iloc[3] - item['shap_value']) < 1e-12
+    
+    # Sortie en probabilité: approximation signalée dans la réponse
+    monkeypatch.setattr(Config, 'SHAP_LINEAR_OUTPUT', 'probability')
+    xai._invalidate_explainer('log_reg')
+    assert explain_model_prediction(model, features.iloc[[3]].reset_index(drop=True))['approximate']
+    assert explain_linear_batch(model, features).attrs['approximate']
+
+
+def test_explanations_are_stored_per_model_version(set_fingerprint, pipelines, dataset, explanation_store, monkeypatch):
+    from app_module.utils.xai import explain_model_prediction_lime
+    
+    set_fingerprint('knn', 'v1')
+    model = pipelines['knn']
+    df_input = dataset[FEATURE_COLUMNS].iloc[[0]].reset_index(drop=True)
+    
+    lime = explain_model_prediction_lime(model, df_input, n_samples=500)
+    assert explain_model_prediction_lime(model, df_input, n_samples=500) == lime
+    assert explanation_store.stats()['hits'] == 1
+    # LIME est échantillonné avec une graine fixe: le stockage ne change pas le résultat
+    monkeypatch.setattr(Config, 'EXPLANATION_STORE_ENABLED', False)
+    assert explain_model_prediction_lime(model, df_input, n_samples=500) == lime
+    monkeypatch.setattr(Config, 'EXPLANATION_STORE_ENABLED', True)
+    
+    # Autre entrée, autres paramètres ou nouvelle version du modèle: recalcul
+    explain_model_prediction_lime(model, df_input, n_samples=400)
+    set_fingerprint('knn', 'v2')
+    explain_model_prediction_lime(model, df_input, n_samples=500)
+    assert explanation_store.stats()['entries'] == 3
+    
+    explanation_store.max_entries = 1
+    assert explanation_store.evict() == 2
+    explanation_store.max_age = 0
+    assert explanation_store.get('lime', 'v2', 'missing') is None and explanation_store.evict() == 1
+
+
+def test_lime_context_is_reused_and_numeric_encoding_matches_pipeline(model_manager, pipelines, dataset, monkeypatch):
+    from app_module.utils import xai
+    
+    monkeypatch.setattr(Config, 'EXPLANATION_STORE_ENABLED', False)
+    monkeypatch.setattr(xai, '_lime_contexts', {})
+    model = pipelines['gradient_boosting']
+    df_input = dataset[FEATURE_COLUMNS].iloc[[2]].reset_index(drop=True)
+    
+    fast = xai.explain_model_prediction_lime(model, df_input, n_samples=500)
+    context = xai.get_lime_context(FEATURE_COLUMNS)
+    monkeypatch.setattr(pd, 'read_csv', lambda *a, **k: (_ for _ in ()).throw(AssertionError('read_csv')))
+    assert xai.explain_model_prediction_lime(model, df_input, n_samples=500) == fast
+    
+    # Codes perturbés: tables de la pipeline compilée == décodage en DataFrame + pipeline complète
+    samples = np.tile(context.encode(df_input), (50, 1))
+    samples[:, list(context.classes)] = np.random.RandomState(0).uniform(-1, 8, (50, len(context.classes)))
+    encode = context.numeric_encoder(model_manager.get_compiled('gradient_boosting'))
+    np.testing.assert_allclose(model.named_steps['clf'].predict_proba(encode(samples)),
+                               model.predict_proba(context.decode(samples)), atol=1e-6)
+    
+    monkeypatch.setattr(model_manager, '_served', {
+        name: replace(entry, compiled=None) for name, entry in model_manager._served.items()
+    })
+    assert xai.explain_model_prediction_lime(model, df_input, n_samples=500) == fast
+
+
+def test_adaptive_lime_stops_on_convergence_and_matches_full_budget(set_fingerprint, pipelines, dataset,
+                                                                    explanation_store, monkeypatch):
+    from app_module.utils import xai
+    
+    monkeypatch.setattr(Config, 'EXPLANATION_STORE_ENABLED', False)
+    monkeypatch.setattr(Config, 'LIME_INITIAL_SAMPLES', 100)
+    set_fingerprint('log_reg', 'v1')
+    model = pipelines['log_reg']
+    df_input = dataset[FEATURE_COLUMNS].iloc[[2]].reset_index(drop=True)
+    full = xai.explain_model_prediction_lime(model, df_input, n_samples=800)
+    
+    # Jamais convergé: tours 100, 200, 400, 800 -> même explication que sans adaptatif
+    monkeypatch.setattr(Config, 'LIME_TOLERANCE', -1.0)
+    adaptive = xai.explain_model_prediction_lime(model, df_input, n_samples=800, adaptive=True)
+    assert adaptive['explanation'] == full['explanation']
+    assert adaptive['samples_used'] == 800 and not adaptive['converged']
+    
+    # Tolérance large: arrêt dès que le classement du top-k est stable
+    monkeypatch.setattr(Config, 'LIME_TOP_K', 1)
+    monkeypatch.setattr(Config, 'LIME_TOLERANCE', 10.0)
+    early = xai.explain_model_prediction_lime(model, df_input, n_samples=800, adaptive=True)
+    assert early['converged'] and early['samples_used'] < 800 and early['convergence_error'] <= 10.0
+    
+    assert not early['truncated'] and not adaptive['truncated']
+    
+    # Budget de temps écoulé: un seul tour, résultat tronqué jamais stocké
+    monkeypatch.setattr(Config, 'EXPLANATION_STORE_ENABLED', True)
+    monkeypatch.setattr(Config, 'LIME_TIME_BUDGET', 0.0)
+    truncated = xai.explain_model_prediction_lime(model, df_input, n_samples=800, adaptive=True)
+    assert truncated['samples_used'] == 100 and truncated['truncated']
+    assert explanation_store.stats()['entries'] == 0
+    monkeypatch.setattr(Config, 'LIME_TIME_BUDGET', 60.0)
+    xai.explain_model_prediction_lime(model, df_input, n_samples=800, adaptive=True)
+    assert explanation_store.stats()['entries'] == 1
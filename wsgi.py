@@ -0,0 +1,6 @@
+"""
+Point d'entrée WSGI (gunicorn --config gunicorn.conf.py wsgi:app)
+"""
+from app_module import create_app
+
+app = create_app()